@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import pathlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Mapping, Optional, Tuple, TypeVar
+
+import requests
+
+from blob_store import commit
+from http_fetch import CHUNK_SIZE, TIMEOUT, get_session
+from rate_limit import athrottle
+from retry import Throttled, aretry_call, check_download, is_throttle_page
+from scheduler import RunStats
+
+###############################################################################
+# asyncio 下載核心：四支程式共用，等待都交給 event loop 而不是 time.sleep
+###############################################################################
+
+T = TypeVar("T")
+Job = Tuple[str, T, Callable[[T], Awaitable[Any]]]   # (報表別, 區段, coroutine 工廠)
+
+
+class AsyncEngine:
+    """
+    * 每種報表一個 Semaphore，限制同時進行的區段數
+    * HTTP 請求、檔案寫入都是 coroutine；阻塞的 Selenium / requests 呼叫丟到執行緒
+    * Ctrl-C 會取消所有進行中的工作並清掉寫到一半的 .part 檔
+    """
+
+    def __init__(self, limits: Mapping[str, int], default_limit: int = 2,
+                 session: Optional[requests.Session] = None):
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self.session = session or get_session()
+        self.stop_event = threading.Event()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    # -- 並行度 ------------------------------------------------------------------
+
+    def semaphore(self, report: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(report)
+        if sem is None:
+            sem = self._semaphores[report] = asyncio.Semaphore(
+                self.limits.get(report, self.default_limit))
+        return sem
+
+    async def run_blocking(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """把阻塞呼叫（Selenium、解析）丟到執行緒，不卡住 event loop"""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    # -- HTTP --------------------------------------------------------------------
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        await athrottle(url)
+        kwargs.setdefault("timeout", TIMEOUT)
+        resp = await asyncio.to_thread(self.session.request, method, url, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    async def fetch_bytes(self, url: str, **kwargs) -> bytes:
+        """GET 整個回應；逾時、被擋會退避重試（見 retry.aretry_call）"""
+        async def attempt(_: int) -> bytes:
+            resp = await self.request("GET", url, **kwargs)
+            if is_throttle_page(resp.content):
+                raise Throttled(f"{url} 被 MOPS 擋下（查詢過於頻繁）")
+            return resp.content
+
+        return await aretry_call(attempt, url)
+
+    async def fetch_to_file(self, method: str, url: str, dest: pathlib.Path,
+                            **kwargs) -> pathlib.Path:
+        """
+        串流寫入 dest.part，完成後 rename；每個 chunk 之間都會讓出 event loop，
+        所以取消時最多多讀一個 chunk。逾時、被擋、空檔會退避重試。
+        """
+        return await aretry_call(
+            lambda _: self._fetch_to_file(method, url, pathlib.Path(dest), **kwargs),
+            url, what=pathlib.Path(dest).name)
+
+    async def _fetch_to_file(self, method: str, url: str, dest: pathlib.Path,
+                             **kwargs) -> pathlib.Path:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".part")
+        resp = await self.request(method, url, stream=True, **kwargs)
+        try:
+            chunks = resp.iter_content(CHUNK_SIZE)
+            head = await asyncio.to_thread(next, chunks, b"")
+            check_download(head, dest.name)
+            digest = hashlib.sha256(head)
+            with open(tmp, "wb") as fh:
+                fh.write(head)
+                while await asyncio.to_thread(_copy_chunk, chunks, fh, digest):
+                    if self.stop_event.is_set():
+                        raise asyncio.CancelledError
+            # 同內容已下載過就沿用既有檔案；新內容改名並排入轉碼（見 blob_store）
+            return await asyncio.to_thread(commit, tmp, dest, digest.hexdigest())
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            resp.close()
+
+    # -- 執行 --------------------------------------------------------------------
+
+    async def _run_one(self, stats: RunStats, report: str, item, factory):
+        async with self.semaphore(report):
+            try:
+                stats.record(item, bool(await factory(item)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ {item} 發生錯誤: {e}")
+                stats.record(item, False, e)
+
+    async def gather(self, jobs: Iterable[Job]) -> RunStats:
+        stats: RunStats = RunStats()
+        tasks = [asyncio.create_task(self._run_one(stats, report, item, factory))
+                 for report, item, factory in jobs]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            self.stop_event.set()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return stats
+
+    def run(self, jobs: Iterable[Job]) -> RunStats:
+        """同步入口：給 main() 用；Ctrl-C 時取消全部工作並回傳空的統計"""
+        try:
+            return asyncio.run(self.gather(list(jobs)))
+        except KeyboardInterrupt:
+            print("\n⛔ 已取消，進行中的下載已中止")
+            return RunStats()
+
+
+def _copy_chunk(chunks, fh, digest) -> bool:
+    """讀一個 chunk、更新雜湊並寫入檔案；讀完回傳 False"""
+    chunk = next(chunks, None)
+    if chunk is None:
+        return False
+    digest.update(chunk)
+    fh.write(chunk)
+    return True
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import pathlib
+import resource
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+###############################################################################
+# 離線效能測試：對 mops_standin 跑各種下載模式，比較吞吐量、延遲與記憶體
+###############################################################################
+
+HTTP_MODES = ["monthly-http", "monthly-html", "monthly-async", "quarterly-http", "quarterly-async"]
+BROWSER_MODES = ["monthly-browser", "quarterly-click", "quarterly-replay", "quarterly-tabs"]
+QUARTERLY_PAGE = "t163sb19"
+
+
+class Timer:
+    """收集每個檔案的耗時（秒），多執行緒安全"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def wrap(self, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - t0)
+        return timed
+
+
+@contextmanager
+def patched(obj, name: str, replacement):
+    """暫時替換模組屬性（只在量測期間），離開時還原"""
+    original = getattr(obj, name)
+    setattr(obj, name, replacement)
+    try:
+        yield original
+    finally:
+        setattr(obj, name, original)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def months(n: int) -> List[Tuple[int, int]]:
+    """由 113/12 往前 n 個月：[(民國年, 月)]"""
+    out, y, m = [], 113, 12
+    for _ in range(n):
+        out.append((y, m))
+        y, m = (y - 1, 12) if m == 1 else (y, m - 1)
+    return out
+
+
+def quarters(n: int) -> List[Tuple[int, int]]:
+    """由 113 Q4 往前 n 季：[(民國年, 季)]"""
+    out, y, s = [], 113, 4
+    for _ in range(n):
+        out.append((y, s))
+        y, s = (y - 1, 4) if s == 1 else (y, s - 1)
+    return out
+
+
+###############################################################################
+# 各種模式（在子行程裡執行，讓 peak RSS 互不影響）
+###############################################################################
+
+def _monthly_http(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    from endpoints import t21sc03_url
+    from http_fetch import fetch_monthly_income_http
+    from scheduler import run_periods
+
+    fetch = timer.wrap(fetch_monthly_income_http)
+    stats = run_periods(periods, lambda p: fetch(t21sc03_url(*p), out), workers)
+    return stats.success
+
+
+def _monthly_html(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    from endpoints import t21sc03_url
+    from scheduler import run_periods
+    from t21sc03_parser import fetch_monthly_income_parsed
+
+    fetch = timer.wrap(fetch_monthly_income_parsed)
+    stats = run_periods(periods, lambda p: fetch(t21sc03_url(*p), out), workers)
+    return stats.success
+
+
+def _monthly_async(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    from async_engine import AsyncEngine
+    from endpoints import t21sc03_url
+    from http_fetch import fetch_monthly_income_async
+
+    engine = AsyncEngine({"monthly_income": workers})
+
+    async def job(p):
+        t0 = time.perf_counter()
+        try:
+            return await fetch_monthly_income_async(engine, t21sc03_url(*p), out)
+        finally:
+            timer.add(time.perf_counter() - t0)
+
+    stats = engine.run(("monthly_income", p, job) for p in periods)
+    return stats.success
+
+
+def _popup_url(market: str, year: int, season: int) -> str:
+    from endpoints import mops_base
+    return (f"{mops_base()}/mops/result?page={QUARTERLY_PAGE}"
+            f"&TYPEK={market}&year={year}&season={season:02d}")
+
+
+def _quarterly_http(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    """不開瀏覽器：替身伺服器的結果頁可直接 GET，之後走與正式流程相同的表單重送"""
+    import form_replay
+    from http_fetch import TIMEOUT, decode_bytes, get_session
+    from scheduler import run_periods
+
+    session = get_session()
+
+    def job(p):
+        url = _popup_url("sii", *p)
+        resp = session.get(url, timeout=TIMEOUT)
+        resp.raise_for_status()
+        payloads = form_replay.collect_payloads(decode_bytes(resp.content), url)
+        results = form_replay.replay_downloads(
+            payloads, out, lambda f: f"sii_{p[0]}_Q{p[1]}_{f.idx}.csv", session, url)
+        return results and all(results.values())
+
+    with patched(form_replay, "fetch_payload", timer.wrap(form_replay.fetch_payload)):
+        stats = run_periods(periods, job, workers)
+    return stats.success
+
+
+def _quarterly_async(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    from async_engine import AsyncEngine
+    from form_replay import collect_payloads, replay_downloads_async
+    from http_fetch import decode_bytes
+
+    class TimedEngine(AsyncEngine):
+        async def fetch_to_file(self, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await super().fetch_to_file(*args, **kwargs)
+            finally:
+                timer.add(time.perf_counter() - t0)
+
+    engine = TimedEngine({"eps": workers})
+
+    async def job(p):
+        url = _popup_url("sii", *p)
+        payloads = collect_payloads(decode_bytes(await engine.fetch_bytes(url)), url)
+        results = await replay_downloads_async(
+            engine, payloads, out, lambda f: f"sii_{p[0]}_Q{p[1]}_{f.idx}.csv", referer=url)
+        return results and all(results.values())
+
+    stats = engine.run(("eps", p, job) for p in periods)
+    return stats.success
+
+
+def _monthly_browser(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+    import monthly
+    from driver_pool import DriverPool
+    from endpoints import t21sc03_url
+    from scheduler import run_periods
+
+    fetch = timer.wrap(monthly.download_monthly_income)
+    with DriverPool(monthly.make_driver, size=workers) as pool:
+        stats = run_periods(periods, lambda p: fetch(t21sc03_url(*p), out, pool), workers)
+    return stats.success
+
+
+def _quarterly_browser(mode: str):
+    def run(periods, out: pathlib.Path, workers: int, timer: Timer) -> int:
+        import form_replay
+        import quarterly
+        from driver_pool import DriverPool
+        from reports import REPORTS
+        from scheduler import run_periods
+        from tab_pool import TabPool
+
+        # quarterly-tabs：同樣重送表單，但 workers 個工作共用一個 Chrome 的分頁
+        pool_cls = TabPool if mode == "quarterly-tabs" else DriverPool
+
+        # 點擊模式：從點下按鈕到檔案改名完成算一個檔案
+        clicked: Dict[int, float] = {}
+        orig_click, orig_wait = quarterly.safe_click_elem, quarterly.wait_for_download
+
+        def click(driver, elem, retries=3):
+            clicked[threading.get_ident()] = time.perf_counter()
+            return orig_click(driver, elem, retries)
+
+        def waited(*args, **kwargs):
+            try:
+                return orig_wait(*args, **kwargs)
+            finally:
+                t0 = clicked.pop(threading.get_ident(), None)
+                if t0 is not None:
+                    timer.add(time.perf_counter() - t0)
+
+        report = REPORTS["eps"]
+        with patched(quarterly, "DOWNLOAD_MODE", "click" if mode == "quarterly-click" else "replay"), \
+             patched(quarterly, "safe_click_elem", click), \
+             patched(quarterly, "wait_for_download", waited), \
+             patched(form_replay, "fetch_payload", timer.wrap(form_replay.fetch_payload)), \
+             pool_cls(quarterly.make_driver, size=workers) as pool:
+            stats = run_periods(
+                periods,
+                lambda p: quarterly.download_mops_data(report, p[0], "sii", p[1],
+                                                       out / f"{p[0]}Q{p[1]}", pool),
+                workers)
+        return stats.success
+    return run
+
+
+MODES: Dict[str, Tuple[Callable[[int], list], Callable]] = {
+    "monthly-http": (months, _monthly_http),
+    "monthly-html": (months, _monthly_html),
+    "monthly-async": (months, _monthly_async),
+    "quarterly-http": (quarters, _quarterly_http),
+    "quarterly-async": (quarters, _quarterly_async),
+    "monthly-browser": (months, _monthly_browser),
+    "quarterly-click": (quarters, _quarterly_browser("quarterly-click")),
+    "quarterly-replay": (quarters, _quarterly_browser("quarterly-replay")),
+    "quarterly-tabs": (quarters, _quarterly_browser("quarterly-tabs")),
+}
+
+
+def run_child(mode: str, base: str, n: int, workers: int, rate: Optional[float]) -> dict:
+    import blob_store
+    import endpoints
+    import rate_limit
+    from transcode import get_transcoder
+
+    endpoints.configure(base, base)
+    host = base.split("//", 1)[-1].split(":", 1)[0]
+    # 預設不限速，量的是程式本身；--rate 可加回 token bucket 看實際節流下的表現
+    rate_limit.HOST_LIMITS[host] = (rate, max(1, int(rate))) if rate else (1e6, 1_000_000)
+
+    make_periods, fn = MODES[mode]
+    periods = make_periods(n)
+    timer = Timer()
+    with tempfile.TemporaryDirectory(prefix=f"bench-{mode}-") as tmp:
+        # 檔案庫也放進暫存資料夾：替身的檔案內容固定，沿用上次的 .blobs 會跳過轉碼、量錯
+        blob_store._default = blob_store.BlobStore(pathlib.Path(tmp) / ".blobs")
+        t0 = time.perf_counter()
+        ok = fn(periods, pathlib.Path(tmp), workers, timer)
+        get_transcoder().close()          # 轉碼也算在總時間內
+        elapsed = time.perf_counter() - t0
+
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "mode": mode,
+        "periods": len(periods),
+        "ok": ok,
+        "files": len(timer.samples),
+        "seconds": round(elapsed, 4),
+        "periods_per_sec": round(ok / elapsed, 3) if elapsed else None,
+        "p50_ms": round(percentile(timer.samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(timer.samples, 0.95) * 1000, 2),
+        "peak_rss_mb": round(self_kb / 1024, 1),
+        "peak_rss_children_mb": round(child_kb / 1024, 1),
+    }
+
+
+###############################################################################
+# 主程式：起替身伺服器，逐一在子行程跑各模式
+###############################################################################
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="以本機 MOPS 替身伺服器比較各下載模式")
+    parser.add_argument("--modes", default=",".join(HTTP_MODES),
+                        help=f"逗號分隔；可選 {', '.join(MODES)}（all 代表含瀏覽器的全部）")
+    parser.add_argument("--periods", type=int, default=12, help="每個模式跑幾個區段")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="替身伺服器基本延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="替身伺服器額外隨機延遲（秒）")
+    parser.add_argument("--companies", type=int, default=1800)
+    parser.add_argument("--files", type=int, default=3, help="每個季報區段的檔案數")
+    parser.add_argument("--fixtures", help="錄製檔目錄（見 mops_standin.StandInServer）")
+    parser.add_argument("--rate", type=float, help="對替身伺服器套用的每秒請求數上限")
+    parser.add_argument("--profile", choices=["scrape", "full"], default="scrape",
+                        help="瀏覽器模式用的 Chrome 設定（見 scrape_profile）")
+    parser.add_argument("--max-inflight", type=int, default=0,
+                        help="替身伺服器同時請求上限，超過回擋請求頁面（測斷路器用）")
+    parser.add_argument("--json", help="結果另存成 JSON 檔")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args.child, args.base, args.periods, args.workers, args.rate)))
+        return
+
+    from mops_standin import StandInServer
+
+    modes = list(MODES) if args.modes == "all" else [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise SystemExit(f"未知的模式: {', '.join(unknown)}")
+
+    results = []
+    with StandInServer(latency=args.latency, jitter=args.jitter, companies=args.companies,
+                       files_per_period=args.files, fixtures=args.fixtures,
+                       max_inflight=args.max_inflight) as srv:
+        print(f"替身伺服器 {srv.url}（latency={args.latency}s jitter={args.jitter}s）")
+        for mode in modes:
+            cmd = [sys.executable, __file__, "--child", mode, "--base", srv.url,
+                   "--periods", str(args.periods), "--workers", str(args.workers)]
+            if args.rate:
+                cmd += ["--rate", str(args.rate)]
+            throttled_before = srv.throttled
+            env = dict(os.environ, BROWSER_PROFILE=args.profile)
+            proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                print(f"❌ {mode} 失敗:\n{proc.stderr.strip()[-2000:]}")
+                continue
+            result = json.loads(lines[-1])
+            result["throttled"] = srv.throttled - throttled_before
+            results.append(result)
+
+    header = f"{'mode':<18}{'ok/periods':>12}{'periods/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>9}{'child MB':>10}{'擋下':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<18}{r['ok']:>5}/{r['periods']:<6}{r['periods_per_sec']:>11}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['peak_rss_mb']:>9}{r['peak_rss_children_mb']:>10}{r['throttled']:>8}")
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2),
+                                           encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import os
+import shutil
+import argparse
+import pathlib
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from manifest import sha256_file
+from transcode import TEXT_SUFFIXES, get_transcoder
+
+###############################################################################
+# 內容定址的檔案庫：同一份 MOPS 檔案只存一份，各區段路徑以 hard link 指過去
+###############################################################################
+
+BLOB_ROOT = pathlib.Path(os.environ.get("MOPS_BLOB_DIR", ".blobs"))
+
+
+class BlobStore:
+    """
+    以「伺服器送來的原始位元組」的 sha256 為鍵，存放轉碼後的最終內容：
+        .blobs/ab/ab12…ef
+    * 下載完的暫存檔交給 commit()：內容已知就丟掉暫存檔，目標路徑直接 link 到既有 blob，
+      不再轉碼，清單裡的雜湊也不變，所以下游不會重新入庫
+    * 新內容照常轉碼，轉完才收進 store（adopt），blob 與區段路徑是同一個 inode
+    * 不支援 hard link 的檔案系統退回複製
+    """
+
+    def __init__(self, root: pathlib.Path = BLOB_ROOT):
+        self.root = pathlib.Path(root)
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> pathlib.Path:
+        return self.root / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.path_for(digest).is_file()
+
+    # -- 寫入 --------------------------------------------------------------------
+
+    def commit(self, src: pathlib.Path, dest: pathlib.Path,
+               digest: Optional[str] = None) -> Tuple[pathlib.Path, bool]:
+        """
+        把剛下載完的 src 放到 dest（可以是同一個路徑），回傳 (dest, 是否為新內容)。
+        digest 是 src 原始內容的 sha256（串流時順手算好），沒給就現算。
+        dest 已存在時以新內容取代，不再產生 name(1).csv 之類的副本。
+        """
+        src, dest = pathlib.Path(src), pathlib.Path(dest)
+        digest = digest or sha256_file(src)
+        with self._lock:
+            blob = self.path_for(digest)
+            if blob.is_file():
+                if not _same_file(blob, dest):
+                    _link_into(blob, dest)
+                if src.resolve() != dest.resolve():
+                    src.unlink(missing_ok=True)
+                return dest, False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+        if dest.suffix.lower() in TEXT_SUFFIXES:
+            # 轉碼完成後（同一個背景工作內）才收進 store；wait_path / wait_dir 會一起等
+            get_transcoder().submit(dest, then=lambda p: self.adopt(p, digest))
+        else:
+            self.adopt(dest, digest)
+        return dest, True
+
+    def adopt(self, path: pathlib.Path, digest: str):
+        """把已是最終內容的 path 收進 store；同內容剛好被別人先收進去時改 link 到那一份"""
+        path = pathlib.Path(path)
+        with self._lock:
+            blob = self.path_for(digest)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if blob.is_file():
+                if not _same_file(blob, path):
+                    _link_into(blob, path)
+                return
+            try:
+                os.link(path, blob)
+            except OSError:
+                _copy_into(path, blob)
+
+    # -- 維護 --------------------------------------------------------------------
+
+    def blobs(self) -> Iterator[pathlib.Path]:
+        if self.root.is_dir():
+            yield from (p for p in self.root.glob("??/*") if p.is_file() and
+                        not p.name.endswith(".part"))
+
+    def prune(self) -> int:
+        """刪掉已經沒有任何區段路徑指向的 blob（link 數只剩自己）"""
+        removed = 0
+        with self._lock:
+            for blob in self.blobs():
+                if blob.stat().st_nlink <= 1:
+                    blob.unlink()
+                    removed += 1
+        return removed
+
+    def stats(self) -> Tuple[int, int, int]:
+        """(blob 數, 實際占用位元組, 各路徑加總的位元組)"""
+        count = stored = referenced = 0
+        for blob in self.blobs():
+            st = blob.stat()
+            count += 1
+            stored += st.st_size
+            referenced += st.st_size * max(1, st.st_nlink - 1)
+        return count, stored, referenced
+
+
+def _same_file(a: pathlib.Path, b: pathlib.Path) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def _link_into(blob: pathlib.Path, dest: pathlib.Path):
+    """dest 原子地換成指向 blob 的 hard link（已存在也直接取代）"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        shutil.copyfile(blob, tmp)
+    os.replace(tmp, dest)
+
+
+def _copy_into(path: pathlib.Path, blob: pathlib.Path):
+    tmp = blob.with_name(blob.name + ".part")
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, blob)
+
+
+_default: Optional[BlobStore] = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> BlobStore:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = BlobStore()
+        return _default
+
+
+def commit(src: pathlib.Path, dest: pathlib.Path, digest: Optional[str] = None) -> pathlib.Path:
+    """下載完成的暫存檔交給預設 store；重複內容直接 link，新內容轉碼後收進 store"""
+    path, fresh = get_store().commit(src, dest, digest)
+    if not fresh:
+        print(f"♻ {path.name} 內容與先前下載的相同，直接沿用")
+    return path
+
+
+###############################################################################
+# 命令列：python blob_store.py --stats / --prune
+###############################################################################
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="MOPS 下載檔案庫（內容定址）")
+    parser.add_argument("--prune", action="store_true", help="刪掉沒有區段路徑使用的 blob")
+    args = parser.parse_args(argv)
+
+    store = get_store()
+    if args.prune:
+        print(f"已刪除 {store.prune()} 個未使用的 blob")
+    count, stored, referenced = store.stats()
+    print(f"{store.root}：{count} 個 blob，占用 {stored / 1e6:.1f} MB，"
+          f"各區段路徑合計 {referenced / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
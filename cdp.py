@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+from urllib.request import urlopen
+
+###############################################################################
+# Chrome DevTools Protocol 連線：browser-level websocket，支援 flatten 的 target session
+###############################################################################
+
+Listener = Callable[[str, dict, Optional[str]], None]   # (method, params, sessionId)
+
+
+class CdpConnection:
+    """
+    一條 websocket 對整個 Chrome：
+    * call() 可帶 session_id，對個別分頁（Target.attachToTarget flatten=True）下指令
+    * 背景執行緒收訊息：回應依 id 配對，事件交給 add_listener 註冊的函式
+    * 多個執行緒可以同時 call()，送出時有鎖
+    """
+
+    def __init__(self, ws_url: str):
+        import websocket   # selenium 本身就依賴 websocket-client
+
+        self._ws = websocket.create_connection(ws_url, suppress_origin=True, timeout=5)
+        self._ws.settimeout(1)
+        self._next_id = 0
+        self._responses: Dict[int, dict] = {}
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._listeners: List[Listener] = []
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @staticmethod
+    def browser_ws_url(driver) -> str:
+        """從 chromedriver 回報的 debuggerAddress 找到 browser websocket"""
+        addr = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        with urlopen(f"http://{addr}/json/version", timeout=5) as resp:
+            return json.load(resp)["webSocketDebuggerUrl"]
+
+    @classmethod
+    def for_driver(cls, driver) -> "CdpConnection":
+        return cls(cls.browser_ws_url(driver))
+
+    # -- 指令 / 事件 -------------------------------------------------------------
+
+    def call(self, method: str, params: Optional[dict] = None,
+             session_id: Optional[str] = None, timeout: float = 10) -> dict:
+        with self._cond:
+            self._next_id += 1
+            msg_id = self._next_id
+        msg = {"id": msg_id, "method": method, "params": params or {}}
+        if session_id:
+            msg["sessionId"] = session_id
+        with self._send_lock:
+            self._ws.send(json.dumps(msg))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while msg_id not in self._responses:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    raise TimeoutError(f"CDP {method} 沒有回應")
+                self._cond.wait(remaining)
+            resp = self._responses.pop(msg_id)
+        if "error" in resp:
+            raise RuntimeError(f"CDP {method} 失敗: {resp['error']}")
+        return resp.get("result", {})
+
+    def add_listener(self, fn: Listener):
+        self._listeners.append(fn)
+
+    def _read_loop(self):
+        import websocket
+
+        while not self._closed:
+            try:
+                raw = self._ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except (websocket.WebSocketException, OSError):
+                break
+            msg = json.loads(raw)
+            if "id" in msg:
+                with self._cond:
+                    self._responses[msg["id"]] = msg
+                    self._cond.notify_all()
+            else:
+                self._on_event(msg.get("method", ""), msg.get("params", {}), msg.get("sessionId"))
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _on_event(self, method: str, params: dict, session_id: Optional[str]):
+        for fn in list(self._listeners):
+            fn(method, params, session_id)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        self._closed = True
+        try:
+            self._ws.close()
+        except Exception:
+            pass
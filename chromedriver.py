@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import pathlib
+import subprocess
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from timing import stage
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+###############################################################################
+# chromedriver 路徑快取：解析一次、記在本機，之後啟動完全不連網
+###############################################################################
+
+CACHE_PATH = pathlib.Path(os.environ.get(
+    "CHROMEDRIVER_CACHE", "~/.cache/stock-project/chromedriver.json")).expanduser()
+# 釘住的 chromedriver 版本（例如 "126.0.6478.126"）；未設定時沿用第一次解析到的版本，
+# 直到 Chrome 升級造成 session 建立失敗才重新解析
+PINNED_VERSION: Optional[str] = os.environ.get("CHROMEDRIVER_VERSION") or None
+# 直接指定執行檔時完全跳過解析
+EXPLICIT_PATH: Optional[str] = os.environ.get("CHROMEDRIVER_PATH") or None
+
+_lock = threading.Lock()
+_resolved: Optional[str] = None
+
+
+def _load_cache() -> dict:
+    try:
+        return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(entry: dict):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + ".part")
+    tmp.write_text(json.dumps(entry, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, CACHE_PATH)
+
+
+def _usable(path: Optional[str]) -> bool:
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _binary_version(path: str) -> Optional[str]:
+    """chromedriver --version → 'ChromeDriver 126.0.6478.126 (...)'"""
+    try:
+        out = subprocess.run([path, "--version"], capture_output=True, text=True,
+                             timeout=10).stdout.split()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out[1] if len(out) > 1 else None
+
+
+def _install(version: Optional[str]) -> str:
+    """唯一會連網的地方：交給 webdriver_manager 下載 / 找出對應版本"""
+    from webdriver_manager.chrome import ChromeDriverManager
+    manager = ChromeDriverManager(driver_version=version) if version else ChromeDriverManager()
+    return manager.install()
+
+
+def driver_path(refresh: bool = False) -> str:
+    """
+    回傳 chromedriver 執行檔路徑：
+    * CHROMEDRIVER_PATH 有設就直接用
+    * 本機快取命中（檔案還在、版本符合 PINNED_VERSION）→ 不 import webdriver_manager、不連網
+    * 否則解析一次並寫回快取
+    同一個行程內只解析一次，多個瀏覽器同時啟動也不會重複下載。
+    """
+    global _resolved
+    if EXPLICIT_PATH:
+        return EXPLICIT_PATH
+    with _lock:
+        if _resolved and not refresh:
+            return _resolved
+        with stage("driver_install") as info:
+            entry = {} if refresh else _load_cache()
+            if (_usable(entry.get("path"))
+                    and (PINNED_VERSION is None or entry.get("version") == PINNED_VERSION)):
+                info["cache"] = "hit"
+            else:
+                info["cache"] = "miss"
+                path = _install(PINNED_VERSION)
+                entry = {"path": path,
+                         "version": PINNED_VERSION or _binary_version(path),
+                         "resolved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                _save_cache(entry)
+            info["version"] = entry.get("version")
+        _resolved = entry["path"]
+        return _resolved
+
+
+def new_chrome(options: "Options") -> "webdriver.Chrome":
+    """
+    以快取的 chromedriver 啟動 Chrome。
+    Chrome 自動升級後舊 driver 會建立 session 失敗：沒有釘版本時重新解析一次再試。
+    """
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        return webdriver.Chrome(service=Service(driver_path()), options=options)
+    except SessionNotCreatedException:
+        if EXPLICIT_PATH or PINNED_VERSION:
+            raise
+        print("⚠ chromedriver 與 Chrome 版本不符，重新解析 driver…")
+        return webdriver.Chrome(service=Service(driver_path(refresh=True)), options=options)
+
+
+def main(argv: Optional[list] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看或重新解析快取的 chromedriver")
+    parser.add_argument("--refresh", action="store_true", help="忽略快取重新解析（需要網路）")
+    args = parser.parse_args(argv)
+    path = driver_path(refresh=args.refresh)
+    print(f"chromedriver: {path}（版本 {_load_cache().get('version') or '未知'}，快取 {CACHE_PATH}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import sqlite3
+import pathlib
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+###############################################################################
+# 個股索引：公司代號 → (報表, 區段) → 分區檔與列位置
+###############################################################################
+
+INDEX_PATH = pathlib.Path("store") / "_company_index.sqlite"   # 與 parquet_store.STORE_ROOT 同層
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS company_rows (
+    code      TEXT    NOT NULL,
+    report    TEXT    NOT NULL,
+    market    TEXT    NOT NULL,
+    year      INTEGER NOT NULL,
+    period    TEXT    NOT NULL,
+    file      TEXT    NOT NULL,
+    row_start INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    PRIMARY KEY (code, report, file)
+);
+CREATE INDEX IF NOT EXISTS company_rows_file ON company_rows (file);
+"""
+
+
+class Location(NamedTuple):
+    report: str
+    market: str
+    year: int
+    period: str
+    file: str
+    row_start: int
+    row_count: int
+
+
+def read_rows(file: str, start: int, count: int,
+              columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    讀分區檔的第 start 列起 count 列：row group 的列數由檔尾 metadata 算出，
+    只解壓涵蓋這段的 row group（入庫時每 parquet_store.ROW_GROUP_ROWS 列一組），不讀整個檔。
+    """
+    pf = pq.ParquetFile(file)
+    if columns is not None:
+        names = set(pf.schema_arrow.names)
+        columns = [c for c in columns if c in names]
+    groups: List[int] = []
+    first = offset = 0
+    for i in range(pf.num_row_groups):
+        n = pf.metadata.row_group(i).num_rows
+        if offset < start + count and offset + n > start:
+            if not groups:
+                first = offset
+            groups.append(i)
+        offset += n
+    return pf.read_row_groups(groups, columns=columns).slice(start - first, count)
+
+
+class CompanyIndex:
+    """
+    入庫時每寫一個分區檔就更新一次（先刪該檔舊紀錄再寫入），所以是增量維護的。
+    分區檔內的列依公司代號排序，同一家公司的列是連續的，只需記起點與列數。
+    查單一公司只碰它出現過的檔案：O(該公司的區段數)。
+    """
+
+    def __init__(self, path: pathlib.Path = INDEX_PATH):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # -- 更新 --------------------------------------------------------------------
+
+    def update_file(self, report: str, market: str, year: int, period: str,
+                    file: pathlib.Path, codes: Iterable[str]):
+        """codes 為該檔依序的公司代號欄（必須已排序）"""
+        codes = np.asarray(codes, dtype=object).astype(str)
+        uniq, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+        rows = [(c, report, market, year, period, str(file), int(s), int(n))
+                for c, s, n in zip(uniq, starts, counts)]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM company_rows WHERE file = ?", (str(file),))
+            self._conn.executemany(
+                "INSERT INTO company_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def drop_file(self, file: pathlib.Path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM company_rows WHERE file = ?", (str(file),))
+
+    # -- 查詢 --------------------------------------------------------------------
+
+    def locations(self, code: str, reports: Optional[Iterable[str]] = None) -> List[Location]:
+        sql = ("SELECT report, market, year, period, file, row_start, row_count "
+               "FROM company_rows WHERE code = ?")
+        params: list = [code]
+        if reports is not None:
+            reports = list(reports)
+            sql += f" AND report IN ({','.join('?' * len(reports))})"
+            params += reports
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY report, year, period", params).fetchall()
+        return [Location(*r) for r in rows]
+
+    def lookup(self, code: str,
+               reports: Optional[Iterable[str]] = None,
+               columns: Optional[List[str]] = None,
+               last: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        """
+        回傳 {報表: 該公司的時間序列}；last=40 表示每種報表只取最近 40 個區段。
+        只讀索引指到的檔案，且每個檔只解壓涵蓋那幾列的 row group。
+        """
+        by_report: Dict[str, List[Location]] = defaultdict(list)
+        for loc in self.locations(code, reports):
+            by_report[loc.report].append(loc)
+
+        result: Dict[str, pd.DataFrame] = {}
+        for report, locs in by_report.items():
+            periods = sorted({(l.year, l.period) for l in locs})
+            if last is not None:
+                periods = set(periods[-last:])
+                locs = [l for l in locs if (l.year, l.period) in periods]
+            frames = []
+            for loc in locs:
+                frame = read_rows(loc.file, loc.row_start, loc.row_count, columns).to_pandas()
+                frame.insert(0, "period", loc.period)
+                frame.insert(0, "year", loc.year)
+                frame.insert(0, "market", loc.market)
+                frames.append(frame)
+            result[report] = (pd.concat(frames, ignore_index=True)
+                              .sort_values(["year", "period"], kind="stable")
+                              .reset_index(drop=True))
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "CompanyIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
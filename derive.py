@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import argparse
+import pathlib
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_float_dtype
+
+from company_index import CompanyIndex
+from manifest import FileRecord
+from parquet_store import (CODE_COL, STORE_ROOT, partition_dir, read_store, to_table,
+                           write_partition_file)
+
+###############################################################################
+# 衍生資料：入庫後由原始報表算出的資料集，同樣寫成分區 Parquet
+###############################################################################
+
+KEY_COLS = ("market", "year", "period")
+QUARTERS = ("Q1", "Q2", "Q3", "Q4")
+
+Keys = Set[Tuple[int, str]]                      # 這次入庫動到的 (年, 季/月)
+Derivation = Callable[[Optional[Keys], pathlib.Path, Optional[CompanyIndex]], List[pathlib.Path]]
+
+
+def numeric_fields(df: pd.DataFrame) -> List[str]:
+    return [c for c in df.columns
+            if c not in KEY_COLS and c != CODE_COL and is_float_dtype(df[c])]
+
+
+def write_partitions(out: pd.DataFrame, report: str, root: pathlib.Path,
+                     index: Optional[CompanyIndex] = None) -> List[pathlib.Path]:
+    """依 (市場, 年, 區段) 各寫一個 part-0.parquet；整個區段覆寫，重算時不會留下舊列"""
+    written: List[pathlib.Path] = []
+    for (market, year, period), part in out.groupby(list(KEY_COLS), sort=False, observed=True):
+        part = part.drop(columns=list(KEY_COLS)).sort_values(CODE_COL, kind="stable")
+        part[CODE_COL] = part[CODE_COL].astype(str).astype("category")
+        part = part.reset_index(drop=True)
+        dest = partition_dir(report, market, int(year), period, root) / "part-0.parquet"
+        write_partition_file(to_table(part), dest)
+        if index is not None:
+            index.update_file(report, market, int(year), period, dest, part[CODE_COL].astype(str))
+        written.append(dest)
+    return written
+
+
+###############################################################################
+# 現金流量表：年初至今累計值 → 單季值
+###############################################################################
+
+CASH_FLOW = "cash_flow"
+CASH_FLOW_Q = "cash_flow_quarterly"
+
+
+def decumulate(cum: pd.DataFrame, fields: List[str]) -> pd.DataFrame:
+    """
+    cum 為累計值（每列一家公司一季，含 公司代號 / year / period 欄）。
+    先把所有列散佈到 公司 × 年 × 季 × 欄位 的陣列，Q2–Q4 一次減掉同年前一季：
+    * 前一季缺檔或該欄位空白 → 單季值為 NaN（不猜）
+    * 同一家公司同一季出現多次（重新下載、換市場）以最後一列為準
+    回傳與 cum 相同的列與欄，只有 fields 換成單季值。
+    """
+    cum = cum[cum["period"].isin(QUARTERS)]
+    cum = cum.drop_duplicates([CODE_COL, "year", "period"], keep="last").reset_index(drop=True)
+    if cum.empty:
+        return cum
+
+    codes = cum[CODE_COL].astype(str).to_numpy()
+    _, ci = np.unique(codes, return_inverse=True)
+    years, yi = np.unique(cum["year"].to_numpy(), return_inverse=True)
+    qi = cum["period"].astype(str).map({q: i for i, q in enumerate(QUARTERS)}).to_numpy()
+
+    values = cum[fields].to_numpy(dtype="float64")
+    grid = np.full((ci.max() + 1, len(years), len(QUARTERS), len(fields)), np.nan)
+    grid[ci, yi, qi] = values
+
+    prev = grid[ci, yi, np.maximum(qi - 1, 0)]
+    prev[qi == 0] = 0.0                               # Q1 本身就是單季
+    out = cum.copy()
+    out[fields] = values - prev
+    return out
+
+
+def derive_cash_flow(keys: Optional[Keys] = None, root: pathlib.Path = STORE_ROOT,
+                     index: Optional[CompanyIndex] = None) -> List[pathlib.Path]:
+    """
+    keys 為 None 時重算全部；否則只重算動到的年度（某季的單季值只依賴同年前一季，
+    所以新增一季或某季被更正時，重寫該年四季就夠了）。
+    """
+    years = None if keys is None else sorted({y for y, p in keys if p in QUARTERS})
+    if years == []:
+        return []
+    try:
+        cum = read_store(CASH_FLOW, years=years, periods=QUARTERS, root=root)
+    except FileNotFoundError:
+        return []
+    if cum.empty:
+        return []
+    out = decumulate(cum, numeric_fields(cum))
+    return write_partitions(out, CASH_FLOW_Q, root, index)
+
+
+###############################################################################
+# 每股盈餘：單季、近四季（TTM）、季增 / 年增率與橫斷面排名
+###############################################################################
+
+EPS = "eps"
+EPS_METRICS = "eps_metrics"
+EPS_KEYWORDS = ("基本每股盈餘", "每股盈餘")
+# 某季變動會影響：該季與下一季的單季值 → 之後四季的 TTM → 再四季的 TTM 年增率，
+# 往前則需要八季的歷史；以年計前後各兩年
+EPS_WINDOW_YEARS = 2
+
+
+def eps_column(df: pd.DataFrame) -> Optional[str]:
+    """t163sb19 各產業格式的欄名略有不同，取第一個數值型的「基本每股盈餘」欄"""
+    fields = numeric_fields(df)
+    for keyword in EPS_KEYWORDS:
+        for col in fields:
+            if keyword in col:
+                return col
+    return None
+
+
+def period_index(df: pd.DataFrame, periods: Tuple[str, ...]) -> np.ndarray:
+    """(年, 季/月) → 連續的整數序號：年 × 每年區段數 + 區段位置"""
+    return df["year"].to_numpy(dtype="int64") * len(periods) + \
+        df["period"].astype(str).map({p: i for i, p in enumerate(periods)}).to_numpy()
+
+
+def period_matrix(df: pd.DataFrame, field: str, periods: Tuple[str, ...] = QUARTERS
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    長表 → 公司 × 連續區段 的矩陣（中間缺的區段為 NaN）。
+    回傳 (矩陣, 每列的公司序號, 每列的區段序號)，用來把矩陣上算好的值對回原本的列。
+    """
+    t = period_index(df, periods)
+    _, ci = np.unique(df[CODE_COL].astype(str).to_numpy(), return_inverse=True)
+    ti = t - t.min()
+    matrix = np.full((ci.max() + 1, ti.max() + 1), np.nan)
+    matrix[ci, ti] = df[field].to_numpy(dtype="float64")
+    return matrix, ci, ti
+
+
+def shift(matrix: np.ndarray, lag: int) -> np.ndarray:
+    out = np.full_like(matrix, np.nan)
+    if lag < matrix.shape[1]:
+        out[:, lag:] = matrix[:, :-lag]
+    return out
+
+
+def rolling_sum(matrix: np.ndarray, n: int) -> np.ndarray:
+    """
+    沿季別方向的最近 n 季合計；窗內任一季缺值即為 NaN。
+    直接加總窗內的 n 個值（不用累加相減），結果只取決於窗內數值、與矩陣從哪一季開始無關，
+    增量重算與全部重算才會一模一樣（排名的同分也才一致）。
+    """
+    out = np.full_like(matrix, np.nan)
+    if n <= matrix.shape[1]:
+        out[:, n - 1:] = np.lib.stride_tricks.sliding_window_view(matrix, n, axis=1).sum(axis=2)
+    return out
+
+
+def growth(matrix: np.ndarray, lag: int) -> np.ndarray:
+    """(本期 − 前期) / |前期|；分母取絕對值，虧轉盈為正、盈轉虧為負，前期為 0 時 NaN"""
+    prev = shift(matrix, lag)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (matrix - prev) / np.abs(prev)
+    out[prev == 0] = np.nan
+    return out
+
+
+def cross_rank(matrix: np.ndarray) -> np.ndarray:
+    """每一季在所有公司之間的百分位排名（0–1，越大越好），缺值不參與"""
+    return pd.DataFrame(matrix).rank(axis=0, pct=True).to_numpy()
+
+
+def eps_metrics(cum: pd.DataFrame) -> pd.DataFrame:
+    """
+    cum 為 t163sb19 入庫後的累計 EPS（每列一家公司一季）。
+    全部公司 × 全部季別放在一個矩陣上一次算完，再依列對回公司與市場。
+    """
+    col = eps_column(cum)
+    if col is None:
+        return cum.iloc[0:0]
+    cum = cum[cum["period"].isin(QUARTERS)]
+    cum = cum.drop_duplicates([CODE_COL, "year", "period"], keep="last").reset_index(drop=True)
+    single = decumulate(cum, [col])            # 已去重，列順序與 cum 相同
+    if single.empty:
+        return single
+    eps_q, ci, ti = period_matrix(single, col)
+    ttm = rolling_sum(eps_q, 4)
+    ttm_yoy = growth(ttm, 4)
+    metrics = {
+        "單季EPS": eps_q,
+        "近四季EPS": ttm,
+        "EPS季增率": growth(eps_q, 1),
+        "EPS年增率": growth(eps_q, 4),
+        "近四季EPS年增率": ttm_yoy,
+        "近四季EPS排名": cross_rank(ttm),
+        "近四季EPS年增率排名": cross_rank(ttm_yoy),
+    }
+    keep = [c for c in (CODE_COL, "公司名稱", *KEY_COLS) if c in single.columns]
+    out = single[keep].copy()
+    out["累計EPS"] = cum[col].to_numpy()
+    for name, matrix in metrics.items():
+        out[name] = matrix[ci, ti]
+    return out
+
+
+def derive_eps_metrics(keys: Optional[Keys] = None, root: pathlib.Path = STORE_ROOT,
+                       index: Optional[CompanyIndex] = None) -> List[pathlib.Path]:
+    """
+    keys 為 None 時重算全部歷史。
+    否則只讀動到的年度前後各 EPS_WINDOW_YEARS 年，只改寫動到的年度起算 EPS_WINDOW_YEARS 年內的分區；
+    新的一季進來時的成本與歷史長度無關。
+    """
+    if keys is None:
+        read_years = write_years = None
+    else:
+        touched = {y for y, p in keys if p in QUARTERS}
+        if not touched:
+            return []
+        w = EPS_WINDOW_YEARS
+        read_years = sorted({y + d for y in touched for d in range(-w, w + 1)})
+        write_years = {y + d for y in touched for d in range(w + 1)}
+    try:
+        cum = read_store(EPS, years=read_years, periods=QUARTERS, root=root)
+    except FileNotFoundError:
+        return []
+    if cum.empty:
+        return []
+    out = eps_metrics(cum)
+    if write_years is not None:
+        out = out[out["year"].isin(write_years)]
+    return write_partitions(out, EPS_METRICS, root, index)
+
+
+###############################################################################
+# 月營收：月增 / 年增率、近 3 / 12 個月合計、累計營收與累計年增率
+###############################################################################
+
+MONTHLY = "monthly_income"
+MONTHLY_METRICS = "monthly_income_metrics"
+MONTHS = tuple(f"{m:02d}" for m in range(1, 13))
+REVENUE_COL = "營業收入-當月營收"
+# 某月的所有指標最遠回看到去年 1 月：累計營收年增率 = 今年 1~m 月 ÷ 去年 1~m 月
+REVENUE_LOOKBACK = 23
+
+
+def revenue_column(df: pd.DataFrame) -> Optional[str]:
+    if REVENUE_COL in df.columns:
+        return REVENUE_COL
+    return next((c for c in numeric_fields(df) if "當月營收" in c), None)
+
+
+def ytd_sum(matrix: np.ndarray, first: int) -> np.ndarray:
+    """
+    同一年內 1 月累計到當月；first 為第 0 欄的月序號（年 × 12 + 月 − 1）。
+    當年有缺月、或矩陣從年中開始（看不到 1 月）時為 NaN。
+    """
+    # 前面補到 1 月、後面補滿 12 個月，攤成 公司 × 年 × 月 後在年內累加：
+    # 每個值都從當年 1 月加起（與矩陣從哪個月開始無關），缺值讓當年之後的月份都成為 NaN
+    rows, n = matrix.shape
+    pad = first % 12
+    grid = np.full((rows, -(-(pad + n) // 12) * 12), np.nan)
+    grid[:, pad:pad + n] = matrix
+    ytd = grid.reshape(rows, -1, 12).cumsum(axis=2).reshape(rows, -1)
+    return ytd[:, pad:pad + n]
+
+
+def revenue_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """df 為月營收入庫資料（每列一家公司一個月）；全部公司 × 月份在一個矩陣上算完"""
+    col = revenue_column(df)
+    if col is None:
+        return df.iloc[0:0]
+    df = df[df["period"].astype(str).isin(MONTHS)]
+    df = df.drop_duplicates([CODE_COL, "year", "period"], keep="last").reset_index(drop=True)
+    if df.empty:
+        return df
+    revenue, ci, ti = period_matrix(df, col, MONTHS)
+    first = int(period_index(df, MONTHS).min())
+    ytd = ytd_sum(revenue, first)
+    metrics = {
+        "當月營收": revenue,
+        "營收月增率": growth(revenue, 1),
+        "營收年增率": growth(revenue, 12),
+        "近3月營收": rolling_sum(revenue, 3),
+        "近12月營收": rolling_sum(revenue, 12),
+        "累計營收": ytd,
+        "累計營收年增率": growth(ytd, 12),
+    }
+    keep = [c for c in (CODE_COL, "公司名稱", "產業別", *KEY_COLS) if c in df.columns]
+    out = df[keep].copy()
+    for name, matrix in metrics.items():
+        out[name] = matrix[ci, ti]
+    return out
+
+
+def derive_monthly_metrics(keys: Optional[Keys] = None, root: pathlib.Path = STORE_ROOT,
+                           index: Optional[CompanyIndex] = None) -> List[pathlib.Path]:
+    """
+    keys 為 None 時重算全部歷史。
+    否則只讀最早動到的月份往前 REVENUE_LOOKBACK 個月起的資料，只改寫動到的月份起
+    REVENUE_LOOKBACK 個月內（已有資料的）分區。每月 10 日新增一個月時只讀兩年、只寫一個月，
+    成本與公司數成正比，與歷史長度無關。
+    """
+    if keys is None:
+        out = _revenue_window(None, None, root)
+    else:
+        touched = [y * 12 + MONTHS.index(p) for y, p in keys if p in MONTHS]
+        if not touched:
+            return []
+        lo, hi = min(touched), max(touched) + REVENUE_LOOKBACK
+        out = _revenue_window(lo - REVENUE_LOOKBACK, hi, root)
+        if not out.empty:
+            t = period_index(out, MONTHS)
+            out = out[(t >= lo) & (t <= hi)]
+    if out.empty:
+        return []
+    return write_partitions(out, MONTHLY_METRICS, root, index)
+
+
+def _revenue_window(lo: Optional[int], hi: Optional[int], root: pathlib.Path) -> pd.DataFrame:
+    years = None if lo is None else list(range(lo // 12, hi // 12 + 1))
+    try:
+        df = read_store(MONTHLY, years=years, periods=MONTHS, root=root)
+    except FileNotFoundError:
+        return pd.DataFrame()
+    if lo is not None and not df.empty:
+        t = period_index(df, MONTHS)
+        df = df[(t >= lo) & (t <= hi)]
+    return revenue_metrics(df) if not df.empty else df
+
+
+###############################################################################
+# 登錄表與增量入口
+###############################################################################
+
+DERIVATIONS: Dict[str, Tuple[str, Derivation]] = {
+    # 來源報表: (衍生資料集, 計算函式)
+    CASH_FLOW: (CASH_FLOW_Q, derive_cash_flow),
+    EPS: (EPS_METRICS, derive_eps_metrics),
+    MONTHLY: (MONTHLY_METRICS, derive_monthly_metrics),
+}
+
+
+def derive_pending(done: Iterable[FileRecord], root: pathlib.Path = STORE_ROOT,
+                   index: Optional[CompanyIndex] = None) -> Dict[str, List[pathlib.Path]]:
+    """ingest_pending 回傳的紀錄 → 只重算受影響的區段"""
+    touched: Dict[str, Keys] = defaultdict(set)
+    for rec in done:
+        touched[rec.report].add((rec.year, rec.period))
+    result: Dict[str, List[pathlib.Path]] = {}
+    for report, keys in touched.items():
+        if report in DERIVATIONS:
+            name, fn = DERIVATIONS[report]
+            result[name] = fn(keys, root, index)
+    return result
+
+
+def derive_all(reports: Optional[Iterable[str]] = None, root: pathlib.Path = STORE_ROOT,
+               index: Optional[CompanyIndex] = None) -> Dict[str, List[pathlib.Path]]:
+    result: Dict[str, List[pathlib.Path]] = {}
+    for report in reports or DERIVATIONS:
+        name, fn = DERIVATIONS[report]
+        result[name] = fn(None, root, index)
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="由已入庫的報表重算衍生資料")
+    parser.add_argument("--report", choices=sorted(DERIVATIONS), help="只重算某一種來源報表")
+    parser.add_argument("--root", default=str(STORE_ROOT), help="Parquet 資料庫根目錄")
+    args = parser.parse_args(argv)
+
+    root = pathlib.Path(args.root)
+    with CompanyIndex(root / "_company_index.sqlite") as index:
+        result = derive_all([args.report] if args.report else None, root, index)
+    for name, files in result.items():
+        print(f"✅ {name}: 寫入 {len(files)} 個分區")
+
+
+if __name__ == "__main__":
+    main()
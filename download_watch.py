@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import pathlib
+import weakref
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Set
+
+from cdp import CdpConnection
+
+###############################################################################
+# 下載完成偵測：CDP Browser.downloadProgress 事件 → inotify → 輪詢
+###############################################################################
+
+PARTIAL_SUFFIXES = {".crdownload", ".tmp", ".partial", ".part"}
+
+
+class CompletedDownload(NamedTuple):
+    guid: str
+    path: pathlib.Path           # 實際寫在磁碟上的檔案（allowAndName 時以 GUID 命名）
+    suggested: str               # 伺服器建議的檔名
+
+
+# -- 1️⃣ CDP 事件 -------------------------------------------------------------
+
+class CdpDownloadWatcher(CdpConnection):
+    """
+    直接連上 Chrome 的 browser-level DevTools websocket，
+    以 Browser.setDownloadBehavior(eventsEnabled) 收 downloadWillBegin / downloadProgress，
+    下載一完成就知道確切的 GUID 與路徑，不必掃目錄。
+    """
+
+    def __init__(self, ws_url: str):
+        self._suggested: Dict[str, str] = {}
+        self._completed: "queue.Queue[CompletedDownload]" = queue.Queue()
+        self._download_dir: Optional[pathlib.Path] = None
+        super().__init__(ws_url)
+
+    @classmethod
+    def attach(cls, driver) -> "CdpDownloadWatcher":
+        return cls.for_driver(driver)
+
+    def _on_event(self, method: str, params: dict, session_id: Optional[str]):
+        if method == "Browser.downloadWillBegin":
+            self._suggested[params["guid"]] = params.get("suggestedFilename", "")
+        elif method == "Browser.downloadProgress" and params.get("state") == "completed":
+            guid = params["guid"]
+            path = params.get("filePath") or str((self._download_dir or pathlib.Path(".")) / guid)
+            self._completed.put(CompletedDownload(guid, pathlib.Path(path),
+                                                  self._suggested.pop(guid, "")))
+        elif method == "Browser.downloadProgress" and params.get("state") == "canceled":
+            self._suggested.pop(params["guid"], None)
+        super()._on_event(method, params, session_id)
+
+    # -- 對外介面 ----------------------------------------------------------------
+
+    def set_download_dir(self, download_dir: pathlib.Path):
+        """切換下載路徑並清掉上一個工作殘留的完成事件"""
+        self._download_dir = pathlib.Path(download_dir).resolve()
+        self.call("Browser.setDownloadBehavior", {
+            "behavior": "allowAndName",
+            "downloadPath": str(self._download_dir),
+            "eventsEnabled": True,
+        })
+        while not self._completed.empty():
+            self._completed.get_nowait()
+
+    def wait_completed(self, timeout: float) -> Optional[CompletedDownload]:
+        try:
+            return self._completed.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+_watchers: "weakref.WeakKeyDictionary[object, CdpDownloadWatcher]" = weakref.WeakKeyDictionary()
+
+
+def attach_watcher(driver) -> Optional[CdpDownloadWatcher]:
+    """替 driver 掛上 CDP 下載事件監聽；連不上時回傳 None，改用檔案系統偵測"""
+    try:
+        watcher = CdpDownloadWatcher.attach(driver)
+    except Exception as e:
+        print(f"⚠ 無法監聽 CDP 下載事件（{e}），改用檔案系統偵測")
+        return None
+    _watchers[driver] = watcher
+    return watcher
+
+
+def watcher_for(driver) -> Optional[CdpDownloadWatcher]:
+    """tab_pool.Tab 自己就會回報下載完成事件，直接當作監聽器"""
+    if driver is None:
+        return None
+    if hasattr(driver, "wait_completed"):
+        return driver
+    return _watchers.get(driver)
+
+
+def detach_watcher(driver):
+    watcher = _watchers.pop(driver, None)
+    if watcher is not None:
+        watcher.close()
+
+
+# -- 2️⃣ inotify（Linux） ------------------------------------------------------
+
+class InotifyWatcher:
+    """以 ctypes 呼叫 inotify，只在檔案寫完 (CLOSE_WRITE) 或改名進來 (MOVED_TO) 時醒來"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = pathlib.Path(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(self.directory.resolve()),
+                                    self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+        if wd < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch 失敗")
+
+    def events(self, timeout: float) -> Iterator[pathlib.Path]:
+        """在 timeout 秒內逐一產出寫完的檔案路徑"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return
+            buf = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(buf):
+                _, _, _, length = self._EVENT.unpack_from(buf, offset)
+                offset += self._EVENT.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if name:
+                    yield self.directory / os.fsdecode(name)
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self) -> "InotifyWatcher":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def inotify_available() -> bool:
+    return sys.platform.startswith("linux")
+
+
+# -- 3️⃣ 統一入口 ---------------------------------------------------------------
+
+def _is_finished(path: pathlib.Path, files_before: Set[pathlib.Path]) -> bool:
+    try:
+        return (path not in files_before
+                and path.suffix not in PARTIAL_SUFFIXES
+                and path.stat().st_size > 0)
+    except FileNotFoundError:
+        return False
+
+
+def _first_finished(paths: Iterable[pathlib.Path], files_before: Set[pathlib.Path]) -> Optional[pathlib.Path]:
+    return next((p for p in paths if _is_finished(p, files_before)), None)
+
+
+def wait_for_file(target_dir: pathlib.Path,
+                  files_before: Set[pathlib.Path],
+                  max_wait: float,
+                  driver=None) -> Optional[pathlib.Path]:
+    """
+    等下一個下載完成並回傳它的路徑。
+
+    * driver 掛有 CDP 監聽（或是 tab_pool.Tab）時：等 downloadProgress=completed，並把 GUID 檔名改回伺服器建議的檔名
+    * 否則在 Linux 上用 inotify；其他平台退回每秒輪詢
+    """
+    target_dir = pathlib.Path(target_dir)
+
+    watcher = watcher_for(driver)
+    if watcher is not None:
+        done = watcher.wait_completed(max_wait)
+        if done is None:
+            return None
+        if done.suggested and done.path.name == done.guid:
+            named = done.path.with_name(os.path.basename(done.suggested))
+            if not named.exists():
+                done.path.rename(named)
+                return named
+        return done.path
+
+    if inotify_available():
+        try:
+            with InotifyWatcher(target_dir) as ino:
+                # 加上監聽前就已寫完的檔案，掃一次補上
+                hit = _first_finished(target_dir.iterdir(), files_before)
+                if hit is not None:
+                    return hit
+                return _first_finished(ino.events(max_wait), files_before)
+        except OSError:
+            pass
+
+    for i in range(int(max_wait)):
+        time.sleep(1)
+        hit = _first_finished(target_dir.iterdir(), files_before)
+        if hit is not None:
+            return hit
+        if (i + 1) % 10 == 0:
+            print(f"等待中... ({i + 1}/{int(max_wait)}s)")
+    return None
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import pathlib
+import queue
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
+
+from download_watch import attach_watcher, detach_watcher, watcher_for
+from scrape_profile import release_for
+from timing import stage
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+###############################################################################
+# WebDriver 連線池：整個 main() 期間保留 N 個暖機好的瀏覽器
+###############################################################################
+
+DriverFactory = Callable[[pathlib.Path], "webdriver.Chrome"]
+
+
+class _Slot:
+    """池中的一個瀏覽器槽位：driver 本體 + 已執行的工作數"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.driver: Optional[webdriver.Chrome] = None
+        self.jobs = 0
+
+
+class DriverPool:
+    """
+    保留 size 個 Chrome 常駐，避免每個 (年, 季) / 月份都重新啟動瀏覽器。
+
+    * lease(download_dir) 取得一個 driver，並以 CDP 把下載路徑指到該工作的資料夾
+    * watch_downloads=True 時替每個 driver 掛上 CDP 下載事件監聽（見 download_watch）
+    * 工作結束後自動清理狀態（關閉多餘視窗、清 cookie / storage、回到空白頁）
+    * 跑滿 max_jobs 個工作、或清理失敗（瀏覽器已崩潰）就關掉重開
+    """
+
+    def __init__(self, factory: DriverFactory, size: int = 1, max_jobs: int = 20,
+                 watch_downloads: bool = True):
+        if size < 1:
+            raise ValueError("size 至少為 1")
+        self.factory = factory
+        self.size = size
+        self.max_jobs = max_jobs
+        self.watch_downloads = watch_downloads
+        self._slots: List[_Slot] = [_Slot(i) for i in range(size)]
+        self._idle: "queue.Queue[_Slot]" = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    # -- 取用 / 歸還 ------------------------------------------------------------
+
+    @contextmanager
+    def lease(self, download_dir: pathlib.Path) -> Iterator[webdriver.Chrome]:
+        """借出一個 driver；with 區塊結束時歸還並重置"""
+        if self._closed:
+            raise RuntimeError("DriverPool 已關閉")
+        download_dir = pathlib.Path(download_dir)
+        download_dir.mkdir(parents=True, exist_ok=True)
+
+        slot = self._idle.get()
+        healthy = True
+        try:
+            if slot.driver is None:
+                with stage("driver_start", slot=slot.index):
+                    slot.driver = self.factory(download_dir)
+                slot.jobs = 0
+                if self.watch_downloads:
+                    attach_watcher(slot.driver)
+            set_download_dir(slot.driver, download_dir)
+            yield slot.driver
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            slot.jobs += 1
+            self._release(slot, healthy)
+
+    def _release(self, slot: _Slot, healthy: bool):
+        try:
+            if slot.driver is None:
+                return
+            if slot.jobs >= self.max_jobs:
+                self._recycle(slot)
+            elif not _reset(slot.driver):
+                # 重置失敗代表瀏覽器已經掛掉，下一次 lease 時重開
+                self._recycle(slot)
+            elif not healthy:
+                print(f"⚠ 瀏覽器 #{slot.index} 工作失敗，已重置狀態後繼續使用")
+        finally:
+            self._idle.put(slot)
+
+    def _recycle(self, slot: _Slot):
+        if slot.driver is not None:
+            detach_watcher(slot.driver)
+        _quit(slot.driver)
+        slot.driver = None
+        slot.jobs = 0
+
+    # -- 生命週期 ----------------------------------------------------------------
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for slot in self._slots:
+            self._recycle(slot)
+
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+###############################################################################
+# 輔助工具
+###############################################################################
+
+def set_download_dir(driver: webdriver.Chrome, download_dir: pathlib.Path):
+    """
+    透過 CDP Page.setDownloadBehavior 改變下載路徑。
+    Chrome 會把設定套用到整個 browser context，所以 pop-up 視窗也吃得到。
+    有掛下載事件監聽時改由監聽器下 Browser.setDownloadBehavior（同時開啟事件）。
+    """
+    watcher = watcher_for(driver)
+    if watcher is not None:
+        watcher.set_download_dir(download_dir)
+        return
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": str(pathlib.Path(download_dir).resolve()),
+    })
+
+
+def _reset(driver: webdriver.Chrome) -> bool:
+    """清掉上一個工作留下的狀態；回傳 False 表示瀏覽器已不可用"""
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        try:
+            driver.execute_script(
+                "try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}"
+            )
+        except WebDriverException:
+            pass
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+        return True
+    except WebDriverException:
+        return False
+
+
+def _quit(driver: Optional[webdriver.Chrome]):
+    if driver is None:
+        return
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+    release_for(driver)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import os
+
+###############################################################################
+# MOPS 網址設定：預設連正式站，可用環境變數或 configure() 指到本機替身伺服器
+###############################################################################
+
+_bases = {
+    "mops": os.environ.get("MOPS_BASE_URL", "https://mops.twse.com.tw"),
+    "mopsov": os.environ.get("MOPSOV_BASE_URL", "https://mopsov.twse.com.tw"),
+}
+
+
+def configure(mops: str | None = None, mopsov: str | None = None):
+    """改變基底網址（benchmark 用來指向 mops_standin）"""
+    if mops:
+        _bases["mops"] = mops
+    if mopsov:
+        _bases["mopsov"] = mopsov
+
+
+def mops_base() -> str:
+    return _bases["mops"].rstrip("/")
+
+
+def mopsov_base() -> str:
+    return _bases["mopsov"].rstrip("/")
+
+
+def mops_page(page_id: str) -> str:
+    """季報查詢頁（SPA），例如 t163sb19"""
+    return f"{mops_base()}/mops/#/web/{page_id}"
+
+
+def t105sb02_action() -> str:
+    return f"{mops_base()}/server-java/t105sb02"
+
+
+def t21sc03_url(year_roc: int, month: int, market: str = "sii") -> str:
+    return f"{mopsov_base()}/nas/t21/{market}/t21sc03_{year_roc}_{month}_0.html"
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import re
+import asyncio
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import requests
+
+from endpoints import t105sb02_action
+from http_fetch import TIMEOUT, get_session, parse_forms, stream_to_file
+from rate_limit import throttle
+from retry import FetchError, retry_call
+from timing import bind, stage
+
+###############################################################################
+# t105sb02 表單重送：不點按鈕，直接用 HTTP 把檔案抓下來
+###############################################################################
+
+_ONCLICK_URL = re.compile(r"""['"]([^'"]*t105sb02[^'"]*)['"]""")
+
+
+class FilePayload(NamedTuple):
+    """pop-up 中一顆下載按鈕所對應的請求"""
+    idx: int                 # 按鈕順序（1 起算，與點擊流程的檔名編號一致）
+    filename: str            # 隱藏欄位 filename
+    action: str
+    method: str
+    fields: Dict[str, str]
+
+
+def collect_payloads(html: str, base_url: str) -> List[FilePayload]:
+    """
+    一次掃過結果頁，把每個 t105sb02 按鈕所在 form 的欄位整理出來。
+    同一個 filename 只保留第一次出現的按鈕（等同原本的 seen_filename）。
+    """
+    payloads: List[FilePayload] = []
+    seen: set[str] = set()
+    idx = 0
+    for form in parse_forms(html):
+        hits = [js for js in form.onclicks if "t105sb02" in js]
+        if not hits and "t105sb02" not in form.action:
+            continue
+        idx += 1
+        filename = form.fields.get("filename", "")
+        if filename in seen:
+            continue
+        seen.add(filename)
+        payloads.append(FilePayload(idx, filename, _resolve_action(form.action, hits, base_url),
+                                    form.method if form.action else "post", dict(form.fields)))
+    return payloads
+
+
+def _resolve_action(action: str, onclicks: List[str], base_url: str) -> str:
+    if "t105sb02" in action:
+        return urljoin(base_url, action)
+    for js in onclicks:
+        m = _ONCLICK_URL.search(js)
+        if m and "/" in m.group(1):
+            return urljoin(base_url, m.group(1))
+    return t105sb02_action()
+
+
+def copy_driver_cookies(driver, session: requests.Session):
+    """把瀏覽器的 cookie 帶進 HTTP session，讓重送的請求與點擊等價"""
+    for c in driver.get_cookies():
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+
+
+def fetch_payload(payload: FilePayload, dest: pathlib.Path,
+                  session: Optional[requests.Session] = None,
+                  referer: Optional[str] = None) -> pathlib.Path:
+    """送出單一表單並直接串流寫到最終檔名"""
+    session = session or get_session()
+    headers = {"Referer": referer} if referer else None
+    throttle(payload.action)
+    with stage("replay_fetch", file=dest.name):
+        if payload.method == "get":
+            resp = session.get(payload.action, params=payload.fields, headers=headers,
+                               timeout=TIMEOUT, stream=True)
+        else:
+            resp = session.post(payload.action, data=payload.fields, headers=headers,
+                                timeout=TIMEOUT, stream=True)
+        with resp:
+            resp.raise_for_status()
+            return stream_to_file(resp, dest)
+
+
+def replay_downloads(payloads: List[FilePayload],
+                     out_dir: pathlib.Path,
+                     name_for: Callable[[FilePayload], str],
+                     session: Optional[requests.Session] = None,
+                     referer: Optional[str] = None,
+                     workers: int = 4) -> Dict[int, Optional[pathlib.Path]]:
+    """
+    以連線池並行抓所有檔案，回傳 {idx: 檔案路徑或 None}。
+    目標檔已存在就直接視為完成，不重複下載。
+    """
+    session = session or get_session()
+    out_dir = pathlib.Path(out_dir)
+
+    def run(p: FilePayload) -> Optional[pathlib.Path]:
+        dest = out_dir / name_for(p)
+        if dest.exists():
+            print(f"⚠ {dest.name} 已存在，跳過下載。")
+            return dest
+        try:
+            path = retry_call(lambda _: fetch_payload(p, dest, session, referer),
+                              p.action, what=dest.name)
+            print(f"✅ 已下載: {path.name}")
+            return path
+        except (FetchError, OSError) as e:
+            print(f"✗ {p.filename or p.idx} 重送失敗（{getattr(e, 'kind', 'os')}）: {e}")
+            return None
+
+    if not payloads:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(payloads)))) as ex:
+        return dict(zip((p.idx for p in payloads), ex.map(bind(run), payloads)))
+
+
+def replay_popup(driver, out_dir: pathlib.Path,
+                 name_for: Callable[[FilePayload], str],
+                 workers: int = 4) -> Dict[int, Optional[pathlib.Path]]:
+    """從目前所在的 pop-up 頁面收集表單，帶著瀏覽器 cookie 一次重送全部"""
+    session = get_session()
+    copy_driver_cookies(driver, session)
+    base_url = driver.current_url
+    payloads = collect_payloads(driver.page_source, base_url)
+    return replay_downloads(payloads, out_dir, name_for, session, base_url, workers)
+
+
+async def replay_downloads_async(engine, payloads: List[FilePayload],
+                                 out_dir: pathlib.Path,
+                                 name_for: Callable[[FilePayload], str],
+                                 referer: Optional[str] = None) -> Dict[int, Optional[pathlib.Path]]:
+    """replay_downloads 的 asyncio 版：每個檔案是一個 coroutine，由 engine 串流寫檔"""
+    out_dir = pathlib.Path(out_dir)
+    headers = {"Referer": referer} if referer else None
+
+    async def run(p: FilePayload) -> Optional[pathlib.Path]:
+        dest = out_dir / name_for(p)
+        if dest.exists():
+            print(f"⚠ {dest.name} 已存在，跳過下載。")
+            return dest
+        body = {"params": p.fields} if p.method == "get" else {"data": p.fields}
+        try:
+            with stage("replay_fetch", file=dest.name):
+                path = await engine.fetch_to_file(p.method.upper(), p.action, dest,
+                                                  headers=headers, **body)
+            print(f"✅ 已下載: {path.name}")
+            return path
+        except (FetchError, OSError) as e:
+            print(f"✗ {p.filename or p.idx} 重送失敗（{getattr(e, 'kind', 'os')}）: {e}")
+            return None
+
+    results = await asyncio.gather(*(run(p) for p in payloads))
+    return dict(zip((p.idx for p in payloads), results))
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+import re
+import hashlib
+import pathlib
+import threading
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limit import throttle
+from retry import check_download, check_page, retry_call
+from blob_store import commit
+from timing import stage
+
+###############################################################################
+# 共用 HTTP Session（keep-alive 連線池）
+###############################################################################
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+TIMEOUT = (5, 30)          # (連線, 讀取) 秒
+CHUNK_SIZE = 64 * 1024
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = 8) -> requests.Session:
+    """回傳全程共用的 Session；同一主機的 TCP/TLS 連線會被重複使用"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            s.headers.update({"User-Agent": USER_AGENT})
+            # 連線層的小失誤由 urllib3 當場重試；429 / 503 等「被擋」交給 retry 與斷路器
+            retry = Retry(total=2, backoff_factor=0.5,
+                          status_forcelist=(502, 504),
+                          allowed_methods=None)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size,
+                                  max_retries=retry)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+###############################################################################
+# 編碼與表單解析
+###############################################################################
+
+def decode_bytes(data: bytes) -> str:
+    """MOPS 頁面 / CSV 不是 UTF-8 就是 Big-5（cp950）"""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp950", errors="replace")
+
+
+class Form:
+    """頁面上一個 <form> 的內容：action、method 與所有欄位值"""
+
+    def __init__(self, action: str, method: str):
+        self.action = action
+        self.method = method.lower() or "get"
+        self.fields: Dict[str, str] = {}
+        self.submit_names: List[str] = []
+        self.onclicks: List[str] = []
+
+    def __repr__(self):
+        return f"Form({self.method.upper()} {self.action!r}, {self.fields!r})"
+
+
+class _FormParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms: List[Form] = []
+        self._current: Optional[Form] = None
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v or "") for k, v in attrs}
+        if tag == "form":
+            self._current = Form(a.get("action", ""), a.get("method", "get"))
+            self.forms.append(self._current)
+            return
+        if self._current is None or tag not in ("input", "button"):
+            return
+        kind = a.get("type", "submit" if tag == "button" else "text").lower()
+        if a.get("onclick"):
+            self._current.onclicks.append(a["onclick"])
+        if kind in ("submit", "button", "image"):
+            if a.get("name"):
+                self._current.submit_names.append(a["name"])
+        elif a.get("name"):
+            self._current.fields[a["name"]] = a.get("value", "")
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._current = None
+
+
+def parse_forms(html: str) -> List[Form]:
+    """把頁面上所有 form 的隱藏欄位一次讀出來"""
+    parser = _FormParser()
+    parser.feed(html)
+    parser.close()
+    return parser.forms
+
+
+###############################################################################
+# 下載
+###############################################################################
+
+_CD_FILENAME = re.compile(r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", re.I)
+
+
+def filename_from_response(resp: requests.Response, default: str) -> str:
+    cd = resp.headers.get("Content-Disposition", "")
+    m = _CD_FILENAME.search(cd)
+    if m:
+        return os.path.basename(unquote(m.group(1).strip()))
+    return default
+
+
+def stream_to_file(resp: requests.Response, dest: pathlib.Path) -> pathlib.Path:
+    """
+    邊收邊寫到暫存檔並同時算 sha256，完成後交給 blob_store：
+    內容與先前下載過的相同就丟掉暫存檔、直接沿用；新內容改名成正式檔名並排入轉碼。
+    第一個 chunk 先檢查：空檔丟 EmptyFile，擋請求的 HTML 丟 Throttled。
+    """
+    dest = pathlib.Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    chunks = resp.iter_content(CHUNK_SIZE)
+    head = next(chunks, b"")
+    check_download(head, dest.name)
+    digest = hashlib.sha256(head)
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(head)
+            for chunk in chunks:
+                digest.update(chunk)
+                fh.write(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return commit(tmp, dest, digest.hexdigest())
+
+
+def _save_html(url: str, html: str, target_dir: pathlib.Path) -> pathlib.Path:
+    """頁面上沒有下載表單時，把 HTML 本身轉成 UTF-8 存檔"""
+    name = pathlib.PurePosixPath(urlsplit(url).path).name or "t21sc03.html"
+    dest = target_dir / name
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    tmp.write_text(html, encoding="utf-8")
+    os.replace(tmp, dest)
+    return dest
+
+
+def _download_form(html: str) -> Optional[Form]:
+    return next((f for f in parse_forms(html) if "download" in f.submit_names), None)
+
+
+def fetch_monthly_income_http(url: str, target_dir: pathlib.Path,
+                              session: Optional[requests.Session] = None) -> pathlib.Path:
+    """
+    不開瀏覽器直接抓 t21sc03 月營收：
+    * GET 靜態 HTML，找到含 download 按鈕的 form，直接送出拿 CSV
+    * 頁面上沒有下載表單時，把 HTML 本身轉成 UTF-8 存檔
+    逾時、被擋、空檔會退避重試；仍失敗時丟出 FetchError，由呼叫端決定是否退回 Selenium。
+    """
+    return retry_call(lambda _: _fetch_monthly_income_http(url, target_dir, session),
+                      url, what=f"月營收 {url}")
+
+
+def _fetch_monthly_income_http(url: str, target_dir: pathlib.Path,
+                               session: Optional[requests.Session]) -> pathlib.Path:
+    session = session or get_session()
+    target_dir = pathlib.Path(target_dir)
+
+    throttle(url)
+    with stage("page_load", via="http"):
+        resp = session.get(url, timeout=TIMEOUT)
+        resp.raise_for_status()
+        check_page(resp.content, "月營收頁面")
+        html = decode_bytes(resp.content)
+
+    form = _download_form(html)
+    if form is None:
+        return _save_html(url, html, target_dir)
+
+    action = urljoin(url, form.action)
+    default = form.fields.get("fileName") or form.fields.get("filename") or "t21sc03.csv"
+    throttle(action)
+    with stage("file_fetch", via="http") as info:
+        if form.method == "post":
+            file_resp = session.post(action, data=form.fields, timeout=TIMEOUT, stream=True)
+        else:
+            file_resp = session.get(action, params=form.fields, timeout=TIMEOUT, stream=True)
+        with file_resp:
+            file_resp.raise_for_status()
+            path = stream_to_file(file_resp, target_dir / filename_from_response(file_resp, default))
+        info["file"] = path.name
+    return path
+
+
+async def fetch_monthly_income_async(engine, url: str, target_dir: pathlib.Path) -> pathlib.Path:
+    """fetch_monthly_income_http 的 asyncio 版，透過 AsyncEngine 取頁與串流寫檔"""
+    target_dir = pathlib.Path(target_dir)
+    with stage("page_load", via="async"):
+        content = await engine.fetch_bytes(url)
+        check_page(content, "月營收頁面")
+        html = decode_bytes(content)
+
+    form = _download_form(html)
+    if form is None:
+        return await engine.run_blocking(_save_html, url, html, target_dir)
+
+    action = urljoin(url, form.action)
+    default = form.fields.get("fileName") or form.fields.get("filename") or "t21sc03.csv"
+    body = {"data": form.fields} if form.method == "post" else {"params": form.fields}
+    # 檔名以表單上的 fileName 為準，不必等回應標頭
+    with stage("file_fetch", via="async", file=default):
+        path = await engine.fetch_to_file(form.method.upper(), action, target_dir / default, **body)
+    return path
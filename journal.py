@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import pathlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+###############################################################################
+# 工作日誌（write-ahead JSON lines）：中斷後重跑可以從斷點接續
+###############################################################################
+
+JOURNAL_DIR = pathlib.Path(".journal")
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".partial", ".tmp")
+
+PLANNED, RUNNING, DONE, FAILED = "planned", "running", "done", "failed"
+
+
+def _key(unit: Any) -> str:
+    return json.dumps(unit, ensure_ascii=False, sort_keys=True)
+
+
+class Journal:
+    """
+    每次執行開頭寫一筆 run（含所有規劃的工作單位與 meta），
+    之後每個單位狀態改變就追加一行並 fsync；程式掛掉時日誌仍完整。
+
+    * pending_units()：上一次執行中還沒完成（未跑、跑到一半、失敗）的單位
+    * failed_units()：上一次執行中失敗的單位，給 --retry-failed 用
+    * unsettled_units()：失敗或跑到一半的單位，規劃時不從磁碟補登記
+    * unattempted_units()：還沒跑或被中斷的單位；--retry-failed 時帶進新的一次執行
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.run_id: Optional[str] = None
+        self.meta: Dict[str, Any] = {}
+        self._units: List[Any] = []
+        self._states: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._fh = None
+        self._load()
+
+    # -- 讀取上一次執行 ----------------------------------------------------------
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break                       # 最後一行寫到一半，忽略
+                if rec.get("event") == "run":
+                    self.run_id = rec["run"]
+                    self.meta = rec.get("meta", {})
+                    self._units = rec["units"]
+                    self._states = {_key(u): PLANNED for u in self._units}
+                    self._errors = {}
+                elif rec.get("event") == "unit" and rec.get("run") == self.run_id:
+                    self._states[_key(rec["unit"])] = rec["state"]
+                    if rec.get("error"):
+                        self._errors[_key(rec["unit"])] = rec["error"]
+
+    def pending_units(self) -> List[Any]:
+        return [u for u in self._units if self._states.get(_key(u)) != DONE]
+
+    def failed_units(self) -> List[Any]:
+        return [u for u in self._units if self._states.get(_key(u)) == FAILED]
+
+    def unattempted_units(self) -> List[Any]:
+        """上一次執行中還沒跑、或跑到一半被中斷的單位（不含失敗的）"""
+        return [u for u in self._units if self._states.get(_key(u)) in (PLANNED, RUNNING)]
+
+    def unsettled_units(self) -> List[Any]:
+        """上一次執行中失敗或跑到一半的單位：磁碟上的檔案可能不齊，不能直接當作已完成"""
+        return [u for u in self._units if self._states.get(_key(u)) in (RUNNING, FAILED)]
+
+    def error_of(self, unit: Any) -> Optional[str]:
+        return self._errors.get(_key(unit))
+
+    # -- 寫入 --------------------------------------------------------------------
+
+    def start_run(self, units: Iterable[Any], meta: Optional[Dict[str, Any]] = None,
+                  carry: Iterable[Any] = ()):
+        """
+        開始新的一次執行；舊的紀錄只保留到這裡為止（整檔原子替換）。
+        carry 是這次不會執行、但要留給之後 --resume 的單位（--retry-failed 時上一次
+        還沒跑到的單位），一起寫進計畫、狀態維持 planned。
+        """
+        self.close()
+        self.run_id = uuid.uuid4().hex
+        self.meta = dict(meta or {})
+        units = list(units)
+        seen = {_key(u) for u in units}
+        self._units = units + [u for u in carry if _key(u) not in seen]
+        self._states = {_key(u): PLANNED for u in self._units}
+        self._errors = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps({"event": "run", "run": self.run_id, "ts": time.time(),
+                                 "meta": self.meta, "units": self._units},
+                                ensure_ascii=False) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def mark(self, unit: Any, state: str, error: Optional[str] = None):
+        rec = {"event": "unit", "run": self.run_id, "ts": time.time(),
+               "unit": unit, "state": state}
+        if error:
+            rec["error"] = error
+        with self._lock:
+            self._states[_key(unit)] = state
+            if self._fh is None:
+                return
+            self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cleanup_partials(dirs: Iterable[pathlib.Path]) -> int:
+    """刪除中斷時殘留的 .crdownload / .part 等未完成檔案，回傳刪除數"""
+    removed = 0
+    for d in {pathlib.Path(d) for d in dirs}:
+        if not d.is_dir():
+            continue
+        for p in d.iterdir():
+            if p.suffix in PARTIAL_SUFFIXES and p.is_file():
+                p.unlink(missing_ok=True)
+                removed += 1
+    if removed:
+        print(f"🧹 已清除 {removed} 個未完成的暫存檔")
+    return removed
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import re
+import time
+import sqlite3
+import hashlib
+import pathlib
+import threading
+from typing import Callable, Collection, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+###############################################################################
+# 下載清單（SQLite）：啟動瀏覽器前先排除已同步的區段
+###############################################################################
+
+MANIFEST_PATH = pathlib.Path(".mops_manifest.sqlite")
+HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    report     TEXT    NOT NULL,
+    market     TEXT    NOT NULL,
+    year       INTEGER NOT NULL,
+    period     TEXT    NOT NULL,       -- 'Q1'..'Q4' / 'all' / '01'..'12'
+    idx        INTEGER NOT NULL,
+    path       TEXT    NOT NULL,
+    size       INTEGER NOT NULL,
+    sha256     TEXT    NOT NULL,
+    fetched_at REAL    NOT NULL,
+    PRIMARY KEY (report, market, year, period, idx)
+);
+CREATE TABLE IF NOT EXISTS periods (
+    report     TEXT    NOT NULL,
+    market     TEXT    NOT NULL,
+    year       INTEGER NOT NULL,
+    period     TEXT    NOT NULL,
+    files      INTEGER NOT NULL,
+    synced_at  REAL    NOT NULL,
+    PRIMARY KEY (report, market, year, period)
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    report      TEXT    NOT NULL,
+    market      TEXT    NOT NULL,
+    year        INTEGER NOT NULL,
+    period      TEXT    NOT NULL,
+    idx         INTEGER NOT NULL,
+    sha256      TEXT    NOT NULL,
+    ingested_at REAL    NOT NULL,
+    PRIMARY KEY (report, market, year, period, idx)
+);
+"""
+
+_IDX_IN_NAME = re.compile(r"_(\d+)\.[^.]+$")
+
+T = TypeVar("T")
+
+
+class FileRecord(NamedTuple):
+    report: str
+    market: str
+    year: int
+    period: str
+    idx: int
+    path: str
+    sha256: str
+
+
+def sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def quarter_label(season) -> str:
+    """季別欄位：1 -> 'Q1'；None / 'all' -> 'all'"""
+    return f"Q{season}" if season and season != "all" else "all"
+
+
+def month_label(month: int) -> str:
+    return f"{month:02d}"
+
+
+class Manifest:
+    """
+    每個已下載檔案一筆（報表, 市場, 年, 季/月, 序號 → 大小、雜湊、下載時間），
+    每個完整同步的區段一筆；main() 用 plan_missing() 只排還沒有的區段。
+    """
+
+    def __init__(self, path: pathlib.Path = MANIFEST_PATH):
+        self.path = pathlib.Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # -- 查詢 --------------------------------------------------------------------
+
+    def synced_periods(self, report: str, market: str) -> Set[Tuple[int, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT year, period FROM periods WHERE report = ? AND market = ?",
+                (report, market)).fetchall()
+        return {(y, p) for y, p in rows}
+
+    def expected_files(self, report: str, market: str) -> Optional[int]:
+        """完整區段應有的檔案數：取這個報表 / 市場已同步區段中最多的；還沒同步過時為 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(files) FROM periods WHERE report = ? AND market = ?",
+                (report, market)).fetchone()
+        return row[0]
+
+    def plan_missing(self, report: str, market: str, items: Iterable[T],
+                     key: Callable[[T], Tuple[int, str]],
+                     locate: Optional[Callable[[T], Tuple[pathlib.Path, str]]] = None,
+                     expected: Optional[int] = None,
+                     unsettled: Collection[T] = ()) -> List[T]:
+        """
+        過濾掉已同步的區段；key(item) -> (year, period)。
+        只查一次資料庫，十年份的區段也是毫秒等級。
+        locate(item) -> (資料夾, glob) 時，清單裡沒有但磁碟上已有完整檔案的區段會被補登記：
+        * 檔案數要達到 expected（沒給時用 expected_files()；兩者都沒有就不補登記）
+        * unsettled 中的項目（日誌記錄為失敗或中斷）一律重新下載，磁碟上的檔案可能不齊
+        """
+        done = self.synced_periods(report, market)
+        if expected is None:
+            expected = self.expected_files(report, market)
+        unsettled = set(unsettled)
+        missing: List[T] = []
+        for item in items:
+            year, period = key(item)
+            if (year, period) in done:
+                continue
+            if locate is not None and expected and item not in unsettled:
+                out_dir, pattern = locate(item)
+                if self.record_dir(report, market, year, period, out_dir, pattern, expected):
+                    continue
+            missing.append(item)
+        return missing
+
+    # -- 寫入 --------------------------------------------------------------------
+
+    def record_file(self, report: str, market: str, year: int, period: str,
+                    idx: int, path: pathlib.Path):
+        path = pathlib.Path(path)
+        size = path.stat().st_size
+        digest = sha256_file(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (report, market, year, period, idx, str(path), size, digest, time.time()))
+
+    def mark_synced(self, report: str, market: str, year: int, period: str, files: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO periods VALUES (?, ?, ?, ?, ?, ?)",
+                (report, market, year, period, files, time.time()))
+
+    def record_dir(self, report: str, market: str, year: int, period: str,
+                   out_dir: pathlib.Path, pattern: str, expected: int = 1) -> int:
+        """
+        把 out_dir 中符合 pattern 的檔案全部登記，並標記該區段已同步；
+        檔案數不到 expected 時什麼都不做、回傳 0（只下載了一部分的區段要重抓）。
+        """
+        files = sorted(pathlib.Path(out_dir).glob(pattern))
+        if len(files) < expected:
+            return 0
+        for n, path in enumerate(files, 1):
+            m = _IDX_IN_NAME.search(path.name)
+            self.record_file(report, market, year, period, int(m.group(1)) if m else n, path)
+        if files:
+            self.mark_synced(report, market, year, period, len(files))
+        return len(files)
+
+    # -- 入庫（parquet_store）追蹤 -----------------------------------------------
+
+    def pending_ingest(self, report: Optional[str] = None) -> List[FileRecord]:
+        """還沒入庫、或內容（雜湊）已經變了的檔案"""
+        sql = """
+            SELECT f.report, f.market, f.year, f.period, f.idx, f.path, f.sha256
+            FROM files f
+            LEFT JOIN ingested i
+              ON i.report = f.report AND i.market = f.market AND i.year = f.year
+             AND i.period = f.period AND i.idx = f.idx
+            WHERE (i.sha256 IS NULL OR i.sha256 <> f.sha256)
+        """
+        params: Tuple = ()
+        if report is not None:
+            sql += " AND f.report = ?"
+            params = (report,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY f.report, f.market, f.year, f.period, f.idx",
+                                      params).fetchall()
+        return [FileRecord(*r) for r in rows]
+
+    def mark_ingested(self, rec: FileRecord):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (rec.report, rec.market, rec.year, rec.period, rec.idx, rec.sha256, time.time()))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,234 @@
+# Selenium 只在 HTTP 失敗、真的要開瀏覽器時才載入
+import pathlib
+from dateutil.relativedelta import relativedelta
+from datetime import date
+
+from blob_store import commit
+from chromedriver import new_chrome
+from download_watch import wait_for_file
+from driver_pool import DriverPool
+from endpoints import t21sc03_url
+from http_fetch import fetch_monthly_income_async, fetch_monthly_income_http
+from rate_limit import throttle
+from scrape_profile import PROFILE, new_scrape_chrome
+from retry import EmptyFile, FetchError, FetchTimeout, MissingButton, check_page, retry_call
+from tab_pool import TabPool
+from timing import stage
+
+###############################################################################
+# 月營收（t21sc03）下載：HTTP 優先、瀏覽器退路，與 sync.py 的排程分開
+###############################################################################
+
+FETCH_MODE = "auto"   # "http" 只走 HTTP；"browser" 只用 Selenium；"auto" 先 HTTP，失敗退回瀏覽器
+                      # "html" 抓靜態頁面在本機解析成 CSV（需要 lxml / pandas）
+DOWNLOAD_WAITS = (15, 30, 60)   # 瀏覽器下載逐次拉長的等待秒數
+
+def parse_ym(s: str) -> date:
+    """'YYYY-MM' 轉 datetime.date（取該月 1 號）"""
+    y, m = map(int, s.split("-"))
+    return date(y, m, 1)
+
+def ym_iter(start: date, end: date):
+    """從 start 跑到 end（含），每次加一個月"""
+    curr = start
+    while curr <= end:
+        yield curr
+        curr += relativedelta(months=+1)
+
+def roc(year: int) -> int:
+    return year - 1911
+
+def build_url(year, month, market="sii") -> str:
+    year_roc = roc(year)
+    return t21sc03_url(year_roc, month, market)
+
+def make_driver(target_dir):
+    """建立無頭 Chrome，預設下載路徑指向 target_dir"""
+    from selenium.webdriver.chrome.options import Options
+
+    # ─── 1. 建立 ChromeOptions，寫入下載偏好 ───────────────────
+    chrome_opts = Options()
+    prefs = {
+        "download.default_directory": str(pathlib.Path(target_dir).resolve()),
+        "download.prompt_for_download": False,
+        "safebrowsing.enabled": True
+    }
+    chrome_opts.add_experimental_option("prefs", prefs)
+    chrome_opts.add_argument("--log-level=3")
+    chrome_opts.add_argument("--headless=new")  # 無頭模式
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+
+    # ─── 2. 啟動 Driver ───────────────────────────────────────
+    # chromedriver 路徑走本機快取（見 chromedriver.py），不每次重新解析
+    if PROFILE == "scrape":
+        return new_scrape_chrome(chrome_opts)
+    return new_chrome(chrome_opts)
+
+def download_monthly_income(url, target_dir, pool=None):
+    """
+    下載月營收資料
+    
+    Args:
+        url: 下載網址
+        target_dir: 目標資料夾路徑
+        pool: DriverPool 或 TabPool，未提供時開一個用完即關的瀏覽器
+    
+    Returns:
+        pathlib.Path: 下載的檔案路徑，失敗則返回 None
+    """
+    if pool is None:
+        with DriverPool(make_driver, size=1, max_jobs=1) as pool:
+            return download_monthly_income(url, target_dir, pool)
+
+    # ─── 0. 設定「想存檔」的資料夾 ──────────────────────────────
+    target_dir = pathlib.Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    attempt = _browser_attempt_tab if isinstance(pool, TabPool) else _browser_attempt
+
+    # 逾時、被擋、按鈕沒出來：退避後重開頁面，等待時間逐次拉長（DOWNLOAD_WAITS）
+    try:
+        return retry_call(lambda n: attempt(url, target_dir, pool, n), url, f"月營收 {url}")
+    except FetchError as e:
+        print(f"❌ 瀏覽器下載失敗（{e.kind}）: {e}")
+        return None
+
+def _browser_attempt(url, target_dir, pool, n):
+    """Selenium 開頁、點下載、等檔案一次；失敗丟出分類過的例外"""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    with pool.lease(target_dir) as browser:
+        # ─── 3. 開頁、點下載 ──────────────────────────────────────
+        print(f"正在訪問: {url}")
+        throttle(url)
+        with stage("page_load", via="browser"):
+            browser.get(url)
+
+            # 等待頁面載入並尋找下載按鈕
+            try:
+                button = WebDriverWait(browser, 10).until(
+                    EC.element_to_be_clickable((By.NAME, "download")))
+            except TimeoutException:
+                check_page(browser.page_source, "月營收頁面")
+                raise MissingButton("找不到下載按鈕") from None
+
+        # 記錄下載前的檔案
+        files_before = set(target_dir.glob("*"))
+
+        with stage("click"):
+            button.click()
+        print("已點擊下載按鈕...")
+
+        # ─── 4. 等待檔案下載完成（CDP 事件 / inotify，最後才輪詢） ──
+        return _wait_download(target_dir, files_before, browser, n)
+
+def _browser_attempt_tab(url, target_dir, pool, n):
+    """_browser_attempt 的分頁版：同一個 Chrome 的多個分頁各自下載，互不搶檔"""
+    with pool.lease(target_dir) as tab:
+        print(f"正在訪問: {url}")
+        throttle(url)
+        with stage("page_load", via="tab"):
+            tab.get(url)
+            try:
+                tab.wait_until("!!document.getElementsByName('download')[0]", 10)
+            except TimeoutError:
+                check_page(tab.evaluate("document.documentElement.outerHTML"), "月營收頁面")
+                raise MissingButton("找不到下載按鈕") from None
+
+        files_before = set(target_dir.glob("*"))
+        with stage("click"):
+            tab.evaluate("document.getElementsByName('download')[0].click()")
+        print("已點擊下載按鈕...")
+
+        return _wait_download(target_dir, files_before, tab, n)
+
+def _wait_download(target_dir, files_before, source, n):
+    max_wait = DOWNLOAD_WAITS[min(n, len(DOWNLOAD_WAITS) - 1)]
+    with stage("download_wait") as info:
+        file_path = wait_for_file(target_dir, files_before, max_wait, source)
+        info["timed_out"] = file_path is None
+    if file_path is None:
+        raise FetchTimeout(f"{max_wait} 秒內沒有下載完成")
+    if file_path.stat().st_size == 0:
+        file_path.unlink()
+        raise EmptyFile(f"{file_path.name} 下載內容為空")
+    print(f"✅ 檔案下載完成: {file_path.name}")
+    return commit(file_path, file_path)
+
+def fetch_monthly_income(url, target_dir, pool=None, mode=FETCH_MODE):
+    """
+    依 mode 取得月營收檔案；HTTP 路徑不需要安裝 Chrome。
+
+    Returns:
+        pathlib.Path: 下載的檔案路徑，失敗則返回 None
+    """
+    if mode == "html":
+        from t21sc03_parser import fetch_monthly_income_parsed
+        try:
+            return fetch_monthly_income_parsed(url, target_dir)
+        except Exception as e:
+            print(f"❌ 解析頁面失敗: {e}")
+            return None
+    if mode in ("auto", "http"):
+        try:
+            return fetch_monthly_income_http(url, target_dir)
+        except Exception as e:
+            if not _browser_may_help(e, mode):
+                return None
+    return download_monthly_income(url, target_dir, pool)
+
+async def fetch_monthly_income_engine(engine, url, target_dir, pool=None, mode=FETCH_MODE):
+    """fetch_monthly_income 的 asyncio 版；瀏覽器退路在執行緒中跑"""
+    if mode == "html":
+        return await engine.run_blocking(fetch_monthly_income, url, target_dir, pool, mode)
+    if mode in ("auto", "http"):
+        try:
+            return await fetch_monthly_income_async(engine, url, target_dir)
+        except Exception as e:
+            if not _browser_may_help(e, mode):
+                return None
+    return await engine.run_blocking(download_monthly_income, url, target_dir, pool)
+
+def _browser_may_help(e, mode):
+    """
+    HTTP 失敗後要不要改用瀏覽器：被擋或查無資料時換瀏覽器只會更糟，直接放棄。
+    例外已經過 retry 分類（見 http_fetch）。
+    """
+    kind = getattr(e, "kind", type(e).__name__)
+    if mode == "http" or getattr(e, "throttled", False) or not getattr(e, "retryable", True):
+        print(f"❌ HTTP 下載失敗（{kind}）: {e}")
+        return False
+    print(f"⚠ HTTP 下載失敗（{kind}: {e}），改用瀏覽器…")
+    return True
+
+def ask_int(prompt, valid_func):
+    while True:
+        try:
+            value = int(input(prompt))
+            if valid_func(value):
+                return value
+            print("輸入不在允許範圍，請重新輸入 (2013 - 2025)")
+        except ValueError:
+            print("請輸入整數")
+
+def ask_range():
+    while True:
+        raw = input("請輸入年月 (YYYY-MM) 或範圍 (YYYY-MM~YYYY-MM)：").strip()
+        try:
+            if "~" in raw:
+                s, e = map(str.strip, raw.split("~"))
+                start, end = parse_ym(s), parse_ym(e)
+                if start > end:
+                    raise ValueError("起始不得晚於結束")
+            else:
+                start = end = parse_ym(raw)
+
+            if not (date(2013,1,1) <= start <= date(2025,12,1) and
+                    date(2013,1,1) <= end   <= date(2025,12,1)):
+                raise ValueError("僅支援 2013-01 ~ 2025-12")
+            return start, end
+        except Exception as e:
+            print("❌", e, "‧ 請重新輸入")
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import re
+import time
+import random
+import argparse
+import pathlib
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+###############################################################################
+# 本機 MOPS 替身伺服器：離線重現查詢頁、pop-up、t105sb02 下載與 t21sc03 頁面
+###############################################################################
+
+INDUSTRIES = ["水泥工業", "食品工業", "塑膠工業", "紡織纖維", "電機機械", "半導體業",
+              "電腦及週邊設備業", "金融保險業"]
+
+
+# -- 1️⃣ 假資料（以檔名為種子，內容固定可重現） ---------------------------------
+
+def _companies(n: int) -> List[Tuple[str, str, str]]:
+    """(代號, 名稱, 產業) × n"""
+    return [(f"{1101 + i}", f"公司{1101 + i}", INDUSTRIES[i % len(INDUSTRIES)]) for i in range(n)]
+
+
+def quarterly_csv(filename: str, companies: int) -> bytes:
+    rng = random.Random(filename)
+    lines = ["公司代號,公司名稱,營業收入,營業成本,營業利益（損失）,本期淨利（淨損）,基本每股盈餘（元）"]
+    for code, name, _ in _companies(companies):
+        rev = rng.randint(10_000, 50_000_000)
+        cost = int(rev * rng.uniform(0.5, 0.95))
+        op = int((rev - cost) * rng.uniform(0.2, 0.9))
+        net = int(op * rng.uniform(0.6, 1.1))
+        lines.append(f'{code},{name},"{rev:,}","{cost:,}","{op:,}","{net:,}",{net / 1e6:.2f}')
+    return ("\r\n".join(lines) + "\r\n").encode("cp950")
+
+
+def _monthly_rows(roc: int, month: int, companies: int):
+    rng = random.Random(f"t21sc03_{roc}_{month}")
+    for code, name, industry in _companies(companies):
+        cur = rng.randint(1_000, 30_000_000)
+        last_m = int(cur * rng.uniform(0.8, 1.2))
+        last_y = int(cur * rng.uniform(0.7, 1.3))
+        cum = cur * month
+        cum_ly = last_y * month
+        yield (industry, code, name, cur, last_m, last_y,
+               (cur - last_m) / last_m * 100, (cur - last_y) / last_y * 100,
+               cum, cum_ly, (cum - cum_ly) / cum_ly * 100)
+
+
+def t21sc03_html(roc: int, month: int, market: str, companies: int) -> bytes:
+    by_industry: dict = {}
+    for row in _monthly_rows(roc, month, companies):
+        by_industry.setdefault(row[0], []).append(row)
+    parts = [f"<html><head><meta http-equiv='Content-Type' content='text/html; charset=big5'>"
+             f"<title>{roc}年{month}月營業收入統計表</title></head><body>"]
+    for industry, rows in by_industry.items():
+        parts.append(f"<table border=1><tr><th colspan=11 align=left>產業別：{industry}</th></tr>"
+                     "<tr><th>公司代號</th><th>公司名稱</th><th>當月營收</th><th>上月營收</th>"
+                     "<th>去年當月營收</th><th>上月比較增減(%)</th><th>去年同月增減(%)</th>"
+                     "<th>當月累計營收</th><th>去年累計營收</th><th>前期比較增減(%)</th><th>備註</th></tr>")
+        for _, code, name, cur, lm, ly, mom, yoy, cum, cly, cg in rows:
+            parts.append(f"<tr><td>{code}</td><td>{name}</td><td>{cur:,}</td><td>{lm:,}</td>"
+                         f"<td>{ly:,}</td><td>{mom:.2f}</td><td>{yoy:.2f}</td><td>{cum:,}</td>"
+                         f"<td>{cly:,}</td><td>{cg:.2f}</td><td>-</td></tr>")
+        parts.append("<tr><td colspan=2>合計</td>" + "<td></td>" * 9 + "</tr></table>")
+    parts.append("<form action='/server-java/FileDownLoad' method='post'>"
+                 "<input type='hidden' name='step' value='9'>"
+                 "<input type='hidden' name='functionName' value='show_file2'>"
+                 f"<input type='hidden' name='filePath' value='/t21/{market}/'>"
+                 f"<input type='hidden' name='fileName' value='t21sc03_{roc}_{month}.csv'>"
+                 "<input type='submit' name='download' value='另存CSV'></form></body></html>")
+    return "".join(parts).encode("cp950")
+
+
+def t21sc03_csv(roc: int, month: int, companies: int) -> bytes:
+    lines = ["出表日期,資料年月,公司代號,公司名稱,產業別,營業收入-當月營收,營業收入-上月營收,"
+             "營業收入-去年當月營收,營業收入-上月比較增減(%),營業收入-去年同月增減(%),"
+             "累計營業收入-當月累計營收,累計營業收入-去年累計營收,累計營業收入-前期比較增減(%),備註"]
+    for industry, code, name, cur, lm, ly, mom, yoy, cum, cly, cg in _monthly_rows(roc, month, companies):
+        lines.append(f"{roc}/{month:02d}/10,{roc}/{month},{code},{name},{industry},{cur},{lm},{ly},"
+                     f"{mom:.2f},{yoy:.2f},{cum},{cly},{cg:.2f},-")
+    return ("\r\n".join(lines) + "\r\n").encode("cp950")
+
+
+SPA_HTML = """<html><head><meta charset="utf-8"><title>MOPS stand-in</title></head><body>
+<select id="TYPEK"><option value="sii">上市</option><option value="otc">上櫃</option>
+<option value="rotc">興櫃</option><option value="pub">公開發行</option></select>
+<input name="year" type="text">
+<select id="season"><option value="01">1</option><option value="02">2</option>
+<option value="03">3</option><option value="04">4</option></select>
+<button id="searchBtn" type="button" onclick="search()">查詢</button>
+<script>
+function search() {
+  var page = location.hash.split('/').pop() || 't163sb04';
+  var q = 'page=' + page
+        + '&TYPEK=' + document.getElementById('TYPEK').value
+        + '&year=' + encodeURIComponent(document.getElementsByName('year')[0].value)
+        + '&season=' + document.getElementById('season').value;
+  window.open('/mops/result?' + q, '_blank');
+}
+</script></body></html>"""
+
+
+def popup_html(page: str, market: str, year: str, season: str, files: int) -> bytes:
+    forms = []
+    names = [f"{page}_{market}_{year}_{season}_{i}.csv" for i in range(1, files + 1)]
+    names.append(names[0])          # 重複的按鈕，驗證 seen_filename 去重
+    for name in names:
+        forms.append(
+            "<form method='post'>"
+            "<input type='hidden' name='step' value='9'>"
+            f"<input type='hidden' name='filePath' value='/home/html/nas/{page}/'>"
+            f"<input type='hidden' name='filename' value='{name}'>"
+            "<button type='button' onclick=\"this.form.action='/server-java/t105sb02';"
+            "this.form.submit();\">下載</button></form>")
+    return (f"<html><head><meta charset='utf-8'><title>{page}</title></head><body>"
+            + "".join(forms) + "</body></html>").encode("utf-8")
+
+
+# -- 2️⃣ HTTP handler ----------------------------------------------------------
+
+# 同時請求超過 max_inflight 時回的頁面（與 MOPS 擋請求時一樣是 200 + HTML）
+THROTTLE_HTML = ("<html><body><center><h3>FOR SECURITY REASONS, THIS PAGE CAN NOT BE ACCESSED!"
+                 "</h3></center></body></html>")
+
+_T21 = re.compile(r"^/nas/t21/(\w+)/t21sc03_(\d+)_(\d+)_0\.html$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):     # 安靜模式
+        pass
+
+    def _send(self, body: bytes, ctype: str, filename: Optional[str] = None):
+        self.server.delay()
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        if filename:
+            self.send_header("Content-Disposition", f"attachment; filename={filename}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length).decode("utf-8", "replace")
+        return {k: v[0] for k, v in parse_qs(data).items()}
+
+    def _throttled(self) -> bool:
+        if self.server.over_limit():
+            self._send(THROTTLE_HTML.encode("utf-8"), "text/html; charset=utf-8")
+            return True
+        return False
+
+    def do_GET(self):
+        with self.server.inflight():
+            if not self._throttled():
+                self._do_GET()
+
+    def do_POST(self):
+        with self.server.inflight():
+            if self._throttled():
+                self._form()
+            else:
+                self._do_POST()
+
+    def _do_GET(self):
+        url = urlsplit(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        srv = self.server
+        if url.path in ("/mops/", "/mops"):
+            return self._send(SPA_HTML.encode("utf-8"), "text/html; charset=utf-8")
+        if url.path == "/mops/result":
+            page = q.get("page", "t163sb04")
+            body = srv.fixture("popup", f"{page}.html") or popup_html(
+                page, q.get("TYPEK", "sii"), q.get("year", "0"), q.get("season", "00"),
+                srv.files_per_period)
+            return self._send(body, "text/html; charset=utf-8")
+        m = _T21.match(url.path)
+        if m:
+            market, roc, month = m.group(1), int(m.group(2)), int(m.group(3))
+            body = (srv.fixture("t21sc03", pathlib.PurePosixPath(url.path).name)
+                    or t21sc03_html(roc, month, market, srv.companies))
+            return self._send(body, "text/html; charset=big5")
+        self.send_error(404)
+
+    def _do_POST(self):
+        url = urlsplit(self.path)
+        form = self._form()
+        srv = self.server
+        if url.path == "/server-java/t105sb02":
+            name = form.get("filename", "unknown.csv")
+            body = srv.fixture("t105sb02", name) or quarterly_csv(name, srv.companies)
+            return self._send(body, "application/csv", name)
+        if url.path == "/server-java/FileDownLoad":
+            name = form.get("fileName", "t21sc03.csv")
+            m = re.match(r"t21sc03_(\d+)_(\d+)\.csv", name)
+            body = srv.fixture("FileDownLoad", name) or (
+                t21sc03_csv(int(m.group(1)), int(m.group(2)), srv.companies) if m else b"")
+            return self._send(body, "application/csv", name)
+        self.send_error(404)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    latency / jitter 模擬 MOPS 回應時間（秒）；fixtures 目錄下有錄製檔時優先回錄製檔：
+    fixtures/popup/<page>.html、fixtures/t105sb02/<filename>、
+    fixtures/t21sc03/<頁面檔名>、fixtures/FileDownLoad/<fileName>
+    max_inflight > 0 時，同時處理中的請求超過上限就回擋請求頁面，用來測斷路器。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 companies: int = 1800, files_per_period: int = 3,
+                 fixtures: Optional[pathlib.Path] = None, max_inflight: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.max_inflight = max_inflight
+        self.throttled = 0
+        self._inflight = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.companies = companies
+        self.files_per_period = files_per_period
+        self.fixtures = pathlib.Path(fixtures) if fixtures else None
+        self._rng = random.Random(0)
+        self._rng_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def delay(self):
+        with self._rng_lock:
+            d = self.latency + self._rng.uniform(0, self.jitter)
+        if d > 0:
+            time.sleep(d)
+
+    @contextmanager
+    def inflight(self):
+        with self._rng_lock:
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            with self._rng_lock:
+                self._inflight -= 1
+
+    def over_limit(self) -> bool:
+        with self._rng_lock:
+            over = 0 < self.max_inflight < self._inflight
+            self.throttled += over
+        return over
+
+    def fixture(self, kind: str, name: str) -> Optional[bytes]:
+        if self.fixtures is None:
+            return None
+        path = self.fixtures / kind / name
+        return path.read_bytes() if path.is_file() else None
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="本機 MOPS 替身伺服器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每個回應的基本延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="額外隨機延遲上限（秒）")
+    parser.add_argument("--companies", type=int, default=1800)
+    parser.add_argument("--files", type=int, default=3, help="每個區段的下載檔數")
+    parser.add_argument("--fixtures", help="錄製檔目錄")
+    parser.add_argument("--max-inflight", type=int, default=0,
+                        help="同時請求上限，超過就回擋請求頁面（0 表示不限）")
+    args = parser.parse_args(argv)
+
+    srv = StandInServer(args.port, args.latency, args.jitter, args.companies, args.files,
+                        args.fixtures, args.max_inflight)
+    print(f"MOPS 替身伺服器：{srv.url}（MOPS_BASE_URL / MOPSOV_BASE_URL 設成這個網址即可）")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from derive import MONTHS, QUARTERS, numeric_fields
+from parquet_store import CODE_COL, STORE_ROOT, read_store
+
+###############################################################################
+# 公司 × 區段 面板：欄位 × 公司 × 區段 的連續 NumPy 陣列，跨報表對齊只是陣列運算
+###############################################################################
+
+# 月報表的 year 是西元年、季報表是民國年（見 reports.Unit）；其他都當季報表
+MONTHLY_REPORTS = {"monthly_income", "monthly_income_metrics"}
+
+
+class Axis:
+    """
+    不可變的座標軸（排序過的公司代號或區段序號）。
+    以 intern_axis 取得：內容相同的軸是同一個物件，兩個面板軸相同時對齊不必做任何事。
+    """
+
+    __slots__ = ("labels", "__weakref__")
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+        self.labels.setflags(write=False)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def positions(self, labels: np.ndarray) -> np.ndarray:
+        """labels 在這條軸上的位置，不在軸上的為 -1"""
+        idx = np.searchsorted(self.labels, labels)
+        idx = np.minimum(idx, max(len(self.labels) - 1, 0))
+        hit = len(self.labels) > 0 and self.labels[idx] == labels
+        return np.where(hit, idx, -1)
+
+    def union(self, other: "Axis") -> "Axis":
+        return self if other is self else intern_axis(np.union1d(self.labels, other.labels))
+
+    def intersect(self, other: "Axis") -> "Axis":
+        return self if other is self else intern_axis(np.intersect1d(self.labels, other.labels))
+
+    def __repr__(self):
+        return f"Axis({len(self)} labels)"
+
+
+_axes: "weakref.WeakValueDictionary[Tuple[str, bytes], Axis]" = weakref.WeakValueDictionary()
+_axes_lock = threading.Lock()
+
+
+def intern_axis(labels: Iterable) -> Axis:
+    """同內容共用同一個 Axis（與其 labels 陣列）；公司代號存成定長 Unicode，不是一堆 Python 字串"""
+    arr = np.asarray(labels)
+    if arr.dtype.kind == "O":
+        arr = arr.astype(str)
+    arr = np.unique(arr)
+    key = (arr.dtype.str, arr.tobytes())
+    with _axes_lock:
+        axis = _axes.get(key)
+        if axis is None:
+            axis = Axis(arr)
+            _axes[key] = axis
+        return axis
+
+
+###############################################################################
+# 區段序號：統一成「區段結束月」的西元月序號（年 × 12 + 月 − 1）
+###############################################################################
+
+def month_ordinal(df: pd.DataFrame, monthly: bool) -> np.ndarray:
+    year = df["year"].to_numpy(dtype="int64")
+    period = df["period"].astype(str)
+    if monthly:
+        return year * 12 + period.map({p: i for i, p in enumerate(MONTHS)}).to_numpy()
+    year = np.where(year <= 1911, year + 1911, year)
+    return year * 12 + period.map({q: i * 3 + 2 for i, q in enumerate(QUARTERS)}).to_numpy()
+
+
+def period_label(ordinal: int, monthly: bool = False) -> str:
+    year, month = divmod(int(ordinal), 12)
+    return f"{year}-{month + 1:02d}" if monthly else f"{year}Q{month // 3 + 1}"
+
+
+###############################################################################
+# Panel
+###############################################################################
+
+class Panel:
+    """
+    values[f, c, t]：欄位 f、公司 c、區段 t；缺值為 NaN（mask 為 ~isnan）。
+    * codes / periods 是 intern 過的 Axis，periods 為區段結束月序號，季與月可以放在同一條軸上
+    * 記憶體固定為 欄位數 × 公司數 × 區段數 × dtype 大小，不隨字串或列數膨脹
+    * 不同報表先 align 到同一組軸，之後 eps["近四季EPS"] / op["營業利益率"] 就是逐元素運算
+    """
+
+    def __init__(self, codes: Axis, periods: Axis, fields: Sequence[str], values: np.ndarray,
+                 monthly: bool = False):
+        if values.shape != (len(fields), len(codes), len(periods)):
+            raise ValueError(f"values 形狀 {values.shape} 與軸長度不符")
+        self.codes = codes
+        self.periods = periods
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.values = np.ascontiguousarray(values)
+        self.monthly = monthly
+        self._field_pos = {f: i for i, f in enumerate(self.fields)}
+
+    # -- 建立 --------------------------------------------------------------------
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, fields: Optional[Sequence[str]] = None,
+                   monthly: bool = False, dtype: str = "float64") -> "Panel":
+        """長表（每列一家公司一個區段）→ Panel；同一家公司同一區段重複時以最後一列為準"""
+        fields = list(fields) if fields is not None else numeric_fields(df)
+        df = df[df["period"].astype(str).isin(MONTHS if monthly else QUARTERS)]
+        df = df.drop_duplicates([CODE_COL, "year", "period"], keep="last")
+        t = month_ordinal(df, monthly)
+        codes = intern_axis(df[CODE_COL].astype(str).to_numpy())
+        periods = intern_axis(t)
+        values = np.full((len(fields), len(codes), len(periods)), np.nan, dtype=dtype)
+        ci = codes.positions(df[CODE_COL].astype(str).to_numpy())
+        ti = periods.positions(t)
+        values[:, ci, ti] = df[fields].to_numpy(dtype=dtype).T
+        return cls(codes, periods, fields, values, monthly)
+
+    @classmethod
+    def load(cls, report: str, fields: Optional[Sequence[str]] = None,
+             markets: Optional[Iterable[str]] = None, years: Optional[Iterable[int]] = None,
+             root: pathlib.Path = STORE_ROOT, dtype: str = "float64") -> "Panel":
+        """從 parquet_store 讀一個報表（或衍生資料集）；只讀需要的欄位與分區"""
+        columns = None if fields is None else [CODE_COL, "year", "period", *fields]
+        df = read_store(report, columns=columns, markets=markets, years=years, root=root)
+        return cls.from_frame(df, fields, monthly=report in MONTHLY_REPORTS, dtype=dtype)
+
+    # -- 取值 --------------------------------------------------------------------
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """單一欄位的 公司 × 區段 矩陣（view，不複製）"""
+        try:
+            return self.values[self._field_pos[field]]
+        except KeyError:
+            raise KeyError(f"面板沒有欄位 {field!r}（可用：{', '.join(self.fields)}）") from None
+
+    @property
+    def mask(self) -> np.ndarray:
+        """True 表示有值"""
+        return ~np.isnan(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.codes.labels.nbytes + self.periods.labels.nbytes
+
+    def code_row(self, code: str) -> int:
+        pos = int(self.codes.positions(np.asarray([code]))[0])
+        if pos < 0:
+            raise KeyError(code)
+        return pos
+
+    def series(self, code: str, field: str) -> pd.Series:
+        return pd.Series(self[field][self.code_row(code)], name=field,
+                         index=[period_label(t, self.monthly) for t in self.periods.labels])
+
+    # -- 對齊 / 合併 ---------------------------------------------------------------
+
+    def reindex(self, codes: Optional[Axis] = None, periods: Optional[Axis] = None) -> "Panel":
+        """換到另一組軸上；新軸上沒有的格子為 NaN。軸相同時直接回傳自己"""
+        codes = self.codes if codes is None else codes
+        periods = self.periods if periods is None else periods
+        if codes is self.codes and periods is self.periods:
+            return self
+        if not len(self.codes) or not len(self.periods):
+            values = np.full((len(self.fields), len(codes), len(periods)), np.nan,
+                             self.values.dtype)
+            return Panel(codes, periods, self.fields, values, self.monthly)
+        ci = self.codes.positions(codes.labels)
+        ti = self.periods.positions(periods.labels)
+        values = self.values[:, np.maximum(ci, 0)][:, :, np.maximum(ti, 0)]
+        values[:, ci < 0] = np.nan
+        values[:, :, ti < 0] = np.nan
+        return Panel(codes, periods, self.fields, values, self.monthly)
+
+    def select(self, fields: Sequence[str]) -> "Panel":
+        pos = [self._field_pos[f] for f in fields]
+        return Panel(self.codes, self.periods, fields, self.values[pos], self.monthly)
+
+    def rename(self, prefix: str) -> "Panel":
+        return Panel(self.codes, self.periods, [f"{prefix}{f}" for f in self.fields],
+                     self.values, self.monthly)
+
+    def to_quarters(self, how: str = "sum") -> "Panel":
+        """
+        月資料 → 季資料（軸換成季末月份）：how="sum" 三個月加總（任一月缺值即 NaN），
+        "last" 取季末那個月。
+        """
+        labels = self.periods.labels
+        ends = np.unique(labels - labels % 3 + 2)
+        quarters = intern_axis(ends)
+        if how == "last":
+            last = self.reindex(periods=quarters)
+            return Panel(self.codes, quarters, self.fields, last.values)
+        if how != "sum":
+            raise ValueError(f"未知的 how={how!r}（sum / last）")
+        total = np.zeros((len(self.fields), len(self.codes), len(quarters)), self.values.dtype)
+        for lag in range(3):
+            months = intern_axis(ends - lag)
+            total += self.reindex(periods=months).values
+        return Panel(self.codes, quarters, self.fields, total)
+
+    def to_frame(self, dropna: bool = True) -> pd.DataFrame:
+        """回到長表：公司代號、區段、各欄位"""
+        c, t = np.meshgrid(np.arange(len(self.codes)), np.arange(len(self.periods)),
+                           indexing="ij")
+        flat = self.values.reshape(len(self.fields), -1).T
+        df = pd.DataFrame(flat, columns=list(self.fields))
+        df.insert(0, "period", [period_label(x, self.monthly)
+                                for x in self.periods.labels[t.ravel()]])
+        df.insert(0, CODE_COL, pd.Categorical.from_codes(c.ravel(), self.codes.labels))
+        if dropna:
+            df = df[~np.isnan(flat).all(axis=1)].reset_index(drop=True)
+        return df
+
+    def __repr__(self):
+        labels = [period_label(x, self.monthly) for x in self.periods.labels[[0, -1]]] \
+            if len(self.periods) else []
+        span = "~".join(labels) or "空"
+        return (f"Panel({len(self.fields)} 欄 × {len(self.codes)} 家 × {len(self.periods)} 區段 "
+                f"[{span}], {self.nbytes / 1e6:.1f} MB)")
+
+
+def align(*panels: Panel, how: str = "inner") -> List[Panel]:
+    """
+    把多個面板放到同一組公司 / 區段軸上；inner 取交集、outer 取聯集。
+    月資料要與季資料對齊時先 to_quarters，否則只會留下季末月份。
+    """
+    if how not in ("inner", "outer"):
+        raise ValueError(f"未知的 how={how!r}（inner / outer）")
+    codes, periods = panels[0].codes, panels[0].periods
+    for p in panels[1:]:
+        codes = codes.intersect(p.codes) if how == "inner" else codes.union(p.codes)
+        periods = periods.intersect(p.periods) if how == "inner" else periods.union(p.periods)
+    return [p.reindex(codes, periods) for p in panels]
+
+
+def join(panels: Dict[str, Panel], how: str = "inner") -> Panel:
+    """
+    {名稱: 面板} 對齊後疊成一個面板；欄名重複時加上「名稱.」前綴。
+    例：join({"eps": eps, "op": op, "rev": rev.to_quarters()})
+    """
+    names = list(panels)
+    aligned = align(*panels.values(), how=how)
+    seen: Dict[str, int] = {}
+    for p in aligned:
+        for f in p.fields:
+            seen[f] = seen.get(f, 0) + 1
+    fields: List[str] = []
+    for name, p in zip(names, aligned):
+        fields += [f"{name}.{f}" if seen[f] > 1 else f for f in p.fields]
+    values = np.concatenate([p.values for p in aligned], axis=0)
+    return Panel(aligned[0].codes, aligned[0].periods, fields, values, aligned[0].monthly)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import os
+import re
+import argparse
+import pathlib
+from typing import Iterable, List, Optional
+
+import pandas as pd
+from pandas.api.types import is_object_dtype, is_string_dtype
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from company_index import CompanyIndex
+from manifest import FileRecord, Manifest
+from transcode import sniff_encoding
+
+###############################################################################
+# Parquet 資料庫：每個下載檔轉成有型別的欄式資料，依 報表/市場/年/季(月) 分區
+###############################################################################
+
+STORE_ROOT = pathlib.Path("store")
+CODE_COL = "公司代號"
+TEXT_COLS = {"公司名稱", "公司簡稱", "產業別", "備註", "出表日期", "資料年月"}
+MISSING = ["", "--", "-", "—", "N/A", "NA", "不適用"]
+NUMERIC_RATIO = 0.9        # 非空值中至少九成轉得成數字才視為數值欄
+ROW_GROUP_ROWS = 256       # 分區檔每幾列一個 row group：個股查詢只解壓涵蓋該公司的那一組
+
+CODE_TYPE = pa.dictionary(pa.int32(), pa.string())
+PARTITIONING = ds.partitioning(
+    pa.schema([("market", pa.string()), ("year", pa.int16()), ("period", pa.string())]),
+    flavor="hive",
+)
+
+
+###############################################################################
+# 讀 MOPS CSV → 有型別的 DataFrame
+###############################################################################
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """MOPS 的欄名常夾空白或換行（例如「公司 代號」），一律去掉"""
+    df.columns = [re.sub(r"\s+", "", str(c)) for c in df.columns]
+    return df
+
+
+def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """千分位逗號、'--' 等清掉後整欄轉 float64；轉不成的欄位維持文字"""
+    for col in df.columns:
+        if col == CODE_COL or col in TEXT_COLS:
+            continue
+        # pandas 3 起 dtype=str 讀進來是 str（string）型別，不再是 object
+        if not (is_object_dtype(df[col]) or is_string_dtype(df[col])):
+            continue
+        s = df[col].str.replace(",", "", regex=False).str.strip()
+        s = s.mask(s.isin(MISSING))
+        present = int(s.notna().sum())
+        num = pd.to_numeric(s, errors="coerce")
+        if present == 0 or num.notna().sum() >= NUMERIC_RATIO * present:
+            df[col] = num.astype("float64")
+    return df
+
+
+def read_mops_csv(path: pathlib.Path) -> pd.DataFrame:
+    """
+    讀一個 MOPS 下載檔：
+    * 依開頭位元組判斷編碼（已轉好的 UTF-8 BOM 或原始 Big-5）
+    * 去掉中途重複出現的表頭列與沒有公司代號的列
+    * 數值欄轉 float64，公司代號轉 category（寫入時為 dictionary 編碼）
+    * 依公司代號排序，讓個股索引只需記錄每家公司的起始列與列數
+    """
+    encoding = sniff_encoding(path)
+    df = pd.read_csv(path, dtype=str, encoding=encoding, keep_default_na=False,
+                     skipinitialspace=True)
+    df = _normalize_columns(df)
+    if CODE_COL not in df.columns:
+        raise ValueError(f"{pathlib.Path(path).name} 找不到「{CODE_COL}」欄位")
+    return _finalize(df)
+
+
+def _finalize(df: pd.DataFrame) -> pd.DataFrame:
+    """CSV 與 HTML 共用的後處理：去表頭列、依代號排序、轉型別"""
+    df[CODE_COL] = df[CODE_COL].astype(str).str.strip()
+    df = df[(df[CODE_COL] != "") & (df[CODE_COL] != CODE_COL)].copy()
+    df = df.sort_values(CODE_COL, kind="stable")
+    df[CODE_COL] = df[CODE_COL].astype("category")
+    return _coerce_numeric(df).reset_index(drop=True)
+
+
+def read_report_file(path: pathlib.Path) -> pd.DataFrame:
+    """CSV 走 read_mops_csv；t21sc03 的 HTML 頁面（HTTP 退路存下來的）交給 t21sc03_parser"""
+    path = pathlib.Path(path)
+    if path.suffix.lower() in (".html", ".htm"):
+        from t21sc03_parser import parse_file
+        return _finalize(parse_file(path))
+    return read_mops_csv(path)
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # category 的 index 寬度會隨公司數變（int8/int16），固定成 int32 才能跨檔合併 schema
+    i = table.schema.get_field_index(CODE_COL)
+    return table.set_column(i, CODE_COL, table.column(i).cast(CODE_TYPE))
+
+
+###############################################################################
+# 寫入 / 讀取
+###############################################################################
+
+def partition_dir(report: str, market: str, year: int, period: str,
+                  root: pathlib.Path = STORE_ROOT) -> pathlib.Path:
+    return (pathlib.Path(root) / f"report={report}" / f"market={market}"
+            / f"year={year}" / f"period={period}")
+
+
+def write_partition_file(table: pa.Table, dest: pathlib.Path) -> pathlib.Path:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    pq.write_table(table, tmp, compression="zstd", row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp, dest)
+    return dest
+
+
+def ingest_file(path: pathlib.Path, report: str, market: str, year: int, period: str,
+                idx: int, root: pathlib.Path = STORE_ROOT,
+                index: Optional[CompanyIndex] = None) -> pathlib.Path:
+    """
+    把一個下載檔寫成 <root>/report=/market=/year=/period=/part-<idx>.parquet，
+    有傳 index 時同步更新個股索引。
+    """
+    df = read_report_file(path)
+    dest = partition_dir(report, market, year, period, root) / f"part-{idx}.parquet"
+    write_partition_file(to_table(df), dest)
+    if index is not None:
+        index.update_file(report, market, year, period, dest, df[CODE_COL].astype(str))
+    return dest
+
+
+def open_dataset(report: str, root: pathlib.Path = STORE_ROOT) -> ds.Dataset:
+    """
+    開啟某報表的整個資料集。同一報表不同產業格式的檔案欄位不盡相同，
+    這裡把各檔 schema 聯集起來，缺的欄位讀出來是 null。
+    """
+    base = pathlib.Path(root) / f"report={report}"
+    dataset = ds.dataset(base, format="parquet", partitioning=PARTITIONING)
+    schemas = [frag.physical_schema for frag in dataset.get_fragments()]
+    if len(schemas) <= 1:
+        return dataset
+    unified = pa.unify_schemas(schemas + [PARTITIONING.schema])
+    return ds.dataset(base, schema=unified, format="parquet", partitioning=PARTITIONING)
+
+
+def period_filter(markets: Optional[Iterable[str]] = None,
+                  years: Optional[Iterable[int]] = None,
+                  periods: Optional[Iterable[str]] = None) -> Optional[ds.Expression]:
+    expr: Optional[ds.Expression] = None
+    for name, values in (("market", markets), ("year", years), ("period", periods)):
+        if values is None:
+            continue
+        cond = ds.field(name).isin(list(values))
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def read_store(report: str,
+               columns: Optional[List[str]] = None,
+               markets: Optional[Iterable[str]] = None,
+               years: Optional[Iterable[int]] = None,
+               periods: Optional[Iterable[str]] = None,
+               root: pathlib.Path = STORE_ROOT) -> pd.DataFrame:
+    """只讀需要的欄位與分區；分區條件會直接跳過不相干的檔案"""
+    dataset = open_dataset(report, root)
+    table = dataset.to_table(columns=columns,
+                             filter=period_filter(markets, years, periods))
+    return table.to_pandas()
+
+
+###############################################################################
+# 增量入庫：只處理下載清單中新增或內容變動的檔案
+###############################################################################
+
+def ingest_pending(manifest: Manifest, report: Optional[str] = None,
+                   root: pathlib.Path = STORE_ROOT,
+                   index: Optional[CompanyIndex] = None) -> List[FileRecord]:
+    done: List[FileRecord] = []
+    for rec in manifest.pending_ingest(report):
+        path = pathlib.Path(rec.path)
+        if path.suffix.lower() not in (".csv", ".html", ".htm") or not path.exists():
+            continue
+        try:
+            ingest_file(path, rec.report, rec.market, rec.year, rec.period, rec.idx, root, index)
+        except (ValueError, OSError, pa.ArrowException, pd.errors.ParserError) as e:
+            print(f"✗ {path.name} 入庫失敗: {e}")
+            continue
+        manifest.mark_ingested(rec)
+        done.append(rec)
+    return done
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="把已下載的報表轉成分區 Parquet")
+    parser.add_argument("--report", help="只處理某一種報表（eps / operating_profit / cash_flow / monthly_income）")
+    parser.add_argument("--root", default=str(STORE_ROOT), help="Parquet 資料庫根目錄")
+    args = parser.parse_args(argv)
+
+    root = pathlib.Path(args.root)
+    with Manifest() as manifest, CompanyIndex(root / "_company_index.sqlite") as index:
+        done = ingest_pending(manifest, args.report, root, index)
+        # 衍生資料（單季現金流量等）只重算這次動到的區段
+        from derive import derive_pending
+        derived = derive_pending(done, root, index)
+    print(f"=== 完成：入庫 {len(done)} 個檔案 ===")
+    for name, files in derived.items():
+        print(f"   {name}: 更新 {len(files)} 個分區")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+from __future__ import annotations
+
+import time
+import json
+import asyncio
+import pathlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+# Selenium 只在真的要開瀏覽器時才載入（見各函式開頭），HTTP 路徑與 --help 秒開
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from reports import QuarterlyReport
+
+from async_engine import AsyncEngine
+from blob_store import commit
+from chromedriver import new_chrome
+from download_watch import wait_for_file
+from driver_pool import DriverPool
+from endpoints import mops_page, t105sb02_action
+from form_replay import (collect_payloads, copy_driver_cookies, replay_downloads,
+                         replay_downloads_async, replay_popup)
+from http_fetch import get_session
+from rate_limit import throttle
+from scrape_profile import PROFILE, new_scrape_chrome
+from retry import (Backoff, FetchError, FetchTimeout, MissingButton, Throttled, check_page,
+                   is_throttle_page, retry_call)
+from tab_pool import Popup, Tab, TabPool
+from timing import stage
+
+###############################################################################
+# 季報下載（t163sb19 / t163sb06 / t163sb20 共用）：三支腳本原本逐行相同的流程
+###############################################################################
+
+DOWNLOAD_MODE = "replay"   # "replay" 直接重送 t105sb02 表單；"click" 逐顆點擊下載按鈕
+DOWNLOAD_WAITS = (30, 60, 120)   # 點擊下載逐次拉長的等待秒數；逾時就重點一次
+CLICK_BACKOFF = Backoff(base=0.25, cap=2.0, attempts=3)   # stale element 重新定位的間隔
+
+###############################################################################
+# 解析輸入格式
+###############################################################################
+
+def parse_year_season(text: str) -> Tuple[int, Optional[int]]:
+    """'110-01' -> (110, 1);  '110' -> (110, None)"""
+    parts = text.split('-', 1)
+    year = int(parts[0])
+    season = int(parts[1].lstrip('0') or 0) if len(parts) == 2 else None
+    return year, season
+
+
+def parse_range(s: str) -> List[Tuple[int, Optional[int]]]:
+    """'113' / '110-01' / '102~109' / '110-03~112-02' → [(year, season?)]；格式錯誤丟 ValueError"""
+    s = s.strip()
+    if "~" not in s:
+        return [parse_year_season(s)]
+    left, right = s.split("~", 1)
+    y1, q1 = parse_year_season(left)
+    y2, q2 = parse_year_season(right)
+    if (q1 is None) != (q2 is None):
+        raise ValueError("範圍兩端格式需一致")
+    res: List[Tuple[int, Optional[int]]] = []
+    for y in range(y1, y2 + 1):
+        if q1 is None:
+            res.append((y, None))
+        else:
+            start_q = q1 if y == y1 else 1
+            end_q = q2 if y == y2 else 4
+            res.extend((y, q) for q in range(start_q, end_q + 1))
+    return res
+
+
+def ask_range() -> List[Tuple[int, Optional[int]]]:
+    """互動輸入年份/範圍，回傳 [(year, season?)]"""
+    while True:
+        s = input("請輸入年份或年-季，可用 ~ 表示範圍：").strip()
+        try:
+            return parse_range(s)
+        except ValueError:
+            print("❌ 格式錯誤，請重新輸入（例如 113 或 110-01 或 102~109）。")
+
+###############################################################################
+# 主下載函式與輔助工具（增：防止 StaleElement 及允許多重下載）
+###############################################################################
+
+# -- 1️⃣ ChromeOptions: 允許一次按多顆下載按鈕 ------------------------------
+def make_driver(download_dir: pathlib.Path) -> webdriver.Chrome:
+    from selenium.webdriver.chrome.options import Options
+
+    opts = Options()
+    prefs = {
+        "download.default_directory": str(download_dir.resolve()),
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        # 允許同源連續自動下載 (Chrome 65+)
+        "profile.default_content_setting_values.automatic_downloads": 1,
+    }
+    opts.add_experimental_option("prefs", prefs)
+    opts.add_argument("--log-level=3")
+    if PROFILE == "scrape":
+        # 無頭、不載圖片字型與追蹤腳本、共用磁碟快取（見 scrape_profile）
+        return new_scrape_chrome(opts)
+    return new_chrome(opts)
+
+# -- 2️⃣ 點擊按鈕：自動重新定位，避開 stale element ---------------------------
+
+def safe_click(driver: webdriver.Chrome, locator: Tuple[str, str], retries: int = 3):
+    """嘗試重新定位元素並 click，避免 stale element reference"""
+    from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    by, sel = locator
+    for i in range(retries):
+        try:
+            elem = WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((by, sel))
+            )
+            driver.execute_script("arguments[0].scrollIntoView(true);", elem)
+            driver.execute_script("arguments[0].click();", elem)
+            return True
+        except (StaleElementReferenceException, TimeoutException):
+            if i == retries - 1:
+                return False
+            time.sleep(CLICK_BACKOFF.delay(i))
+    return False
+
+
+def safe_click_elem(driver, elem, retries=3):
+    from selenium.common.exceptions import StaleElementReferenceException
+
+    for i in range(retries):
+        try:
+            driver.execute_script("arguments[0].scrollIntoView(true);", elem)
+            driver.execute_script("arguments[0].click();", elem)
+            return True
+        except StaleElementReferenceException:
+            time.sleep(CLICK_BACKOFF.delay(i))
+    return False
+
+# -- 3️⃣ 下載流程 --------------------------------------------------------------
+
+def file_name(market: str, year: int, season: Optional[int], idx: int) -> str:
+    return f"{market}_{year}_Q{season or 'all'}_{idx}.csv"
+
+
+def open_query_page(browser: webdriver.Chrome, report: "QuarterlyReport",
+                    year: int, season: Optional[int]):
+    """開查詢頁並填好年份、季別；市場別留給 submit_market 切換"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import Select, WebDriverWait
+
+    wait = WebDriverWait(browser, 20)
+    url = mops_page(report.page_id)
+    throttle(url)
+    with stage("page_load"):
+        browser.get(url)
+
+    # ======== 填表單 ========
+    with stage("form_fill"):
+        wait.until(lambda d: d.find_element(By.NAME, "year")).send_keys(str(year))
+
+        if season:
+            sel = Select(browser.find_element(By.ID, "season"))  # <select id="season">
+            sel.select_by_value(f"{season:02d}")
+
+
+def submit_market(browser: webdriver.Chrome, report: "QuarterlyReport", market: str):
+    """（需要時）切換 TYPEK → 點查詢 → 切換到結果 pop‑up；年份、季別沿用表單上已填的值"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import Select, WebDriverWait
+
+    wait = WebDriverWait(browser, 20)
+    with stage("form_fill", market=market):
+        if report.select_market:
+            sel_elem = WebDriverWait(browser, 10).until(
+                EC.presence_of_element_located((By.ID, "TYPEK"))
+            )
+            # 4️⃣  用 Select 操作市場別
+            Select(sel_elem).select_by_value(market)   # sii / otc / rotc / pub
+
+        # 點擊前先記下現有視窗，新冒出來的那個才是這次的 pop‑up（不假設只有兩個視窗）
+        before = set(browser.window_handles)
+        submit = browser.find_element(By.ID, "searchBtn")
+        submit.click()
+        print("已點擊提交按鈕")
+
+    # ======== pop‑up ========
+    with stage("popup_wait"):
+        new = wait.until(lambda d: set(d.window_handles) - before)
+    browser.switch_to.window(new.pop())
+
+
+def open_result_popup(browser: webdriver.Chrome, report: "QuarterlyReport",
+                      year: int, market: str, season: Optional[int]):
+    """開網頁 → 選市場、年份、季別 → 點查詢 → 切換到結果 pop‑up"""
+    open_query_page(browser, report, year, season)
+    submit_market(browser, report, market)
+
+
+def check_popup(html: str, what: str):
+    """pop‑up 應該要有 t105sb02 下載按鈕；被擋、查無資料、按鈕沒出來各丟對應的例外"""
+    if "t105sb02" in html:
+        return
+    check_page(html, what)
+    raise MissingButton(f"{what} 找不到下載按鈕")
+
+
+def _back_to_main(browser: webdriver.Chrome, main_win: str):
+    """重試前關掉上一次留下的 pop‑up"""
+    for handle in browser.window_handles:
+        if handle != main_win:
+            browser.switch_to.window(handle)
+            browser.close()
+    browser.switch_to.window(main_win)
+
+
+def open_popup_checked(browser: webdriver.Chrome, report: "QuarterlyReport",
+                       year: int, market: str, season: Optional[int]):
+    """open_result_popup + check_popup；逾時、被擋、按鈕沒出來時退避後整頁重來"""
+    main_win = browser.current_window_handle
+    what = f"{report.page_id} {year} Q{season or 'all'} {market}"
+
+    def attempt(n: int):
+        if n:
+            _back_to_main(browser, main_win)
+        open_result_popup(browser, report, year, market, season)
+        check_popup(browser.page_source, what)
+
+    retry_call(attempt, mops_page(report.page_id), what)
+
+
+def collect_markets(browser: webdriver.Chrome, report: "QuarterlyReport",
+                    year: int, season: Optional[int],
+                    markets: List[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    查詢頁只載入一次，逐一切換市場別重新送出，收下每個 pop‑up 的網址與 HTML。
+    回傳 {market: (popup_url, popup_html)}；每個 pop‑up 收完就關掉回到主視窗。
+    browser 也可以是 TabPool 借出的分頁。
+    逾時或被擋時退避後整張表單重來；查無資料的市場照樣回傳，交給後續流程判斷。
+    """
+    what = f"{report.page_id} {year} Q{season or 'all'} {'+'.join(markets)}"
+    if isinstance(browser, Tab):
+        return retry_call(lambda _: collect_markets_tab(browser, report, year, season, markets),
+                          mops_page(report.page_id), what)
+
+    main_win = browser.current_window_handle
+
+    def attempt(n: int) -> Dict[str, Tuple[str, str]]:
+        if n:
+            _back_to_main(browser, main_win)
+        open_query_page(browser, report, year, season)
+        pages: Dict[str, Tuple[str, str]] = {}
+        for market in markets:
+            submit_market(browser, report, market)
+            pages[market] = (browser.current_url, browser.page_source)
+            browser.close()
+            browser.switch_to.window(main_win)
+            if is_throttle_page(pages[market][1]):
+                raise Throttled(f"{what} 被 MOPS 擋下")
+        return pages
+
+    return retry_call(attempt, mops_page(report.page_id), what)
+
+
+def _click_download(click, source, out_dir: pathlib.Path, new_name: str, idx: int,
+                    attempt: int) -> Path:
+    """點一次下載按鈕並等檔案；等待時間隨 attempt 拉長（DOWNLOAD_WAITS）"""
+    files_before = set(out_dir.iterdir())
+    with stage("click", idx=idx, attempt=attempt) as info:
+        info["clicked"] = clicked = bool(click())
+    if not clicked:
+        raise MissingButton(f"按鈕 {idx} 點擊失敗")
+    max_wait = DOWNLOAD_WAITS[min(attempt, len(DOWNLOAD_WAITS) - 1)]
+    path = wait_for_download(out_dir, files_before, new_name, max_wait, source)
+    if path is None:
+        raise FetchTimeout(f"{new_name} {max_wait} 秒內沒有下載完成")
+    return path
+
+
+def click_download(click, source, out_dir: pathlib.Path, new_name: str, idx: int) -> bool:
+    """_click_download 加上分類重試；點擊也算一次對 MOPS 的請求，受斷路器管制"""
+    try:
+        retry_call(lambda n: _click_download(click, source, out_dir, new_name, idx, n),
+                   t105sb02_action(), new_name)
+        return True
+    except FetchError as e:
+        print(f"✗ 按鈕 {idx} 下載失敗（{e.kind}）: {e}")
+        return False
+
+
+def download_mops_data(report: "QuarterlyReport", year: int, market: str, season: Optional[int],
+                       out_dir: pathlib.Path, pool: Optional[DriverPool] = None,
+                       only: Optional[Set[int]] = None):
+    """簡化版：
+    * 開網頁 → 選市場、年份、季別
+    * 點查詢 → 進入 pop‑up
+    * 依序點擊所有下載按鈕，檔名 market_year_Qx_idx.csv
+    * 傳入 pool 時沿用池中的瀏覽器，否則開一個用完即關的
+    * 給 only 時不重送表單，只點這幾個按鈕序號（asyncio 版重送失敗的按鈕用這個退回點擊）
+    """
+    from selenium.webdriver.common.by import By
+
+    if pool is None:
+        with DriverPool(make_driver, size=1, max_jobs=1) as pool:
+            return download_mops_data(report, year, market, season, out_dir, pool, only)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if isinstance(pool, TabPool):
+        return download_mops_data_tab(report, year, market, season, out_dir, pool, only)
+    with pool.lease(out_dir) as browser:
+        open_popup_checked(browser, report, year, market, season)
+
+        # 下載按鈕們
+        seen_filename : set[str] = set()
+        buttons = browser.find_elements(By.CSS_SELECTOR, "button[onclick*='t105sb02']")
+        ok_cnt = 0
+        done: set[int] = set()
+        retry_idx: Optional[set[int]] = only
+        if only is None and DOWNLOAD_MODE == "replay":
+            # 一次收齊所有表單欄位，直接以 HTTP 並行抓檔；失敗的才退回點擊
+            results = replay_popup(
+                browser, out_dir, lambda p: file_name(market, year, season, p.idx))
+            if results:
+                ok_cnt = sum(1 for path in results.values() if path)
+                retry_idx = {i for i, path in results.items() if path is None}
+                if not retry_idx:
+                    return True
+
+        for idx, btn in enumerate(buttons, 1):
+            if retry_idx is not None and idx not in retry_idx:
+                continue
+            # 2-1 讀該按鈕所在 form 的隱藏欄位
+            form = btn.find_element(By.XPATH, "./ancestor::form")
+            hidden_name = form.find_element(By.NAME, "filename").get_attribute("value")
+
+            if hidden_name in seen_filename:
+                print(f"{hidden_name} 已經下載過")
+                done.add(idx)
+                continue
+            seen_filename.add(hidden_name)
+
+            new_name = file_name(market, year, season, idx)
+
+            # 2-2 點這顆實體 btn（不再用 locator），2-3 等檔案寫完、重新命名；逾時就重點
+            if click_download(lambda b=btn: safe_click_elem(browser, b), browser,
+                              out_dir, new_name, idx):
+                ok_cnt += 1
+                done.add(idx)
+        # 重送過的區段要失敗的按鈕全部補齊才算成功；純點擊流程維持有下載到就算
+        return ok_cnt > 0 if retry_idx is None else retry_idx <= done
+
+
+async def download_mops_data_async(engine: AsyncEngine, report: "QuarterlyReport",
+                                   year: int, market: str, season: Optional[int],
+                                   out_dir: pathlib.Path, pool: DriverPool) -> bool:
+    """asyncio 版：瀏覽器只負責開到 pop‑up，拿到表單後立刻歸還，檔案交給 engine 並行串流"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def prepare():
+        with pool.lease(out_dir) as browser:
+            page = collect_markets(browser, report, year, season, [market])[market]
+            copy_driver_cookies(browser, engine.session)
+            return page
+
+    url, html = await engine.run_blocking(prepare)
+    payloads = collect_payloads(html, url)
+    if not payloads:
+        # 解析不到表單時退回點擊流程
+        return await engine.run_blocking(download_mops_data, report, year, market, season,
+                                         out_dir, pool)
+
+    results = await replay_downloads_async(
+        engine, payloads, out_dir,
+        lambda p: file_name(market, year, season, p.idx), referer=url)
+    return await _click_failed(engine, report, year, market, season, out_dir, pool, results)
+
+
+async def _click_failed(engine: AsyncEngine, report: "QuarterlyReport", year: int, market: str,
+                        season: Optional[int], out_dir: pathlib.Path, pool,
+                        results: Dict[int, Optional[Path]]) -> bool:
+    """重送失敗的按鈕序號退回點擊（同 download_mops_data）；全部檔案都到手才算成功"""
+    failed = _failed(results)
+    if not failed:
+        return True
+    return bool(await engine.run_blocking(download_mops_data, report, year, market, season,
+                                          out_dir, pool, only=failed))
+
+
+# -- 3️⃣‑b 分頁版：TabPool 借出的分頁直接用 CDP 操作，不經過 WebDriver ----------------
+
+_SET_VALUE_JS = """(function (el, value) {
+  if (!el) return false;
+  el.value = value;
+  el.dispatchEvent(new Event('input', {bubbles: true}));
+  el.dispatchEvent(new Event('change', {bubbles: true}));
+  return el.value === value;
+})(%s, %s)"""
+
+_BUTTONS = "document.querySelectorAll(\"button[onclick*='t105sb02']\")"
+
+_BUTTON_NAMES_JS = """Array.from(%s).map(function (b) {
+  var f = b.closest('form'), h = f && f.querySelector("[name='filename']");
+  return h ? h.value : '';
+})""" % _BUTTONS
+
+_CLICK_JS = """(function (b) {
+  if (!b) return false;
+  b.scrollIntoView();
+  b.click();
+  return true;
+})(%s[%%d])""" % _BUTTONS
+
+
+def _set_value(tab: Tab, element_js: str, value: str):
+    if not tab.evaluate(_SET_VALUE_JS % (element_js, json.dumps(value))):
+        raise RuntimeError(f"查詢頁無法設定欄位 {element_js} = {value}")
+
+
+def open_query_tab(tab: Tab, report: "QuarterlyReport", year: int, season: Optional[int]):
+    """open_query_page 的分頁版"""
+    url = mops_page(report.page_id)
+    throttle(url)
+    with stage("page_load"):
+        tab.get(url)
+
+    with stage("form_fill"):
+        tab.wait_until("!!document.getElementsByName('year')[0]", 20)
+        _set_value(tab, "document.getElementsByName('year')[0]", str(year))
+        if season:
+            _set_value(tab, "document.getElementById('season')", f"{season:02d}")
+
+
+def submit_market_tab(tab: Tab, report: "QuarterlyReport", market: str) -> Popup:
+    """submit_market 的分頁版：回傳這個分頁自己的 pop‑up，與其他分頁互不干擾"""
+    with stage("form_fill", market=market):
+        if report.select_market:
+            tab.wait_until("!!document.getElementById('TYPEK')", 10)
+            _set_value(tab, "document.getElementById('TYPEK')", market)
+        tab.evaluate("document.getElementById('searchBtn').click()")
+
+    with stage("popup_wait"):
+        popup = tab.wait_popup(20)
+        popup.wait_loaded(20)
+    return popup
+
+
+def collect_markets_tab(tab: Tab, report: "QuarterlyReport", year: int, season: Optional[int],
+                        markets: List[str]) -> Dict[str, Tuple[str, str]]:
+    open_query_tab(tab, report, year, season)
+    pages: Dict[str, Tuple[str, str]] = {}
+    for market in markets:
+        popup = submit_market_tab(tab, report, market)
+        try:
+            pages[market] = (popup.current_url, popup.page_source)
+        finally:
+            popup.close()
+    return pages
+
+
+def open_popup_checked_tab(tab: Tab, report: "QuarterlyReport", year: int, market: str,
+                           season: Optional[int]) -> Popup:
+    """open_popup_checked 的分頁版"""
+    what = f"{report.page_id} {year} Q{season or 'all'} {market}"
+
+    def attempt(_: int) -> Popup:
+        open_query_tab(tab, report, year, season)
+        popup = submit_market_tab(tab, report, market)
+        try:
+            check_popup(popup.page_source, what)
+        except BaseException:
+            popup.close()
+            raise
+        return popup
+
+    return retry_call(attempt, mops_page(report.page_id), what)
+
+
+def download_mops_data_tab(report: "QuarterlyReport", year: int, market: str,
+                           season: Optional[int], out_dir: pathlib.Path, pool: TabPool,
+                           only: Optional[Set[int]] = None) -> bool:
+    """download_mops_data 的分頁版：先重送表單，失敗的按鈕才在 pop‑up 裡點擊"""
+    with pool.lease(out_dir) as tab:
+        popup = open_popup_checked_tab(tab, report, year, market, season)
+        try:
+            ok_cnt = 0
+            done: set[int] = set()
+            retry_idx: Optional[set[int]] = only
+            if only is None and DOWNLOAD_MODE == "replay":
+                results = replay_popup(
+                    popup, out_dir, lambda p: file_name(market, year, season, p.idx))
+                if results:
+                    ok_cnt = sum(1 for path in results.values() if path)
+                    retry_idx = {i for i, path in results.items() if path is None}
+                    if not retry_idx:
+                        return True
+
+            seen_filename: set[str] = set()
+            for idx, hidden_name in enumerate(popup.evaluate(_BUTTON_NAMES_JS) or [], 1):
+                if retry_idx is not None and idx not in retry_idx:
+                    continue
+                if hidden_name in seen_filename:
+                    print(f"{hidden_name} 已經下載過")
+                    done.add(idx)
+                    continue
+                seen_filename.add(hidden_name)
+
+                new_name = file_name(market, year, season, idx)
+                # 分頁本身就是下載事件來源，等到的一定是這個 pop‑up 觸發的檔案
+                if click_download(lambda i=idx: popup.evaluate(_CLICK_JS % (i - 1)), tab,
+                                  out_dir, new_name, idx):
+                    ok_cnt += 1
+                    done.add(idx)
+            return ok_cnt > 0 if retry_idx is None else retry_idx <= done
+        finally:
+            popup.close()
+
+
+def wait_for_download(target_dir: Path,
+                      files_before: set[Path],
+                      new_filename: str,
+                      max_wait: int = DOWNLOAD_WAITS[-1],
+                      browser: Optional[webdriver.Chrome | Tab] = None) -> Path | None:
+    """
+    等下載完成並重新命名。若新檔名已存在則直接略過。
+    完成偵測交給 download_watch：有 CDP 事件就用事件，否則 inotify / 輪詢。
+    改名交給 blob_store：內容先前下載過就直接沿用，不轉碼、不留 name(1).csv 副本。
+    """
+    target_dir = Path(target_dir)
+    new_path   = target_dir / new_filename
+
+    # ❶ 檔案已存在 → 直接跳過
+    if new_path.exists():
+        print(f"⚠ {new_filename} 已存在，跳過下載。")
+        return new_path
+
+    print(f"等待下載完成... (最多 {max_wait} 秒)")
+    with stage("download_wait", file=new_filename) as info:
+        file_path = wait_for_file(target_dir, files_before, max_wait, browser)
+        info["timed_out"] = file_path is None
+    if file_path is None:
+        print("❌ 下載超時")
+        return None
+
+    # ❷ 等待期間目標檔被別的工作寫入：內容相同就丟掉這份，不同則以新下載的為準
+    with stage("rename", file=new_filename):
+        new_path = commit(file_path, new_path)
+    print(f"✅ 已重新命名為: {new_path.name}")
+    return new_path
+
+
+# -- 4️⃣ 多市場：同一個瀏覽器、同一張表單切換市場別 ------------------------------
+
+def download_markets(report: "QuarterlyReport", year: int, season: Optional[int],
+                     markets: List[str], out_dir: pathlib.Path,
+                     pool: DriverPool) -> Dict[str, bool]:
+    """
+    一次處理同一區段的多個市場：表單只載入一次，各市場的 pop‑up 收齊後才並行重送。
+    重送有檔案沒抓到的市場只點那幾顆按鈕；收不到表單的市場退回單一市場的完整流程。
+    回傳 {market: 是否成功}。
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    session = get_session()
+    with pool.lease(out_dir) as browser:
+        pages = collect_markets(browser, report, year, season, markets)
+        copy_driver_cookies(browser, session)
+
+    results: Dict[str, bool] = {}
+    for market in markets:
+        url, html = pages[market]
+        payloads = collect_payloads(html, url)
+        only = None
+        if payloads:
+            got = replay_downloads(payloads, out_dir,
+                                   lambda p, m=market: file_name(m, year, season, p.idx),
+                                   session, url)
+            if all(got.values()):
+                results[market] = True
+                continue
+            only = _failed(got)
+        results[market] = _fallback(report, year, market, season, out_dir, pool, only)
+    return results
+
+
+def _failed(got: Dict[int, Optional[Path]]) -> Set[int]:
+    return {i for i, path in got.items() if not path}
+
+
+def _fallback(report: "QuarterlyReport", year: int, market: str, season: Optional[int],
+              out_dir: pathlib.Path, pool, only: Optional[Set[int]] = None) -> bool:
+    """
+    多市場流程中單一市場退回點擊流程；分類過的失敗只影響這個市場。
+    only 為重送失敗的按鈕序號，只點這幾顆，已到手的檔案不重抓；None 時跑完整流程。
+    """
+    try:
+        return bool(download_mops_data(report, year, market, season, out_dir, pool, only))
+    except FetchError as e:
+        print(f"✗ {report.page_id} {year} Q{season or 'all'} {market} 失敗（{e.kind}）: {e}")
+        return False
+
+
+async def download_markets_async(engine: AsyncEngine, report: "QuarterlyReport",
+                                 year: int, season: Optional[int], markets: List[str],
+                                 out_dir: pathlib.Path, pool: DriverPool) -> Dict[str, bool]:
+    """download_markets 的 asyncio 版：各市場的檔案一起交給 engine 串流"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def prepare():
+        with pool.lease(out_dir) as browser:
+            pages = collect_markets(browser, report, year, season, markets)
+            copy_driver_cookies(browser, engine.session)
+            return pages
+
+    pages = await engine.run_blocking(prepare)
+
+    async def one(market: str) -> bool:
+        url, html = pages[market]
+        payloads = collect_payloads(html, url)
+        only = None
+        if payloads:
+            got = await replay_downloads_async(
+                engine, payloads, out_dir,
+                lambda p: file_name(market, year, season, p.idx), referer=url)
+            if all(got.values()):
+                return True
+            only = _failed(got)
+        # 與 download_markets 相同：只點重送失敗的按鈕；收不到表單才跑完整流程
+        return await engine.run_blocking(_fallback, report, year, market, season,
+                                         out_dir, pool, only)
+
+    oks = await asyncio.gather(*(one(m) for m in markets))
+    return dict(zip(markets, oks))
+
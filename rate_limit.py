@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+###############################################################################
+# 每個主機各自一個 token bucket，避免並行下載時被 MOPS 擋掉
+###############################################################################
+
+# 主機 → (每秒補充的 token 數, 桶子容量)；數值偏保守，可依實測調整
+HOST_LIMITS: Dict[str, Tuple[float, int]] = {
+    "mops.twse.com.tw": (2.0, 4),
+    "mopsov.twse.com.tw": (5.0, 10),
+}
+DEFAULT_LIMIT: Tuple[float, int] = (2.0, 4)
+
+# 主機 → 同時進行的請求上限（斷路器會在被擋時往下調、穩定後慢慢加回來）
+HOST_CONCURRENCY: Dict[str, int] = {
+    "mops.twse.com.tw": 4,
+    "mopsov.twse.com.tw": 8,
+}
+DEFAULT_CONCURRENCY = 4
+BREAKER_THRESHOLD = 3      # 連續被擋幾次就跳脫
+BREAKER_COOLDOWN = 30.0    # 第一次暫停秒數；再被擋就加倍
+BREAKER_MAX_COOLDOWN = 600.0
+BREAKER_GROW_AFTER = 20    # 連續成功幾次把並行上限加一
+
+
+class TokenBucket:
+    """經典 token bucket：rate 個/秒補充，最多存 burst 個"""
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate 必須 > 0 且 burst 至少為 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """成功回傳 0；否則回傳還要等幾秒（不會阻塞）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """阻塞直到拿到 token"""
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(host: str) -> TokenBucket:
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*HOST_LIMITS.get(host, DEFAULT_LIMIT))
+        return bucket
+
+
+def throttle(url: str):
+    """送出請求（或讓瀏覽器開頁）前呼叫，依 URL 的主機限速"""
+    host = urlsplit(url).hostname
+    if host:
+        bucket_for(host).acquire()
+
+
+async def athrottle(url: str):
+    """throttle 的 asyncio 版本：等待時讓出 event loop，不占用執行緒"""
+    host = urlsplit(url).hostname
+    if not host:
+        return
+    bucket = bucket_for(host)
+    while True:
+        delay = bucket.try_acquire()
+        if delay <= 0:
+            return
+        await asyncio.sleep(delay)
+
+
+###############################################################################
+# 每個主機一個斷路器：被擋時暫停、降低並行度，恢復後逐步加回
+###############################################################################
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class HostBreaker:
+    """
+    * closed：最多 limit 個請求同時進行
+    * 連續 threshold 次被擋（或 half-open 的探測又被擋）→ open：暫停 cooldown 秒，
+      並行上限減半，下一次暫停加倍
+    * 暫停結束 → half-open：只放一個探測請求，成功就回到 closed
+    * closed 時連續成功 grow_after 次，並行上限加一（最多回到 max_limit）
+    """
+
+    def __init__(self, host: str, max_limit: int, threshold: int = BREAKER_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN, max_cooldown: float = BREAKER_MAX_COOLDOWN,
+                 grow_after: int = BREAKER_GROW_AFTER):
+        self.host = host
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.grow_after = grow_after
+        self.state = CLOSED
+        self._cooldown = cooldown
+        self._opened_until = 0.0
+        self._failures = 0
+        self._successes = 0
+        self._inflight = 0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    # -- 取用 / 歸還 ------------------------------------------------------------
+
+    def try_acquire(self) -> float:
+        """成功回傳 0；否則回傳建議等待的秒數（不會阻塞）"""
+        with self._cond:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now < self._opened_until:
+                    return self._opened_until - now
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return 0.5
+                self._probing = True
+            elif self._inflight >= self.limit:
+                return 0.05
+            self._inflight += 1
+            return 0.0
+
+    def acquire(self):
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return
+            with self._cond:
+                self._cond.wait(delay)
+
+    async def aacquire(self):
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return
+            await asyncio.sleep(min(delay, 1.0))
+
+    def release(self, ok: bool, throttled: bool = False):
+        """ok=False 且非 throttled 的失敗（逾時、空檔）不影響斷路器狀態"""
+        with self._cond:
+            self._inflight -= 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+            if throttled:
+                self._on_throttled()
+            elif ok:
+                self._on_success()
+            self._cond.notify_all()
+
+    # -- 狀態轉換 ----------------------------------------------------------------
+
+    def _on_throttled(self):
+        self._successes = 0
+        self._failures += 1
+        if self.state != HALF_OPEN and self._failures < self.threshold:
+            return
+        pause = self._cooldown
+        self.state = OPEN
+        self._opened_until = time.monotonic() + pause
+        self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+        self.limit = max(1, self.limit // 2)
+        self._failures = 0
+        print(f"⛔ {self.host} 拒絕請求，暫停 {pause:.0f} 秒，並行上限降為 {self.limit}")
+
+    def _on_success(self):
+        self._failures = 0
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._cooldown = self.base_cooldown
+            print(f"✅ {self.host} 恢復回應，並行上限 {self.limit}")
+            return
+        self._successes += 1
+        if self._successes >= self.grow_after and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+
+
+_breakers: Dict[str, HostBreaker] = {}
+
+
+def breaker_for(url_or_host: str) -> Optional[HostBreaker]:
+    """依 URL（或主機名）取得斷路器；沒有主機的 URL 回傳 None"""
+    host = urlsplit(url_or_host).hostname if "//" in url_or_host else url_or_host
+    if not host:
+        return None
+    with _buckets_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = HostBreaker(
+                host, HOST_CONCURRENCY.get(host, DEFAULT_CONCURRENCY))
+        return breaker
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import pathlib
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from manifest import Manifest, month_label, quarter_label
+from transcode import get_transcoder
+
+###############################################################################
+# 報表登錄表：每種報表只宣告差異（頁面代號、輸出目錄、檔名規則），流程由 sync.py 共用
+###############################################################################
+
+MARKETS: Dict[str, str] = {"sii": "上市", "otc": "上櫃", "rotc": "興櫃", "pub": "公開發行"}
+
+
+class Unit(NamedTuple):
+    """
+    一個下載單位。year 依各報表下載清單的慣例：
+    季報為民國年（與 MOPS 表單一致），月營收為西元年（與 ym_iter 一致）。
+    period 季報為季別（None 表示全年），月營收為月份。
+    """
+    report: str
+    market: str
+    year: int
+    period: Optional[int]
+
+
+class QuarterlyReport:
+    """t163sbXX 季報：查詢頁 → pop‑up → t105sb02 下載"""
+
+    kind = "quarterly"
+    expected_files: Optional[int] = None   # 各報表 / 產業格式的檔數不同，由下載清單推得
+
+    def __init__(self, name: str, title: str, page_id: str, root: str,
+                 select_market: bool = False, workers: int = 2):
+        self.name = name
+        self.title = title
+        self.page_id = page_id
+        self.root = pathlib.Path(root)
+        self.select_market = select_market   # 查詢頁上需要切換 TYPEK（目前只有 EPS 頁）
+        self.workers = workers
+
+    def expand(self, spec: str) -> List[Tuple[int, int]]:
+        """
+        '102~113' / '110-01~112-04' → [(民國年, 季)]；只寫年份時展開成該年 Q1~Q4。
+        西元年加月份（'2023-01~2024-06'，與月營收共用的批次規格）換成涵蓋那些月份的季；
+        民國年後面接的是季別，不在 1~4 丟 ValueError。
+        """
+        left, _, right = spec.replace(" ", "").partition("~")
+        y1, q1 = _roc_quarter(left, first=True)
+        y2, q2 = _roc_quarter(right or left, first=False)
+        if (y1, q1) > (y2, q2):
+            raise ValueError(f"區段範圍起點晚於終點：{spec!r}")
+        return [(y, q) for y in range(y1, y2 + 1) for q in range(1, 5)
+                if (y1, q1) <= (y, q) <= (y2, q2)]
+
+    def out_dir(self, u: Unit) -> pathlib.Path:
+        return self.root / f"{u.year}" / (f"Q{u.period}" if u.period else "all")
+
+    def pattern(self, u: Unit) -> str:
+        return f"{u.market}_{u.year}_Q{u.period or 'all'}_*.csv"
+
+    def manifest_key(self, u: Unit) -> Tuple[int, str]:
+        return u.year, quarter_label(u.period)
+
+    def sort_key(self, u: Unit) -> Tuple[int, int]:
+        """(民國年, 區段結束月份)：跨報表排序用"""
+        return u.year, (u.period or 4) * 3
+
+    def label(self, u: Unit) -> str:
+        when = f"{u.year} 年" if u.period is None else f"{u.year} 年 Q{u.period}"
+        return f"{self.title} {when} {MARKETS.get(u.market, u.market)}"
+
+    def fetch(self, u: Unit, pool) -> bool:
+        from quarterly import download_mops_data
+        return download_mops_data(self, u.year, u.market, u.period, self.out_dir(u), pool)
+
+    async def afetch(self, engine, u: Unit, pool) -> bool:
+        from quarterly import download_mops_data_async
+        return await download_mops_data_async(engine, self, u.year, u.market, u.period,
+                                              self.out_dir(u), pool)
+
+    @property
+    def fanout(self) -> bool:
+        """查詢頁有市場別選單時，同一區段的各市場可以共用一次表單載入"""
+        return self.select_market
+
+    def fetch_many(self, units: List[Unit], pool) -> Dict[Unit, Any]:
+        """units 必須是同一 (年, 季) 的不同市場"""
+        if len(units) == 1:
+            return {units[0]: self.fetch(units[0], pool)}
+        from quarterly import download_markets
+        u0 = units[0]
+        ok = download_markets(self, u0.year, u0.period, [u.market for u in units],
+                              self.out_dir(u0), pool)
+        return {u: ok[u.market] for u in units}
+
+    async def afetch_many(self, engine, units: List[Unit], pool) -> Dict[Unit, Any]:
+        if len(units) == 1:
+            return {units[0]: await self.afetch(engine, units[0], pool)}
+        from quarterly import download_markets_async
+        u0 = units[0]
+        ok = await download_markets_async(engine, self, u0.year, u0.period,
+                                          [u.market for u in units], self.out_dir(u0), pool)
+        return {u: ok[u.market] for u in units}
+
+    def record(self, manifest: Manifest, u: Unit, result: Any) -> bool:
+        if result:
+            # 先等這個區段的轉碼做完，清單裡的雜湊才是最終檔案的
+            get_transcoder().wait_dir(self.out_dir(u))
+            manifest.record_dir(self.name, u.market, *self.manifest_key(u),
+                                self.out_dir(u), self.pattern(u))
+        return bool(result)
+
+
+class MonthlyReport:
+    """t21sc03 月營收：靜態頁面 + 另存 CSV 表單"""
+
+    kind = "monthly"
+    fanout = False     # 各市場是不同的靜態網址，本來就共用同一個 HTTP session
+    expected_files = 1
+
+    def __init__(self, name: str, title: str, root: str, workers: int = 4):
+        self.name = name
+        self.title = title
+        self.root = pathlib.Path(root)
+        self.workers = workers
+
+    def expand(self, spec: str) -> List[Tuple[int, int]]:
+        """
+        '102~113'（民國或西元年）展開成整年的月份；'2023-01~2024-06' / '112-01~113-06' 依月展開。
+        還沒公布的月份（本月以後）不列入。
+        """
+        from monthly import parse_ym, ym_iter
+        left, _, right = spec.partition("~")
+        right = right or left
+        start = parse_ym(_western_ym(left.strip(), first=True))
+        end = parse_ym(_western_ym(right.strip(), first=False))
+        today = date.today()
+        return [(d.year, d.month) for d in ym_iter(start, end)
+                if (d.year, d.month) < (today.year, today.month)]
+
+    def out_dir(self, u: Unit) -> pathlib.Path:
+        # 上市沿用原本的 database/<年>，其他市場的檔名相同，分開放
+        if u.market == "sii":
+            return self.root / f"{u.year}"
+        return self.root / u.market / f"{u.year}"
+
+    def pattern(self, u: Unit) -> str:
+        return f"t21sc03_{u.year - 1911}_{u.period}[._]*"
+
+    def manifest_key(self, u: Unit) -> Tuple[int, str]:
+        return u.year, month_label(u.period)
+
+    def sort_key(self, u: Unit) -> Tuple[int, int]:
+        return u.year - 1911, u.period
+
+    def label(self, u: Unit) -> str:
+        return f"{self.title} {u.year}-{u.period:02d} {MARKETS.get(u.market, u.market)}"
+
+    def url(self, u: Unit) -> str:
+        from monthly import build_url
+        return build_url(u.year, u.period, u.market)
+
+    def fetch(self, u: Unit, pool) -> Optional[pathlib.Path]:
+        from monthly import fetch_monthly_income
+        return fetch_monthly_income(self.url(u), self.out_dir(u), pool)
+
+    async def afetch(self, engine, u: Unit, pool) -> Optional[pathlib.Path]:
+        from monthly import fetch_monthly_income_engine
+        return await fetch_monthly_income_engine(engine, self.url(u), self.out_dir(u), pool)
+
+    def fetch_many(self, units: List[Unit], pool) -> Dict[Unit, Any]:
+        return {u: self.fetch(u, pool) for u in units}
+
+    async def afetch_many(self, engine, units: List[Unit], pool) -> Dict[Unit, Any]:
+        return {u: await self.afetch(engine, u, pool) for u in units}
+
+    def record(self, manifest: Manifest, u: Unit, result: Any) -> bool:
+        if result:
+            get_transcoder().wait_path(result)
+            manifest.record_file(self.name, u.market, *self.manifest_key(u), 1, result)
+            manifest.mark_synced(self.name, u.market, *self.manifest_key(u), 1)
+        return bool(result)
+
+
+def _roc_quarter(text: str, first: bool) -> Tuple[int, int]:
+    """'113' → (113, 1)（或 (113, 4)）；'113-02' → (113, 2)；'2024-05' → (113, 2)"""
+    year, _, part = text.partition("-")
+    y = int(year)
+    if not part:
+        return y - 1911 if y > 1911 else y, 1 if first else 4
+    n = int(part)
+    if y > 1911:
+        if not 1 <= n <= 12:
+            raise ValueError(f"月份需在 1~12：{text!r}")
+        return y - 1911, (n - 1) // 3 + 1
+    if not 1 <= n <= 4:
+        raise ValueError(f"季別需在 1~4：{text!r}（月份請用西元年，例如 2023-05）")
+    return y, n
+
+
+def _western_ym(text: str, first: bool) -> str:
+    """'113' → '2024-01'（或 '2024-12'）；'113-03' / '2024-03' → '2024-03'"""
+    year, _, month = text.partition("-")
+    y = int(year)
+    if y <= 1911:
+        y += 1911
+    m = int(month) if month else (1 if first else 12)
+    return f"{y}-{m:02d}"
+
+
+REPORTS: Dict[str, Any] = {
+    "eps": QuarterlyReport("eps", "每股盈餘", "t163sb19", "EPS", select_market=True),
+    "operating_profit": QuarterlyReport("operating_profit", "營益分析", "t163sb06",
+                                        "Operating_Profit"),
+    "cash_flow": QuarterlyReport("cash_flow", "現金流量表", "t163sb20", "Cash_downloads"),
+    "monthly_income": MonthlyReport("monthly_income", "月營收", "database"),
+}
+
+
+def get_report(name: str):
+    try:
+        return REPORTS[name]
+    except KeyError:
+        raise ValueError(f"未知的報表 {name}（可用：{', '.join(REPORTS)}）") from None
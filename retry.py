@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import time
+import random
+import asyncio
+import socket
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, TypeVar, Union
+
+from rate_limit import breaker_for
+
+###############################################################################
+# 失敗分類與重試：抖動指數退避，並把「被擋」回報給每主機的斷路器
+###############################################################################
+
+T = TypeVar("T")
+
+# MOPS 擋請求時回的不是錯誤碼，而是一張普通的 HTML 頁面
+THROTTLE_MARKERS = (
+    "FOR SECURITY REASONS",
+    "因為安全性考量",
+    "查詢過於頻繁",
+    "查詢過量",
+    "請稍後再查詢",
+    "Too Many Requests",
+)
+NO_DATA_MARKERS = ("查無資料", "查詢無資料", "無符合條件")
+
+
+class FetchError(Exception):
+    """分類過的下載失敗；kind 用於日誌與統計"""
+    kind = "error"
+    retryable = True
+    throttled = False     # True 時會讓主機的斷路器累計一次
+
+
+class FetchTimeout(FetchError):
+    kind = "timeout"
+
+
+class Throttled(FetchError):
+    kind = "throttle"
+    throttled = True
+
+
+class MissingButton(FetchError):
+    kind = "missing_button"
+
+
+class EmptyFile(FetchError):
+    kind = "empty_file"
+
+
+class NoData(FetchError):
+    """這個區段本來就沒有資料（尚未公布、該市場無此報表），重試也沒用"""
+    kind = "no_data"
+    retryable = False
+
+
+class HttpStatus(FetchError):
+    kind = "http"
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+        self.retryable = status >= 500 or status == 408
+
+
+class Backoff(NamedTuple):
+    """full jitter：第 n 次等 uniform(0, min(cap, base·2ⁿ)) 秒"""
+    base: float = 1.0
+    cap: float = 60.0
+    attempts: int = 4
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+DEFAULT_BACKOFF = Backoff()
+# 被擋時退得更久：斷路器負責整個主機的暫停，這裡只是把各工作錯開
+BACKOFF: Dict[str, Backoff] = {
+    "throttle": Backoff(base=5.0, cap=120.0, attempts=5),
+    "timeout": Backoff(base=2.0, cap=60.0, attempts=3),
+    "empty_file": Backoff(base=2.0, cap=30.0, attempts=3),
+    "missing_button": Backoff(base=1.0, cap=15.0, attempts=3),
+}
+
+
+###############################################################################
+# 分類
+###############################################################################
+
+def _text_head(data: Union[bytes, str], limit: int = 4096) -> str:
+    if isinstance(data, str):
+        return data[:limit]
+    head = data[:limit]
+    try:
+        return head.decode("utf-8")
+    except UnicodeDecodeError:
+        return head.decode("cp950", errors="replace")
+
+
+def is_throttle_page(data: Union[bytes, str]) -> bool:
+    text = _text_head(data)
+    return any(m in text for m in THROTTLE_MARKERS)
+
+
+def check_page(data: Union[bytes, str], what: str = "頁面"):
+    """取回的頁面是擋請求或查無資料的畫面時丟出對應的例外"""
+    if is_throttle_page(data):
+        raise Throttled(f"{what}被 MOPS 擋下（查詢過於頻繁）")
+    text = data if isinstance(data, str) else _text_head(data, len(data))
+    if any(m in text for m in NO_DATA_MARKERS):
+        raise NoData(f"{what}查無資料")
+
+
+def check_download(head: bytes, name: str):
+    """檔案下載的開頭：空的、或其實是擋請求的 HTML"""
+    if not head:
+        raise EmptyFile(f"{name} 下載內容為空")
+    if head.lstrip()[:1] == b"<" and is_throttle_page(head):
+        raise Throttled(f"{name} 被 MOPS 擋下（回傳 HTML 而不是檔案）")
+
+
+def classify(exc: BaseException) -> FetchError:
+    """把 requests / Selenium / 內建例外轉成 FetchError；已分類的原樣回傳"""
+    if isinstance(exc, FetchError):
+        return exc
+    name = type(exc).__name__
+    message = f"{name}: {exc}"
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        if status in (403, 429, 503):
+            return Throttled(f"HTTP {status}: {exc}")
+        return HttpStatus(f"HTTP {status}: {exc}", status)
+    if isinstance(exc, (TimeoutError, socket.timeout, asyncio.TimeoutError)) or \
+            name in ("Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutException"):
+        return FetchTimeout(message)
+    if name in ("ConnectionError", "ConnectionResetError", "ConnectionRefusedError",
+                "RemoteDisconnected", "ChunkedEncodingError"):
+        # 連線被對方切斷通常是限流的前兆
+        return Throttled(message)
+    if name in ("NoSuchElementException", "ElementNotInteractableException"):
+        return MissingButton(message)
+    return FetchError(message)
+
+
+###############################################################################
+# 重試
+###############################################################################
+
+def _host_of(url: Optional[str]):
+    return breaker_for(url) if url else None
+
+
+def _next_delay(err: FetchError, attempt: int) -> Optional[float]:
+    """還能再試時回傳等待秒數，否則 None"""
+    backoff = BACKOFF.get(err.kind, DEFAULT_BACKOFF)
+    if not err.retryable or attempt + 1 >= backoff.attempts:
+        return None
+    return backoff.delay(attempt)
+
+
+def retry_call(fn: Callable[[int], T], url: Optional[str] = None, what: str = "") -> T:
+    """
+    fn(attempt) 失敗就分類、退避後重試（attempt 從 0 起算，可用來拉長等待時間）。
+    給 url 時每次嘗試都要先拿到該主機斷路器的名額，並回報成功 / 被擋。
+    用完重試次數或不可重試時丟出分類後的 FetchError。
+    """
+    breaker = _host_of(url)
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.acquire()
+        try:
+            result = fn(attempt)
+        except Exception as e:
+            err = classify(e)
+            if breaker is not None:
+                breaker.release(ok=False, throttled=err.throttled)
+            delay = _next_delay(err, attempt)
+            if delay is None:
+                if err is e:
+                    raise
+                raise err from e
+            print(f"⚠ {what or url} {err.kind}（{err}），{delay:.1f} 秒後重試")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.release(ok=True)
+        return result
+
+
+async def aretry_call(fn: Callable[[int], Awaitable[T]], url: Optional[str] = None,
+                      what: str = "") -> T:
+    """retry_call 的 asyncio 版：等斷路器與退避都用 asyncio.sleep"""
+    breaker = _host_of(url)
+    attempt = 0
+    while True:
+        if breaker is not None:
+            await breaker.aacquire()
+        try:
+            result = await fn(attempt)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release(ok=False)
+            raise
+        except Exception as e:
+            err = classify(e)
+            if breaker is not None:
+                breaker.release(ok=False, throttled=err.throttled)
+            delay = _next_delay(err, attempt)
+            if delay is None:
+                if err is e:
+                    raise
+                raise err from e
+            print(f"⚠ {what or url} {err.kind}（{err}），{delay:.1f} 秒後重試")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.release(ok=True)
+        return result
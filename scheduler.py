@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+###############################################################################
+# 多區段並行排程：以 worker 數控制同時下載的 (年, 季) / 月份
+###############################################################################
+
+T = TypeVar("T")
+
+
+class RunStats(Generic[T]):
+    """彙總各區段成功 / 失敗，取代 main() 結尾各自計數"""
+
+    def __init__(self):
+        self.succeeded: List[T] = []
+        self.failed: List[Tuple[T, Optional[BaseException]]] = []
+        self._lock = threading.Lock()
+
+    def record(self, item: T, ok: bool, error: Optional[BaseException] = None):
+        with self._lock:
+            if ok:
+                self.succeeded.append(item)
+            else:
+                self.failed.append((item, error))
+
+    @property
+    def success(self) -> int:
+        return len(self.succeeded)
+
+    @property
+    def fail(self) -> int:
+        return len(self.failed)
+
+
+def order_items(items: Iterable[T], newest_first: bool = False,
+                key: Optional[Callable[[T], Any]] = None) -> List[T]:
+    """newest_first=True 時依 key 由新到舊排序，否則維持輸入順序"""
+    ordered = list(items)
+    if newest_first:
+        ordered.sort(key=key, reverse=True)
+    return ordered
+
+
+def run_periods(items: Iterable[T],
+                job: Callable[[T], Any],
+                workers: int = 1,
+                newest_first: bool = False,
+                key: Optional[Callable[[T], Any]] = None) -> RunStats[T]:
+    """
+    對每個區段呼叫 job(item)，回傳值為真視為成功、丟例外視為失敗。
+
+    * workers=1 時依序執行，行為與原本的 for 迴圈相同
+    * newest_first=True 時先跑最新的區段（排序依 key，預設為 item 本身）
+    * 主機限速交給 rate_limit.throttle，排程器只管並行度
+    """
+    ordered = order_items(items, newest_first, key)
+    stats: RunStats[T] = RunStats()
+
+    def run(item: T):
+        try:
+            stats.record(item, bool(job(item)))
+        except Exception as e:
+            print(f"❌ {item} 發生錯誤: {e}")
+            stats.record(item, False, e)
+
+    if workers <= 1:
+        for item in ordered:
+            run(item)
+        return stats
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        # executor 依提交順序取工作，所以排序即優先權
+        for fut in as_completed([ex.submit(run, item) for item in ordered]):
+            fut.result()
+    return stats
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from cdp import CdpConnection
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+###############################################################################
+# 爬蟲用的輕量 Chrome：無頭、不載圖片字型與追蹤腳本、跨 session 共用磁碟快取
+###############################################################################
+
+# "scrape" 走本檔的輕量設定；"full" 維持原本有畫面、全部資源都載入的 Chrome（除錯用）
+PROFILE = os.environ.get("BROWSER_PROFILE", "scrape")
+HEADLESS = not os.environ.get("SCRAPE_HEADFUL")
+
+# SPA 的 JS / CSS 每次都一樣，放在固定的快取目錄，重開瀏覽器也不必重抓
+CACHE_ROOT = pathlib.Path(os.environ.get(
+    "CHROME_CACHE_DIR", "~/.cache/stock-project/chrome-cache")).expanduser()
+CACHE_SIZE = 200 * 1024 * 1024
+
+# Network.setBlockedURLs 的萬用字元樣式：圖片、字型、影音、追蹤 / 廣告。
+# CSS 不擋：Selenium 的 element_to_be_clickable 需要正確的版面
+BLOCKED_URLS: List[str] = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*clarity.ms*",
+]
+
+# 不看副檔名、依請求的資源類型擋（Fetch.enable 的 resourceType）：動態產生的圖片 / 字型網址也擋得到
+BLOCKED_TYPES: List[str] = ["Image", "Font", "Media"]
+
+ARGS: List[str] = [
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-notifications",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+    "--mute-audio",
+    "--no-first-run",
+    "--blink-settings=imagesEnabled=false",
+    "--window-size=1280,900",
+]
+
+PREFS: Dict[str, object] = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+    "profile.default_content_setting_values.geolocation": 2,
+}
+
+_blocked: "weakref.WeakKeyDictionary[object, List[str]]" = weakref.WeakKeyDictionary()
+_cache_of: "weakref.WeakKeyDictionary[object, pathlib.Path]" = weakref.WeakKeyDictionary()
+_blockers: "weakref.WeakKeyDictionary[object, ResourceBlocker]" = weakref.WeakKeyDictionary()
+
+
+def scrape_options(opts: "Options") -> "Options":
+    """在既有的 Options（已含下載偏好）上套用輕量設定"""
+    for arg in ARGS:
+        opts.add_argument(arg)
+    if HEADLESS and not any(a.startswith("--headless") for a in opts.arguments):
+        opts.add_argument("--headless=new")
+    cache_dir = claim_cache_dir()
+    if cache_dir is not None:
+        opts.add_argument(f"--disk-cache-dir={cache_dir}")
+        opts.add_argument(f"--disk-cache-size={CACHE_SIZE}")
+    prefs = dict(opts.experimental_options.get("prefs", {}))
+    prefs.update(PREFS)
+    opts.add_experimental_option("prefs", prefs)
+    # DOMContentLoaded 就返回；後續都有明確的等待條件
+    opts.page_load_strategy = "eager"
+    return opts
+
+
+def new_scrape_chrome(opts: "Options") -> "webdriver.Chrome":
+    """套用輕量設定後啟動 Chrome；quit 後（見 release_for）或 driver 被回收時釋放快取格"""
+    from chromedriver import new_chrome
+
+    scrape_options(opts)
+    cache_dir = cache_dir_of(opts)
+    try:
+        driver = new_chrome(opts)
+    except BaseException:
+        release_cache_dir(cache_dir)
+        raise
+    if cache_dir is not None:
+        _cache_of[driver] = cache_dir
+        weakref.finalize(driver, release_cache_dir, cache_dir)
+    try:
+        apply_blocking(driver)
+    except Exception as e:
+        print(f"⚠ 無法設定資源封鎖（{e}），改為全部載入")
+    return driver
+
+
+def apply_blocking(driver: "webdriver.Chrome", urls: Optional[List[str]] = None,
+                   types: Optional[List[str]] = None):
+    """
+    開啟資源封鎖，並記下 URL 清單給 tab_pool 新開的分頁沿用。
+    execute_cdp_cmd 只作用在 driver 目前的分頁，之後開的 pop-up 會照常載入，
+    所以優先用 browser 層級的 ResourceBlocker 套到每個新 target；
+    連不上 browser websocket 時退回只封鎖目前分頁。
+    """
+    from cdp import CdpConnection
+
+    urls = BLOCKED_URLS if urls is None else urls
+    types = BLOCKED_TYPES if types is None else types
+    _blocked[driver] = urls
+    try:
+        blocker = ResourceBlocker(CdpConnection.for_driver(driver), urls, types)
+    except Exception as e:
+        print(f"⚠ 無法對新分頁套用資源封鎖（{e}），只封鎖目前分頁")
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+        return
+    _blockers[driver] = blocker
+    weakref.finalize(driver, blocker.close)
+
+
+class ResourceBlocker:
+    """
+    browser 層級的 Target.setAutoAttach（waitForDebuggerOnStart）：
+    每個分頁 / pop-up 在發出第一個請求前先暫停，套上 Network.setBlockedURLs
+    與 Fetch.enable（resourceType 樣式）後才放行；被 Fetch 攔下的請求一律 failRequest。
+    事件在 CdpConnection 的讀取執行緒送達，在那裡 call() 會等不到回應，所以交給工作執行緒。
+    """
+
+    def __init__(self, conn: "CdpConnection", urls: List[str], types: List[str]):
+        self.conn = conn
+        self.urls = urls
+        self.patterns = [{"resourceType": t} for t in types]
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cdp-block")
+        conn.add_listener(self._on_event)
+        # 開啟時也會附加到既有的分頁（它們已在執行，不必放行）
+        conn.call("Target.setAutoAttach", {
+            "autoAttach": True, "waitForDebuggerOnStart": True, "flatten": True,
+        })
+
+    def _on_event(self, method: str, params: dict, session_id: Optional[str]):
+        try:
+            self._dispatch(method, params, session_id)
+        except RuntimeError:
+            pass     # close() 之後才到的事件
+
+    def _dispatch(self, method: str, params: dict, session_id: Optional[str]):
+        if method == "Target.attachedToTarget":
+            self._pool.submit(self._setup, params["sessionId"],
+                              params["targetInfo"].get("type"),
+                              params.get("waitingForDebugger", False))
+        elif method == "Fetch.requestPaused":
+            self._pool.submit(self._call, "Fetch.failRequest", {
+                "requestId": params["requestId"], "errorReason": "BlockedByClient",
+            }, session_id)
+
+    def _setup(self, session_id: str, kind: Optional[str], waiting: bool):
+        try:
+            if kind == "page":
+                if self.urls:
+                    self._call("Network.enable", {}, session_id)
+                    self._call("Network.setBlockedURLs", {"urls": self.urls}, session_id)
+                if self.patterns:
+                    self._call("Fetch.enable", {"patterns": self.patterns}, session_id)
+        finally:
+            # 不論封鎖是否成功都要放行，否則新分頁會一直停在載入前
+            if waiting:
+                self._call("Runtime.runIfWaitingForDebugger", {}, session_id)
+
+    def _call(self, method: str, params: dict, session_id: Optional[str]):
+        try:
+            self.conn.call(method, params, session_id=session_id)
+        except (RuntimeError, TimeoutError, OSError):
+            pass     # target 已關閉；封鎖只是省流量，不影響抓取
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.conn.close()
+
+
+def blocked_urls_for(driver) -> List[str]:
+    return _blocked.get(driver, []) if driver is not None else []
+
+
+###############################################################################
+# 磁碟快取目錄：同時執行的 Chrome 各用一格，格子跨 session 保留
+###############################################################################
+
+_held: Dict[pathlib.Path, int] = {}
+_held_lock = threading.Lock()
+
+
+def claim_cache_dir(max_slots: int = 16) -> Optional[pathlib.Path]:
+    """
+    Chrome 的磁碟快取不能被兩個行程同時寫，所以用檔案鎖分格：
+    拿第一個沒被鎖住的 cache-N。瀏覽器重開時前一格已經釋放（見 release_cache_dir），
+    通常會拿回同一格，靜態檔就直接命中。全部被占用時回傳 None（不用快取）。
+    """
+    try:
+        CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    with _held_lock:
+        for n in range(max_slots):
+            path = CACHE_ROOT / f"cache-{n}"
+            if path in _held:
+                continue
+            fd = os.open(str(CACHE_ROOT / f"cache-{n}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            if _try_lock(fd):
+                _held[path] = fd
+                path.mkdir(exist_ok=True)
+                return path
+            os.close(fd)
+    return None
+
+
+def release_cache_dir(path: Optional[pathlib.Path]):
+    with _held_lock:
+        fd = _held.pop(path, None) if path is not None else None
+    if fd is not None:
+        os.close(fd)
+
+
+def release_for(driver):
+    """driver.quit() 之後呼叫，讓下一個啟動的 Chrome 拿回同一格快取"""
+    release_cache_dir(_cache_of.pop(driver, None))
+    blocker = _blockers.pop(driver, None)
+    if blocker is not None:
+        blocker.close()
+
+
+def cache_dir_of(opts: "Options") -> Optional[pathlib.Path]:
+    for arg in opts.arguments:
+        if arg.startswith("--disk-cache-dir="):
+            return pathlib.Path(arg.split("=", 1)[1])
+    return None
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        import fcntl
+    except ImportError:      # Windows
+        import msvcrt
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import re
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from async_engine import AsyncEngine
+from driver_pool import DriverPool
+from journal import DONE, FAILED, JOURNAL_DIR, RUNNING, Journal, cleanup_partials
+from manifest import Manifest
+from reports import MARKETS, REPORTS, Unit, get_report
+from retry import classify
+from scheduler import RunStats, order_items, run_periods
+from tab_pool import TabPool
+from timing import run_log, stage, unit
+from transcode import get_transcoder
+
+###############################################################################
+# 統一下載引擎：所有報表 × 市場 × 區段一起規劃、去重、排程，共用瀏覽器與連線
+###############################################################################
+
+BROWSERS = 2         # 所有報表共用的常駐瀏覽器數
+POOL_MAX_JOBS = 20   # 每個瀏覽器跑幾個區段後重開，避免記憶體累積
+TABS = 0             # >0 時改成單一 Chrome 開 TABS 個分頁並行（tab_pool.TabPool）
+NEWEST_FIRST = True  # 先下載最新的區段
+USE_ASYNC = True     # True 走 asyncio 引擎；False 走 run_periods 執行緒排程
+FANOUT = True        # 同一區段的多個市場共用一次表單載入（報表支援時）
+
+
+###############################################################################
+# 批次規格："all reports, sii+otc, 102~113"
+###############################################################################
+
+class BatchSpec:
+    def __init__(self, reports: Sequence[str], markets: Sequence[str], ranges: Sequence[str]):
+        self.reports = list(reports)
+        self.markets = list(markets)
+        self.ranges = list(ranges)
+
+    def units(self) -> List[Unit]:
+        """展開成下載單位（依報表各自的區段規則），重複的只留一個"""
+        out: List[Unit] = []
+        for name in self.reports:
+            report = get_report(name)
+            periods = [p for r in self.ranges for p in report.expand(r)]
+            out.extend(Unit(name, m, y, p) for m in self.markets for y, p in periods)
+        return list(dict.fromkeys(out))
+
+
+_RANGE = re.compile(r"^\d{2,4}(-\d{1,2})?(~\d{2,4}(-\d{1,2})?)?$")
+
+
+def parse_batch_spec(text: str) -> BatchSpec:
+    """
+    以逗號分段，每段自動判斷是報表、市場或區段：
+      "all reports, sii+otc, 102~113"
+      "eps+cash_flow, sii, 110-01~113-02"
+      "monthly_income, otc, 2023-01~2024-06"
+    沒寫報表視為全部；沒寫市場視為 sii。
+    """
+    reports: List[str] = []
+    markets: List[str] = []
+    ranges: List[str] = []
+    for part in (p.strip() for p in text.split(",")):
+        if not part:
+            continue
+        compact = part.replace(" ", "")
+        if _RANGE.match(compact):
+            ranges.append(compact)
+            continue
+        words = [w for w in re.split(r"[+\s/]+", part.lower()) if w and w not in ("reports", "report")]
+        if words and all(w == "all" or w in REPORTS for w in words):
+            reports.extend(REPORTS if "all" in words else words)
+        elif words and all(w in MARKETS for w in words):
+            markets.extend(words)
+        else:
+            raise ValueError(f"看不懂的批次規格片段：{part!r}")
+    if not ranges:
+        raise ValueError("批次規格至少要有一個年份 / 區段範圍，例如 102~113")
+    return BatchSpec(list(dict.fromkeys(reports or REPORTS)),
+                     list(dict.fromkeys(markets or ["sii"])), ranges)
+
+
+###############################################################################
+# 日誌中的工作單位
+###############################################################################
+
+def unit_from_journal(raw: Any, report: Optional[str] = None,
+                      market: str = "sii") -> Unit:
+    """
+    新格式為 [report, market, year, period]；
+    也讀得懂舊版單一腳本寫的 [year, season] 與 "YYYY-MM"。
+    """
+    if isinstance(raw, str):
+        y, m = raw.split("-")
+        return Unit(report or "monthly_income", market, int(y), int(m))
+    if len(raw) == 2:
+        return Unit(report or "eps", market, raw[0], raw[1])
+    return Unit(*raw)
+
+
+###############################################################################
+# 規劃與執行
+###############################################################################
+
+def plan(manifest: Manifest, units: Iterable[Unit],
+         journal: Optional[Journal] = None) -> List[Unit]:
+    """
+    依 (報表, 市場) 分組查下載清單，已同步或磁碟上已有完整檔案的區段直接略過。
+    有傳 journal 時，上一次執行中失敗或中斷的單位一律重抓，不看磁碟上殘留的檔案。
+    """
+    unsettled = set()
+    if journal is not None:
+        market = journal.meta.get("market", "sii")
+        unsettled = {unit_from_journal(u, market=market) for u in journal.unsettled_units()}
+    groups: Dict[Tuple[str, str], List[Unit]] = {}
+    for u in dict.fromkeys(units):
+        groups.setdefault((u.report, u.market), []).append(u)
+    todo: List[Unit] = []
+    for (name, market), items in groups.items():
+        report = get_report(name)
+        todo += manifest.plan_missing(name, market, items, report.manifest_key,
+                                      locate=lambda u, r=report: (r.out_dir(u), r.pattern(u)),
+                                      expected=report.expected_files, unsettled=unsettled)
+    return todo
+
+
+def sort_key(u: Unit):
+    return get_report(u.report).sort_key(u)
+
+
+Group = Tuple[Unit, ...]
+
+
+def fanout_groups(units: Iterable[Unit], fanout: bool = FANOUT) -> List[Group]:
+    """
+    把同一 (報表, 年, 區段) 的不同市場併成一組，由同一個瀏覽器一次處理；
+    報表不支援（或 fanout=False）時每個單位自成一組。
+    """
+    groups: Dict[Any, List[Unit]] = {}
+    for u in units:
+        key = (u.report, u.year, u.period) if fanout and get_report(u.report).fanout else u
+        groups.setdefault(key, []).append(u)
+    return [tuple(g) for g in groups.values()]
+
+
+def group_label(group: Group) -> str:
+    u0 = group[0]
+    label = get_report(u0.report).label(u0)
+    if len(group) == 1:
+        return label
+    return f"{label.rsplit(' ', 1)[0]} {'+'.join(u.market for u in group)}"
+
+
+def run_sync(units: Sequence[Unit], journal: Journal, log_name: str,
+             tabs: int = TABS, carry: Sequence[Unit] = ()) -> RunStats:
+    """
+    units 全部一起規劃、排程：
+    * 同一批次裡的季報、月營收共用同一組常駐瀏覽器與 HTTP session
+    * tabs > 0 時只開一個 Chrome，以 tabs 個分頁並行（每個分頁自己的下載資料夾與 pop‑up）
+    * 每種報表有自己的並行上限（報表登錄表的 workers）
+    * 日誌記錄每個單位的狀態，--resume / --retry-failed 可接續；
+      carry 是這次不跑、但要留在日誌裡給之後 --resume 的單位
+    """
+    manifest = Manifest()
+    todo = plan(manifest, units, journal)
+    print(f"將下載 {len(todo)} 個區段（{len(units) - len(todo)} 個已同步略過）...\n")
+    if not todo:
+        manifest.close()
+        print("=== 完成：沒有需要下載的區段 ===")
+        return RunStats()
+
+    # 上次中斷留下的半成品先清掉，再寫入這次的工作計畫
+    cleanup_partials({get_report(u.report).out_dir(u) for u in todo})
+    journal.start_run([list(u) for u in todo], {
+        "reports": sorted({u.report for u in todo}),
+        "markets": sorted({u.market for u in todo}),
+    }, carry=[list(u) for u in carry])
+
+    stats: RunStats[Unit] = RunStats()
+
+    def record(u: Unit, result: Any) -> bool:
+        ok = get_report(u.report).record(manifest, u, result)
+        journal.mark(list(u), DONE if ok else FAILED)
+        stats.record(u, ok)
+        print(f"➜ {get_report(u.report).label(u)} {'✔' if ok else '✗'}")
+        return ok
+
+    def start(group: Group):
+        print(f"\n▶ 下載 {group_label(group)}…")
+        for u in group:
+            journal.mark(list(u), RUNNING)
+
+    def fail(group: Group, e: Exception):
+        err = classify(e)
+        for u in group:
+            journal.mark(list(u), FAILED, f"{err.kind}: {e}")
+            stats.record(u, False, e)
+
+    def timing_item(group: Group) -> list:
+        u0 = group[0]
+        return [u0.report, "+".join(u.market for u in group), u0.year, u0.period]
+
+    def job(group: Group) -> bool:
+        report = get_report(group[0].report)
+        start(group)
+        try:
+            with unit(report.name, timing_item(group)), stage("period"):
+                results = report.fetch_many(list(group), pool)
+        except Exception as e:
+            fail(group, e)
+            raise
+        return all([record(u, results[u]) for u in group])
+
+    async def ajob(group: Group) -> bool:
+        report = get_report(group[0].report)
+        start(group)
+        try:
+            with unit(report.name, timing_item(group)), stage("period"):
+                results = await report.afetch_many(engine, list(group), pool)
+        except Exception as e:
+            fail(group, e)
+            raise
+        return all([await engine.run_blocking(record, u, results[u]) for u in group])
+
+    from quarterly import make_driver
+
+    # 整個執行期間共用暖機好的瀏覽器（HTTP 成功的報表根本不會啟動）
+    if tabs > 0:
+        pool = TabPool(make_driver, size=tabs, max_jobs=POOL_MAX_JOBS * tabs)
+    else:
+        pool = DriverPool(make_driver, size=BROWSERS, max_jobs=POOL_MAX_JOBS)
+    with run_log(log_name), journal, manifest, get_transcoder(), pool:
+        groups = fanout_groups(todo)
+        group_key = lambda g: sort_key(g[0])
+        if USE_ASYNC:
+            engine = AsyncEngine({name: max(r.workers, tabs) for name, r in REPORTS.items()})
+            engine.run((g[0].report, g, ajob)
+                       for g in order_items(groups, NEWEST_FIRST, group_key))
+        else:
+            run_periods(groups, job, workers=tabs or BROWSERS,
+                        newest_first=NEWEST_FIRST, key=group_key)
+
+    print(f"\n=== 完成：成功 {stats.success} 筆，失敗 {stats.fail} 筆 ===")
+    kinds = Counter(classify(e).kind for _, e in stats.failed if e is not None)
+    if kinds:
+        print("失敗原因：" + "、".join(f"{k} {n} 筆" for k, n in kinds.most_common()))
+    return stats
+
+
+def resume_units(journal: Journal, retry_failed: bool,
+                 report: Optional[str] = None) -> Tuple[List[Unit], List[Unit]]:
+    """
+    回傳 (這次要跑的單位, 要留在日誌裡的單位)。
+    --retry-failed 只重抓失敗的，上一次還沒跑到的單位原樣帶進新的日誌，之後仍可 --resume。
+    """
+    market = journal.meta.get("market", "sii")
+    convert = lambda raw: [unit_from_journal(u, report, market) for u in raw]
+    if not retry_failed:
+        units = convert(journal.pending_units())
+        print(f"接續上次：{len(units)} 個區段")
+        return units, []
+    units, carry = convert(journal.failed_units()), convert(journal.unattempted_units())
+    print(f"重抓失敗：{len(units)} 個區段"
+          + (f"（另有 {len(carry)} 個尚未執行的區段保留給 --resume）" if carry else ""))
+    return units, carry
+
+
+###############################################################################
+# 單一報表的互動入口（EPS_table.py 等舊腳本沿用）
+###############################################################################
+
+def ask_units(name: str) -> List[Unit]:
+    report = get_report(name)
+    if report.kind == "monthly":
+        from monthly import ask_range, ym_iter
+        start, end = ask_range()
+        return [Unit(name, "sii", d.year, d.month) for d in ym_iter(start, end)]
+    from quarterly import ask_range
+    year_season_list = ask_range()   # List[(year, season?)]
+    while True:
+        raw = input("請輸入市場別 (sii=上市, otc=上櫃，可用 + 一次多個) [預設: sii]: ").lower()
+        markets = [m for m in re.split(r"[+,\s]+", raw) if m] or ["sii"]
+        if all(m in MARKETS for m in markets):
+            break
+        print(f"❌ 市場別只能是 {', '.join(MARKETS)}")
+    return [Unit(name, m, y, s) for m in markets for y, s in year_season_list]
+
+
+def parse_single_args(description: str, argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--resume", action="store_true",
+                       help="接續上一次中斷的執行（不再詢問範圍與市場）")
+    group.add_argument("--retry-failed", action="store_true",
+                       help="只重抓上一次執行中失敗的區段")
+    return parser.parse_args(argv)
+
+
+def run_single(name: str, description: str, argv: Optional[List[str]] = None) -> RunStats:
+    """舊腳本的 main()：互動輸入或接續日誌，其餘交給 run_sync"""
+    args = parse_single_args(description, argv)
+    print(f"=== {description} ===")
+    print("=" * 50)
+    journal = Journal(JOURNAL_DIR / f"{name}.jsonl")
+    carry: List[Unit] = []
+    if args.resume or args.retry_failed:
+        units, carry = resume_units(journal, args.retry_failed, name)
+    else:
+        units = ask_units(name)
+    return run_sync(units, journal, name, carry=carry)
+
+
+###############################################################################
+# 批次 CLI
+###############################################################################
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="MOPS 統一下載引擎",
+        epilog='例：python sync.py "all reports, sii+otc, 102~113"')
+    parser.add_argument("spec", nargs="?", help="批次規格（報表, 市場, 區段），以逗號分隔")
+    parser.add_argument("--reports", help=f"逗號分隔：{', '.join(REPORTS)} 或 all")
+    parser.add_argument("--markets", help=f"逗號分隔：{', '.join(MARKETS)}")
+    parser.add_argument("--range", action="append", dest="ranges",
+                        help="年份 / 區段範圍，例如 102~113 或 110-01~113-02；可重複")
+    parser.add_argument("--journal", default="sync", help="日誌名稱（.journal/<名稱>.jsonl）")
+    parser.add_argument("--tabs", type=int, default=TABS,
+                        help="單一 Chrome 內並行的分頁數；0 表示每個工作各用一個瀏覽器")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--resume", action="store_true", help="接續上一次中斷的批次")
+    group.add_argument("--retry-failed", action="store_true", help="只重抓上一次失敗的單位")
+    return parser.parse_args(argv)
+
+
+def batch_from_args(args: argparse.Namespace) -> BatchSpec:
+    parts: List[str] = [args.spec] if args.spec else []
+    if args.reports:
+        parts.append(args.reports.replace(",", "+"))
+    if args.markets:
+        parts.append(args.markets.replace(",", "+"))
+    parts += args.ranges or []
+    return parse_batch_spec(", ".join(parts))
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    print("=== MOPS 統一下載引擎 ===")
+    print("=" * 50)
+    journal = Journal(JOURNAL_DIR / f"{args.journal}.jsonl")
+    carry: List[Unit] = []
+    if args.resume or args.retry_failed:
+        units, carry = resume_units(journal, args.retry_failed)
+    else:
+        try:
+            batch = batch_from_args(args)
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+        units = batch.units()
+        print(f"報表：{', '.join(batch.reports)}；市場：{', '.join(batch.markets)}；"
+              f"區段：{', '.join(batch.ranges)} → 共 {len(units)} 個單位")
+    run_sync(units, journal, args.journal, args.tabs, carry)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import io
+import os
+import pathlib
+from typing import Iterable, List, Union
+from urllib.parse import urlsplit
+
+import pandas as pd
+from lxml import etree, html as lxml_html
+
+from http_fetch import TIMEOUT, decode_bytes, get_session
+from rate_limit import throttle
+
+###############################################################################
+# t21sc03 月營收 HTML 解析：一次 lxml/XSLT 掃過所有產業表，直接轉成 pandas 欄位
+###############################################################################
+
+# 與官方「另存 CSV」的欄名一致，後續入庫與分析不必區分來源
+COLUMNS: List[str] = [
+    "產業別",
+    "公司代號",
+    "公司名稱",
+    "營業收入-當月營收",
+    "營業收入-上月營收",
+    "營業收入-去年當月營收",
+    "營業收入-上月比較增減(%)",
+    "營業收入-去年同月增減(%)",
+    "累計營業收入-當月累計營收",
+    "累計營業收入-去年累計營收",
+    "累計營業收入-前期比較增減(%)",
+    "備註",
+]
+TEXT_COLUMNS = {"產業別": str, "公司代號": str, "公司名稱": str, "備註": str}
+
+# 每個資料列輸出成一行 TSV：產業別 + 前 11 格；合計列與表頭列被 XPath 條件排除。
+# 整個轉換在 libxslt（C）裡完成，Python 端沒有逐格迴圈。
+_XSLT = etree.XSLT(etree.XML("""\
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:output method="text" encoding="UTF-8"/>
+  <xsl:template match="/">
+    <xsl:for-each select="//tr[count(td) &gt;= 10]
+                              [normalize-space(td[1]) != '']
+                              [not(contains(td[1], '合計'))]">
+      <xsl:value-of select="normalize-space(ancestor::table[.//th[contains(., '產業別')]][1]
+                                            //th[contains(., '產業別')][1])"/>
+      <xsl:for-each select="td[position() &lt;= 11]">
+        <xsl:text>&#9;</xsl:text>
+        <xsl:value-of select="translate(normalize-space(.), '&#9;', ' ')"/>
+      </xsl:for-each>
+      <xsl:text>&#10;</xsl:text>
+    </xsl:for-each>
+  </xsl:template>
+</xsl:stylesheet>
+"""))
+
+
+def parse_t21sc03(page: Union[str, bytes]) -> pd.DataFrame:
+    """
+    解析一整個月的 t21sc03 頁面（所有產業表），回傳依官方 CSV 欄名的橫斷面。
+    數值欄由 read_csv 以 C 解析器一次轉成 float64（含千分位逗號）。
+    """
+    if isinstance(page, bytes):
+        page = decode_bytes(page)
+    doc = lxml_html.document_fromstring(page)
+    tsv = bytes(_XSLT(doc))
+    if not tsv.strip():
+        return pd.DataFrame({c: pd.Series(dtype=TEXT_COLUMNS.get(c, "float64")) for c in COLUMNS})
+
+    df = pd.read_csv(io.BytesIO(tsv), sep="\t", header=None, names=COLUMNS,
+                     dtype=TEXT_COLUMNS, thousands=",", encoding="utf-8",
+                     na_values=["-", "--", "不適用", "N/A"], keep_default_na=False,
+                     quoting=3)   # csv.QUOTE_NONE：公司名稱裡的引號照原樣保留
+    df["產業別"] = df["產業別"].str.replace(r"^產業別\s*[:：]\s*", "", regex=True)
+    return df
+
+
+def parse_file(path: pathlib.Path) -> pd.DataFrame:
+    return parse_t21sc03(pathlib.Path(path).read_bytes())
+
+
+def parse_many(paths: Iterable[pathlib.Path]) -> pd.DataFrame:
+    """多個月份一起解析，加上來源檔名方便對回月份"""
+    frames = []
+    for p in paths:
+        df = parse_file(p)
+        df.insert(0, "source", pathlib.Path(p).name)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["source", *COLUMNS])
+
+
+def write_csv(df: pd.DataFrame, dest: pathlib.Path) -> pathlib.Path:
+    """寫成 UTF-8 BOM CSV（與轉碼後的官方 CSV 相同格式）"""
+    dest = pathlib.Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, dest)
+    return dest
+
+
+def fetch_monthly_income_parsed(url: str, target_dir: pathlib.Path,
+                                session=None) -> pathlib.Path:
+    """只抓靜態 HTML、在本機解析後存成 CSV；完全不需要頁面上的下載按鈕"""
+    session = session or get_session()
+    throttle(url)
+    resp = session.get(url, timeout=TIMEOUT)
+    resp.raise_for_status()
+    df = parse_t21sc03(resp.content)
+    if df.empty:
+        raise ValueError("頁面上沒有任何營收資料列")
+    name = pathlib.PurePosixPath(urlsplit(url).path).stem.removesuffix("_0") + ".csv"
+    return write_csv(df, pathlib.Path(target_dir) / name)
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import time
+import queue
+import pathlib
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from cdp import CdpConnection
+from download_watch import CompletedDownload
+from scrape_profile import blocked_urls_for
+from timing import stage
+
+if TYPE_CHECKING:
+    from driver_pool import DriverFactory
+    from selenium import webdriver
+
+###############################################################################
+# 分頁池：一個 Chrome、多個分頁並行，每個分頁有自己的下載資料夾與 pop‑up
+###############################################################################
+
+POLL = 0.1   # wait_until 輪詢間隔（秒）；每次只是一個 CDP 往返
+
+
+def block(conn: CdpConnection, session_id: str, urls: List[str]):
+    """沿用瀏覽器啟動時的資源封鎖清單（scrape_profile）；Network.setBlockedURLs 只對單一 target 有效"""
+    if urls:
+        conn.call("Network.enable", session_id=session_id)
+        conn.call("Network.setBlockedURLs", {"urls": urls}, session_id=session_id)
+
+
+class Popup:
+    """
+    分頁開出的 pop‑up（window.open 產生的 target）。
+    current_url / page_source / get_cookies 與 WebDriver 同名，form_replay 的工具可以直接吃。
+    """
+
+    def __init__(self, tab: "Tab", target_id: str):
+        self.tab = tab
+        self.target_id = target_id
+        self.session_id = tab.conn.call("Target.attachToTarget",
+                                        {"targetId": target_id, "flatten": True})["sessionId"]
+        block(tab.conn, self.session_id, tab.pool.blocked_urls)
+
+    def evaluate(self, expression: str, timeout: float = 10):
+        return self.tab.evaluate(expression, timeout, session_id=self.session_id)
+
+    def wait_until(self, expression: str, timeout: float = 20):
+        self.tab.wait_until(expression, timeout, session_id=self.session_id)
+
+    def wait_loaded(self, timeout: float = 20):
+        self.wait_until("location.href !== 'about:blank' && document.readyState === 'complete'",
+                        timeout)
+
+    @property
+    def current_url(self) -> str:
+        return self.evaluate("location.href")
+
+    @property
+    def page_source(self) -> str:
+        return self.evaluate("document.documentElement.outerHTML")
+
+    def get_cookies(self) -> List[dict]:
+        return self.tab.get_cookies()
+
+    def close(self):
+        try:
+            self.tab.conn.call("Target.closeTarget", {"targetId": self.target_id})
+        except (RuntimeError, TimeoutError):
+            pass
+
+
+class Tab:
+    """
+    一個分頁 = 一個獨立的 browser context（cookie、storage、下載路徑互不干擾）。
+    * pop‑up：同一個 context 裡新開的 page target 就是它的 pop‑up，不必數視窗
+    * 下載：downloadWillBegin 的 frameId 對到分頁或其 pop‑up，完成事件只進這個分頁的佇列
+    * wait_completed 與 CdpDownloadWatcher 同介面，download_watch.wait_for_file 可以直接用
+    """
+
+    def __init__(self, pool: "TabPool", download_dir: pathlib.Path):
+        self.pool = pool
+        self.conn = pool.conn
+        self.download_dir = pathlib.Path(download_dir).resolve()
+        self.target_id: Optional[str] = None
+        self.session_id: Optional[str] = None
+        self._loaded = threading.Event()
+        self._popups: "queue.Queue[str]" = queue.Queue()
+        self._completed: "queue.Queue[CompletedDownload]" = queue.Queue()
+        self._suggested: Dict[str, str] = {}
+
+        self.context_id = self.conn.call("Target.createBrowserContext",
+                                         {"disposeOnDetach": True})["browserContextId"]
+        try:
+            pool._index(context=self.context_id, tab=self)
+            self.target_id = self.conn.call("Target.createTarget", {
+                "url": "about:blank", "browserContextId": self.context_id,
+            })["targetId"]
+            pool._index(frame=self.target_id, tab=self)
+            self.session_id = self.conn.call("Target.attachToTarget", {
+                "targetId": self.target_id, "flatten": True,
+            })["sessionId"]
+            pool._index(session=self.session_id, tab=self)
+            self.call("Page.enable")
+            block(self.conn, self.session_id, pool.blocked_urls)
+            self.conn.call("Browser.setDownloadBehavior", {
+                "behavior": "allowAndName",
+                "browserContextId": self.context_id,
+                "downloadPath": str(self.download_dir),
+                "eventsEnabled": True,
+            })
+        except BaseException:
+            self.close()
+            raise
+
+    # -- 頁面操作 ----------------------------------------------------------------
+
+    def call(self, method: str, params: Optional[dict] = None, timeout: float = 10) -> dict:
+        return self.conn.call(method, params, session_id=self.session_id, timeout=timeout)
+
+    def get(self, url: str, timeout: float = 30):
+        """導向 url 並等到 load 事件"""
+        self._loaded.clear()
+        res = self.call("Page.navigate", {"url": url}, timeout)
+        if res.get("errorText"):
+            raise RuntimeError(f"開啟 {url} 失敗: {res['errorText']}")
+        if not self._loaded.wait(timeout):
+            raise TimeoutError(f"頁面載入逾時: {url}")
+
+    def evaluate(self, expression: str, timeout: float = 10,
+                 session_id: Optional[str] = None):
+        res = self.conn.call("Runtime.evaluate", {
+            "expression": expression, "returnByValue": True, "awaitPromise": True,
+        }, session_id=session_id or self.session_id, timeout=timeout)
+        if "exceptionDetails" in res:
+            detail = res["exceptionDetails"]
+            text = detail.get("exception", {}).get("description") or detail.get("text")
+            raise RuntimeError(f"頁面腳本錯誤: {text}")
+        return res.get("result", {}).get("value")
+
+    def wait_until(self, expression: str, timeout: float = 20,
+                   session_id: Optional[str] = None):
+        deadline = time.monotonic() + timeout
+        while not self.evaluate(expression, session_id=session_id):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"等待逾時: {expression}")
+            time.sleep(POLL)
+
+    def wait_popup(self, timeout: float = 20) -> Popup:
+        """等這個分頁開出的下一個 pop‑up"""
+        try:
+            target_id = self._popups.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("等不到結果 pop‑up") from None
+        return Popup(self, target_id)
+
+    def get_cookies(self) -> List[dict]:
+        return self.conn.call("Storage.getCookies",
+                              {"browserContextId": self.context_id}).get("cookies", [])
+
+    def wait_completed(self, timeout: float) -> Optional[CompletedDownload]:
+        try:
+            return self._completed.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """關掉 context（連同 pop‑up）；cookie、快取、記憶體一起釋放"""
+        self.pool._forget(self)
+        try:
+            self.conn.call("Target.disposeBrowserContext", {"browserContextId": self.context_id})
+        except (RuntimeError, TimeoutError):
+            pass
+
+
+class TabPool:
+    """
+    與 DriverPool 相同的 lease() 介面，但只開一個 Chrome：
+    * 最多 size 個分頁同時工作，每次 lease 都是全新的 browser context，用完即丟
+    * 分頁之間共用瀏覽器行程，記憶體不會隨並行數倍增
+    * 跑滿 max_jobs 個工作後，等手上的分頁都歸還再重開瀏覽器
+    """
+
+    def __init__(self, factory: "DriverFactory", size: int = 4, max_jobs: int = 200):
+        if size < 1:
+            raise ValueError("size 至少為 1")
+        self.factory = factory
+        self.size = size
+        self.max_jobs = max_jobs
+        self.driver: Optional[webdriver.Chrome] = None
+        self.conn: Optional[CdpConnection] = None
+        self.blocked_urls: List[str] = []
+        self._cond = threading.Condition()
+        self._active = 0
+        self._jobs = 0
+        self._closed = False
+        # 事件路由表（讀取執行緒查、工作執行緒寫）
+        self._contexts: Dict[str, Tab] = {}
+        self._frames: Dict[str, Tab] = {}
+        self._sessions: Dict[str, Tab] = {}
+        self._guids: Dict[str, Tab] = {}
+
+    # -- 取用 / 歸還 ------------------------------------------------------------
+
+    @contextmanager
+    def lease(self, download_dir: pathlib.Path) -> Iterator[Tab]:
+        if self._closed:
+            raise RuntimeError("TabPool 已關閉")
+        download_dir = pathlib.Path(download_dir)
+        download_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._cond:
+            while self._active >= self.size or (self._jobs >= self.max_jobs and self._active):
+                self._cond.wait()
+            if self._jobs >= self.max_jobs:
+                self._shutdown()
+            self._active += 1
+            try:
+                self._ensure_browser(download_dir)
+            except BaseException:
+                self._active -= 1
+                self._cond.notify_all()
+                raise
+
+        tab: Optional[Tab] = None
+        try:
+            with stage("tab_open"):
+                try:
+                    tab = Tab(self, download_dir)
+                except (RuntimeError, TimeoutError):
+                    if self.conn is not None and self.conn.closed:
+                        # 瀏覽器已經掛掉；等其他分頁歸還後重開
+                        with self._cond:
+                            self._jobs = self.max_jobs
+                    raise
+            yield tab
+        finally:
+            if tab is not None:
+                tab.close()
+            with self._cond:
+                self._active -= 1
+                self._jobs += 1
+                self._cond.notify_all()
+
+    def _ensure_browser(self, download_dir: pathlib.Path):
+        """在 _cond 內呼叫；啟動期間其他 lease 會等著"""
+        if self.driver is not None:
+            return
+        with stage("driver_start", tabs=self.size):
+            self.driver = self.factory(download_dir)
+        try:
+            self.conn = CdpConnection.for_driver(self.driver)
+            self.conn.add_listener(self._on_event)
+            self.conn.call("Target.setDiscoverTargets", {"discover": True})
+            self.blocked_urls = blocked_urls_for(self.driver)
+        except BaseException:
+            self._shutdown()
+            raise
+        self._jobs = 0
+
+    def _shutdown(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.driver is not None:
+            from driver_pool import _quit
+            _quit(self.driver)
+            self.driver = None
+        self._jobs = 0
+
+    # -- 事件路由 ----------------------------------------------------------------
+
+    def _index(self, tab: Tab, context: Optional[str] = None, frame: Optional[str] = None,
+               session: Optional[str] = None):
+        with self._cond:
+            if context:
+                self._contexts[context] = tab
+            if frame:
+                self._frames[frame] = tab
+            if session:
+                self._sessions[session] = tab
+
+    def _forget(self, tab: Tab):
+        with self._cond:
+            for table in (self._contexts, self._frames, self._sessions, self._guids):
+                for key in [k for k, v in table.items() if v is tab]:
+                    del table[key]
+
+    def _on_event(self, method: str, params: dict, session_id: Optional[str]):
+        if method == "Target.targetCreated":
+            info = params.get("targetInfo", {})
+            tab = self._contexts.get(info.get("browserContextId"))
+            # 分頁自己的 target 也會觸發一次；target_id 還沒回來或相同就不是 pop‑up
+            if tab is None or info.get("type") != "page" or \
+                    tab.target_id in (None, info["targetId"]):
+                return
+            with self._cond:
+                self._frames[info["targetId"]] = tab
+            tab._popups.put(info["targetId"])
+        elif method == "Page.loadEventFired":
+            tab = self._sessions.get(session_id or "")
+            if tab is not None:
+                tab._loaded.set()
+        elif method == "Browser.downloadWillBegin":
+            tab = self._frames.get(params.get("frameId", ""))
+            if tab is not None:
+                with self._cond:
+                    self._guids[params["guid"]] = tab
+                tab._suggested[params["guid"]] = params.get("suggestedFilename", "")
+        elif method == "Browser.downloadProgress" and \
+                params.get("state") in ("completed", "canceled"):
+            guid = params["guid"]
+            with self._cond:
+                tab = self._guids.pop(guid, None)
+            if tab is None:
+                return
+            suggested = tab._suggested.pop(guid, "")
+            if params["state"] == "completed":
+                path = params.get("filePath") or str(tab.download_dir / guid)
+                tab._completed.put(CompletedDownload(guid, pathlib.Path(path), suggested))
+
+    # -- 生命週期 ----------------------------------------------------------------
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._shutdown()
+
+    def __enter__(self) -> "TabPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
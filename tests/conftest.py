@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import sys
+import pathlib
+
+import pytest
+
+# 各模組都放在專案根目錄（沒有套件），測試直接 import
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+class FakeClock:
+    """取代 time.monotonic，測試自己推進時間"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    import rate_limit
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    """本機 MOPS 替身伺服器；工作目錄換到 tmp_path，下載檔、清單與 .blobs 都不會留在專案裡"""
+    import blob_store
+    import endpoints
+    from mops_standin import StandInServer
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(blob_store, "_default", None)
+    with StandInServer(companies=20, files_per_period=2) as srv:
+        monkeypatch.setitem(endpoints._bases, "mops", srv.url)
+        monkeypatch.setitem(endpoints._bases, "mopsov", srv.url)
+        yield srv
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import codecs
+import hashlib
+import os
+
+import pytest
+
+from blob_store import BlobStore
+from transcode import get_transcoder
+
+CSV = "公司代號,公司名稱\r\n2330,台積電\r\n".encode("cp950")
+
+
+@pytest.fixture
+def store(tmp_path) -> BlobStore:
+    return BlobStore(tmp_path / ".blobs")
+
+
+def _download(path, data: bytes = CSV):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path, hashlib.sha256(data).hexdigest()
+
+
+def test_fresh_content_is_transcoded_then_adopted(store, tmp_path):
+    src, digest = _download(tmp_path / "a.csv.part")
+    dest = tmp_path / "Q1" / "a.csv"
+    assert store.commit(src, dest, digest) == (dest, True)
+    get_transcoder().wait_path(dest)
+
+    assert not src.exists()
+    assert dest.read_bytes().startswith(codecs.BOM_UTF8)
+    assert store.has(digest)
+    assert os.path.samefile(store.path_for(digest), dest)
+
+
+def test_same_raw_bytes_link_to_existing_blob(store, tmp_path):
+    first, digest = _download(tmp_path / "a.part")
+    store.commit(first, tmp_path / "Q1" / "a.csv", digest)
+    get_transcoder().wait_path(tmp_path / "Q1" / "a.csv")
+
+    again, _ = _download(tmp_path / "b.part")
+    dest = tmp_path / "Q2" / "b.csv"
+    dest.parent.mkdir()
+    dest.write_bytes(b"stale")                    # 舊檔直接被取代，不產生 b(1).csv
+    assert store.commit(again, dest) == (dest, False)   # 沒給 digest 時自己算
+
+    assert not again.exists()
+    assert os.path.samefile(dest, tmp_path / "Q1" / "a.csv")
+    assert sorted(p.name for p in dest.parent.iterdir()) == ["b.csv"]
+    assert store.stats()[0] == 1
+
+
+def test_commit_in_place_keeps_file(store, tmp_path):
+    path, digest = _download(tmp_path / "Q1" / "a.csv")
+    store.commit(path, path, digest)
+    get_transcoder().wait_path(path)
+    assert store.commit(path, path, digest) == (path, False)
+    assert path.read_bytes().startswith(codecs.BOM_UTF8)
+
+
+def test_non_text_files_are_adopted_immediately(store, tmp_path):
+    src, digest = _download(tmp_path / "a.part", b"PK\x03\x04zip")
+    dest = tmp_path / "a.zip"
+    store.commit(src, dest, digest)
+    assert os.path.samefile(store.path_for(digest), dest)
+    assert dest.read_bytes() == b"PK\x03\x04zip"
+
+
+def test_prune_removes_only_unreferenced_blobs(store, tmp_path):
+    keep, d1 = _download(tmp_path / "keep.part", b"keep")
+    drop, d2 = _download(tmp_path / "drop.part", b"drop")
+    store.commit(keep, tmp_path / "keep.bin", d1)
+    store.commit(drop, tmp_path / "drop.bin", d2)
+    (tmp_path / "drop.bin").unlink()
+
+    assert store.prune() == 1
+    assert store.has(d1) and not store.has(d2)
+    count, stored, referenced = store.stats()
+    assert (count, stored, referenced) == (1, 4, 4)
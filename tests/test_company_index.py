@@ -0,0 +1,88 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from company_index import CompanyIndex, read_rows
+from parquet_store import ROW_GROUP_ROWS, partition_dir, write_partition_file
+
+
+@pytest.fixture
+def index(tmp_path):
+    with CompanyIndex(tmp_path / "_company_index.sqlite") as idx:
+        yield idx
+
+
+def _write(tmp_path, counts, year=113, period="01", report="monthly_income"):
+    """依 counts {代號: 列數} 寫一個依代號排序的分區檔；value 為全檔的列號"""
+    codes = [c for c, n in sorted(counts.items()) for _ in range(n)]
+    table = pa.table({"公司代號": codes, "value": list(range(len(codes)))})
+    dest = partition_dir(report, "sii", year, period, tmp_path / "store") / "part-0.parquet"
+    return write_partition_file(table, dest), codes
+
+
+def test_read_rows_only_touches_covering_row_groups(tmp_path):
+    # 跨過第一個 row group 的邊界
+    n = ROW_GROUP_ROWS
+    dest, _ = _write(tmp_path, {"1101": n - 10, "2330": 20, "9999": 2 * n})
+    assert pq.ParquetFile(dest).num_row_groups == 4
+
+    rows = read_rows(str(dest), n - 10, 20)
+    assert rows.column("value").to_pylist() == list(range(n - 10, n + 10))
+    assert set(rows.column("公司代號").to_pylist()) == {"2330"}
+
+    # 整段都在第三組（第一個讀到的組不是 0）
+    assert read_rows(str(dest), 2 * n + 5, 3).column("value").to_pylist() == [
+        2 * n + 5, 2 * n + 6, 2 * n + 7]
+
+
+def test_read_rows_skips_unknown_columns(tmp_path):
+    dest, _ = _write(tmp_path, {"1101": 3})
+    assert read_rows(str(dest), 0, 3, ["value", "不存在"]).column_names == ["value"]
+
+
+def test_update_file_records_contiguous_runs(index, tmp_path):
+    n = ROW_GROUP_ROWS
+    dest, codes = _write(tmp_path, {"1101": n - 10, "2330": 20})
+    index.update_file("monthly_income", "sii", 113, "01", dest, codes)
+
+    [loc] = index.locations("2330")
+    assert (loc.file, loc.row_start, loc.row_count) == (str(dest), n - 10, 20)
+    assert index.locations("0000") == []
+
+
+def test_update_file_replaces_previous_rows(index, tmp_path):
+    dest, codes = _write(tmp_path, {"1101": 2, "2330": 3})
+    index.update_file("monthly_income", "sii", 113, "01", dest, codes)
+    # 重新入庫：2330 改列數、1101 不見了
+    dest, codes = _write(tmp_path, {"2330": 4, "2454": 1})
+    index.update_file("monthly_income", "sii", 113, "01", dest, codes)
+
+    assert index.locations("1101") == []
+    [loc] = index.locations("2330")
+    assert (loc.row_start, loc.row_count) == (0, 4)
+
+    index.drop_file(dest)
+    assert index.locations("2330") == [] and index.locations("2454") == []
+
+
+def test_lookup_last_periods_and_columns(index, tmp_path):
+    for month in ("01", "02", "03"):
+        dest, codes = _write(tmp_path, {"1101": 1, "2330": 2}, period=month)
+        index.update_file("monthly_income", "sii", 113, month, dest, codes)
+    dest, codes = _write(tmp_path, {"2330": 1}, year=112, period="Q4", report="balance_sheet")
+    index.update_file("balance_sheet", "sii", 112, "Q4", dest, codes)
+
+    result = index.lookup("2330")
+    assert set(result) == {"monthly_income", "balance_sheet"}
+    frame = result["monthly_income"]
+    assert frame["period"].tolist() == ["01", "01", "02", "02", "03", "03"]
+    assert frame["value"].tolist() == [1, 2] * 3
+    assert (frame["market"] == "sii").all()
+
+    recent = index.lookup("2330", reports=["monthly_income"], columns=["value"], last=2)
+    assert list(recent) == ["monthly_income"]
+    frame = recent["monthly_income"]
+    assert list(frame.columns) == ["market", "year", "period", "value"]
+    assert frame["period"].tolist() == ["02", "02", "03", "03"]
+    pd.testing.assert_series_equal(frame["year"], pd.Series([113] * 4, name="year"))
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derive import (CASH_FLOW, CASH_FLOW_Q, EPS, EPS_METRICS, MONTHLY, MONTHLY_METRICS, MONTHS,
+                    QUARTERS, REVENUE_COL, decumulate, derive_cash_flow, derive_eps_metrics,
+                    derive_monthly_metrics, eps_metrics, revenue_metrics, rolling_sum,
+                    write_partitions, ytd_sum)
+from parquet_store import CODE_COL, read_store
+
+CFO = "營業活動之淨現金流入（流出）"
+EPS_COL = "基本每股盈餘（元）"
+
+
+def _cum(rows) -> pd.DataFrame:
+    """rows: (公司代號, 年, 季, 累計值)"""
+    df = pd.DataFrame(rows, columns=[CODE_COL, "year", "period", CFO])
+    df.insert(1, "market", "sii")
+    df[CFO] = df[CFO].astype("float64")
+    return df
+
+
+def _by_key(df: pd.DataFrame) -> dict:
+    return {(r[CODE_COL], r["year"], r["period"]): r[CFO] for _, r in df.iterrows()}
+
+
+###############################################################################
+# 現金流量表
+###############################################################################
+
+def test_decumulate_subtracts_previous_quarter():
+    cum = _cum([("2330", 113, q, v) for q, v in zip(("Q1", "Q2", "Q3", "Q4"), (10, 25, 45, 50))])
+    out = decumulate(cum, [CFO])
+    assert out[CFO].tolist() == [10, 15, 20, 5]
+    assert list(out.columns) == list(cum.columns)
+
+
+def test_decumulate_gap_gives_nan_and_years_are_separate():
+    cum = _cum([
+        ("2330", 112, "Q4", 100),
+        ("2330", 113, "Q1", 10),
+        ("2330", 113, "Q3", 45),      # 缺 Q2
+        ("1101", 113, "Q2", 8),       # 缺 Q1
+    ])
+    got = _by_key(decumulate(cum, [CFO]))
+    assert got[("2330", 113, "Q1")] == 10       # 不減去年 Q4
+    assert np.isnan(got[("2330", 112, "Q4")])   # 112 年 Q3 沒有資料
+    assert np.isnan(got[("2330", 113, "Q3")])
+    assert np.isnan(got[("1101", 113, "Q2")])
+
+
+def test_decumulate_keeps_last_duplicate_and_drops_other_periods():
+    cum = _cum([
+        ("2330", 113, "Q1", 10),
+        ("2330", 113, "Q1", 12),      # 重新下載的更正值
+        ("2330", 113, "Q2", 30),
+        ("2330", 113, "all", 999),
+    ])
+    out = decumulate(cum, [CFO])
+    assert _by_key(out) == {("2330", 113, "Q1"): 12, ("2330", 113, "Q2"): 18}
+
+
+def test_derive_cash_flow_rewrites_touched_years(tmp_path):
+    cum = _cum([("2330", y, q, v) for y in (112, 113)
+                for q, v in zip(("Q1", "Q2", "Q3", "Q4"), (10, 25, 45, 50))])
+    write_partitions(cum, CASH_FLOW, tmp_path)
+
+    written = derive_cash_flow({(113, "Q2")}, tmp_path)
+    assert len(written) == 4
+    out = read_store(CASH_FLOW_Q, root=tmp_path)
+    assert sorted(out["year"].unique().tolist()) == [113]
+    assert out.sort_values("period")[CFO].tolist() == [10, 15, 20, 5]
+
+    assert derive_cash_flow({(2024, "01")}, tmp_path) == []    # 月份不影響季報
+    assert len(derive_cash_flow(None, tmp_path)) == 8
+
+
+def test_decumulate_empty():
+    assert decumulate(_cum([]), [CFO]).empty
+
+
+def _read(report: str, root) -> pd.DataFrame:
+    df = read_store(report, root=root)
+    for col in (CODE_COL, "market", "period"):
+        df[col] = df[col].astype(str)
+    df["year"] = df["year"].astype(int)
+    return (df.sort_values([CODE_COL, "year", "period"]).reset_index(drop=True)
+            [sorted(df.columns)])
+
+
+###############################################################################
+# 每股盈餘
+###############################################################################
+
+def _eps_cum(codes, years, seed=0, skip=()) -> pd.DataFrame:
+    """隨機單季 EPS 轉成年初至今累計；skip 中的 (代號, 年, 季) 當作缺檔"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i, code in enumerate(codes):
+        market = "sii" if i % 2 == 0 else "otc"
+        for y in years:
+            total = 0.0
+            for q in QUARTERS:
+                total = round(total + rng.normal(1.0, 1.5), 2)
+                if (code, y, q) not in skip:
+                    rows.append((code, market, y, q, total))
+    return pd.DataFrame(rows, columns=[CODE_COL, "market", "year", "period", EPS_COL])
+
+
+def test_eps_metrics_single_quarter_ttm_and_growth():
+    cum = pd.DataFrame({CODE_COL: "2330", "market": "sii",
+                        "year": [112] * 4 + [113] * 4, "period": list(QUARTERS) * 2,
+                        EPS_COL: [1, 3, 6, 10, 2, 5, 9, 14.0]})
+    out = eps_metrics(cum).set_index(["year", "period"])
+    assert out["單季EPS"].tolist() == [1, 2, 3, 4, 2, 3, 4, 5]
+    assert out.loc[(113, "Q4"), "近四季EPS"] == 14
+    assert out.loc[(113, "Q1"), "近四季EPS"] == 11
+    assert np.isnan(out.loc[(112, "Q3"), "近四季EPS"])
+    assert out.loc[(113, "Q2"), "EPS季增率"] == pytest.approx(0.5)
+    assert out.loc[(113, "Q4"), "EPS年增率"] == pytest.approx(0.25)
+    assert out.loc[(113, "Q4"), "近四季EPS年增率"] == pytest.approx(0.4)
+    assert out.loc[(113, "Q4"), "累計EPS"] == 14
+
+
+def test_eps_growth_uses_absolute_denominator():
+    cum = pd.DataFrame({CODE_COL: "1101", "market": "sii", "year": 113,
+                        "period": ["Q1", "Q2", "Q3"], EPS_COL: [-2.0, -1.0, -1.0]})
+    out = eps_metrics(cum)
+    assert out["EPS季增率"].tolist()[1:] == [pytest.approx(1.5), pytest.approx(-1.0)]
+
+
+def test_eps_rank_is_cross_sectional_per_quarter():
+    cum = _eps_cum(["1101", "1102", "2330"], [112, 113])
+    out = eps_metrics(cum)
+    q4 = out[(out["year"] == 113) & (out["period"] == "Q4")].set_index(CODE_COL)
+    order = q4["近四季EPS"].rank(pct=True)
+    assert q4["近四季EPS排名"].tolist() == order.tolist()
+    assert out[out["year"] == 112]["近四季EPS排名"].iloc[:3].isna().all()
+
+
+def test_rolling_sum_does_not_depend_on_window_start():
+    m = np.random.default_rng(2).normal(1.0, 1.5, (5, 30)).round(2)
+    m[1, 12] = np.nan
+    full, part = rolling_sum(m, 4), rolling_sum(m[:, 9:], 4)
+    assert np.isnan(full[1, 12:16]).all()
+    assert np.array_equal(full[:, 12:], part[:, 3:], equal_nan=True)   # 逐位元相同
+
+
+def test_incremental_eps_metrics_match_full_recompute(tmp_path):
+    codes = [f"{1101 + i}" for i in range(12)]
+    years = list(range(105, 114))
+    late = {(c, 113, "Q4") for c in codes}
+    full = _eps_cum(codes, years, seed=1)
+    # 第一次入庫時 113 Q4 還沒公布、108 年某家 Q2 缺檔
+    first = _eps_cum(codes, years, seed=1, skip=late | {("1103", 108, "Q2")})
+
+    inc, ref = tmp_path / "inc", tmp_path / "ref"
+    write_partitions(first, EPS, inc)
+    derive_eps_metrics(None, inc)
+
+    # 新的一季公布，同時補上缺檔並更正 110 年某家 Q3 的數字
+    fixed = full.copy()
+    fixed.loc[(fixed[CODE_COL] == "1105") & (fixed["year"] == 110) & (fixed["period"] == "Q3"),
+              EPS_COL] += 0.7
+    write_partitions(fixed, EPS, inc)
+    written = derive_eps_metrics({(113, "Q4"), (108, "Q2"), (110, "Q3")}, inc)
+    assert 0 < len(written) < len(years) * 4 * 2
+
+    write_partitions(fixed, EPS, ref)
+    derive_eps_metrics(None, ref)
+    pd.testing.assert_frame_equal(_read(EPS_METRICS, inc), _read(EPS_METRICS, ref))
+
+
+###############################################################################
+# 月營收
+###############################################################################
+
+def _revenue(codes, years, seed=0, skip=()) -> pd.DataFrame:
+    """月營收（西元年）；skip 中的 (代號, 年, 月) 當作缺檔"""
+    rng = np.random.default_rng(seed)
+    rows = [(code, "sii", y, m, float(rng.integers(1_000, 5_000_000)))
+            for code in codes for y in years for m in MONTHS]
+    df = pd.DataFrame(rows, columns=[CODE_COL, "market", "year", "period", REVENUE_COL])
+    keep = [(c, y, m) not in skip for c, y, m in zip(df[CODE_COL], df["year"], df["period"])]
+    return df[keep].reset_index(drop=True)
+
+
+def test_revenue_metrics_values():
+    df = pd.DataFrame({CODE_COL: "2330", "market": "sii",
+                       "year": [2023] * 12 + [2024] * 3, "period": list(MONTHS) + list(MONTHS[:3]),
+                       REVENUE_COL: [10.0] * 12 + [20.0, 30.0, 15.0]})
+    out = revenue_metrics(df).set_index(["year", "period"])
+    jan, mar = out.loc[(2024, "01")], out.loc[(2024, "03")]
+    assert jan["營收年增率"] == pytest.approx(1.0)
+    assert mar["營收月增率"] == pytest.approx(-0.5)
+    assert mar["近3月營收"] == 65
+    assert mar["近12月營收"] == 10 * 9 + 65
+    assert mar["累計營收"] == 65
+    assert mar["累計營收年增率"] == pytest.approx(65 / 30 - 1)
+    assert out.loc[(2023, "12"), "累計營收"] == 120
+
+
+def test_ytd_sum_restarts_each_january_and_needs_every_month():
+    m = np.array([[1.0, 2, 3, np.nan, 5, 6, 7, 8, 9, 10, 11, 12, 1, 2]])
+    ytd = ytd_sum(m, first=2023 * 12)
+    assert ytd[0, :3].tolist() == [1, 3, 6]
+    assert np.isnan(ytd[0, 3:12]).all()             # 4 月缺資料，之後整年都算不出來
+    assert ytd[0, 12:].tolist() == [1, 3]
+    assert np.isnan(ytd_sum(m[:, 1:], first=2023 * 12 + 1)).sum() == 11   # 看不到 1 月
+
+
+def test_ytd_sum_does_not_depend_on_window_start():
+    m = np.random.default_rng(3).integers(1_000, 5_000_000, (4, 60)) * 1.01
+    full, part = ytd_sum(m, 2019 * 12), ytd_sum(m[:, 24:], 2021 * 12)
+    assert np.array_equal(full[:, 24:], part)
+
+
+def test_incremental_revenue_metrics_match_full_recompute(tmp_path):
+    codes = [f"{1101 + i}" for i in range(8)]
+    years = list(range(2019, 2025))
+    full = _revenue(codes, years, seed=4)
+    first = _revenue(codes, years, seed=4,
+                     skip={(c, 2024, "12") for c in codes} | {("1102", 2023, "06")})
+
+    inc, ref = tmp_path / "inc", tmp_path / "ref"
+    write_partitions(first, MONTHLY, inc)
+    derive_monthly_metrics(None, inc)
+
+    # 新的一個月公布，同時補上缺檔並更正 2022 年 3 月的一筆
+    fixed = full.copy()
+    fixed.loc[(fixed[CODE_COL] == "1104") & (fixed["year"] == 2022) & (fixed["period"] == "03"),
+              REVENUE_COL] *= 1.1
+    write_partitions(fixed, MONTHLY, inc)
+    written = derive_monthly_metrics({(2024, "12"), (2023, "06"), (2022, "03")}, inc)
+    assert 0 < len(written) < len(years) * 12
+    assert derive_monthly_metrics({(2024, "Q1")}, inc) == []
+
+    write_partitions(fixed, MONTHLY, ref)
+    derive_monthly_metrics(None, ref)
+    pd.testing.assert_frame_equal(_read(MONTHLY_METRICS, inc), _read(MONTHLY_METRICS, ref))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+
+from journal import DONE, FAILED, RUNNING, Journal, cleanup_partials
+from reports import Unit
+from sync import resume_units, run_sync
+
+A, B, C, D = (Unit("eps", "sii", 113, q) for q in (1, 2, 3, 4))
+
+
+def _crashed_run(path):
+    """A 完成、B 失敗、C 跑到一半當掉、D 還沒開始"""
+    with Journal(path) as journal:
+        journal.start_run([list(u) for u in (A, B, C, D)], {"reports": ["eps"]})
+        journal.mark(list(A), DONE)
+        journal.mark(list(B), FAILED, "timeout: slow")
+        journal.mark(list(C), RUNNING)
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"event": "unit", "run": "x", "st')       # 寫到一半的最後一行
+
+
+def test_reload_after_crash(tmp_path):
+    path = tmp_path / "eps.jsonl"
+    _crashed_run(path)
+    journal = Journal(path)
+    assert journal.meta == {"reports": ["eps"]}
+    assert journal.pending_units() == [list(B), list(C), list(D)]
+    assert journal.failed_units() == [list(B)]
+    assert journal.unsettled_units() == [list(B), list(C)]
+    assert journal.unattempted_units() == [list(C), list(D)]
+    assert journal.error_of(list(B)) == "timeout: slow"
+
+
+def test_resume_runs_everything_unfinished(tmp_path):
+    path = tmp_path / "eps.jsonl"
+    _crashed_run(path)
+    units, carry = resume_units(Journal(path), retry_failed=False)
+    assert (units, carry) == ([B, C, D], [])
+
+
+def test_retry_failed_keeps_unattempted_units_for_resume(tmp_path):
+    path = tmp_path / "eps.jsonl"
+    _crashed_run(path)
+    units, carry = resume_units(Journal(path), retry_failed=True)
+    assert (units, carry) == ([B], [C, D])
+
+    with Journal(path) as journal:                      # run_sync 開始重抓
+        journal.start_run([list(u) for u in units], carry=[list(u) for u in carry])
+        journal.mark(list(B), DONE)
+    resumed, _ = resume_units(Journal(path), retry_failed=False)
+    assert resumed == [C, D]
+    assert Journal(path).failed_units() == []
+
+
+def test_start_run_replaces_file_atomically(tmp_path):
+    path = tmp_path / "eps.jsonl"
+    _crashed_run(path)
+    with Journal(path) as journal:
+        journal.start_run([list(A)], carry=[list(A), list(D)])
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["units"] == [list(A), list(D)]
+    assert not (tmp_path / "eps.jsonl.tmp").exists()
+
+
+def test_cleanup_partials(tmp_path):
+    (tmp_path / "a.csv").write_text("ok")
+    (tmp_path / "b.csv.part").write_text("x")
+    (tmp_path / "c.crdownload").write_text("x")
+    assert cleanup_partials([tmp_path, tmp_path / "missing"]) == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["a.csv"]
+
+
+def test_retry_failed_then_resume_end_to_end(standin, tmp_path):
+    path = tmp_path / "monthly.jsonl"
+    m1, m2, m3 = (Unit("monthly_income", "sii", 2024, m) for m in (1, 2, 3))
+    with Journal(path) as journal:
+        journal.start_run([list(u) for u in (m1, m2, m3)])
+        journal.mark(list(m1), FAILED, "throttle: blocked")
+
+    units, carry = resume_units(Journal(path), retry_failed=True)
+    stats = run_sync(units, Journal(path), "t", carry=carry)
+    assert (stats.success, stats.fail) == (1, 0)
+    assert (tmp_path / "database" / "2024" / "t21sc03_113_1.csv").exists()
+    assert not (tmp_path / "database" / "2024" / "t21sc03_113_2.csv").exists()
+
+    units, _ = resume_units(Journal(path), retry_failed=False)
+    assert units == [m2, m3]
+    assert run_sync(units, Journal(path), "t").success == 2
+    assert Journal(path).pending_units() == []
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import pytest
+
+from journal import DONE, FAILED, RUNNING, Journal
+from manifest import Manifest, sha256_file
+from reports import Unit, get_report
+from sync import plan
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)          # 報表資料夾（EPS/、database/）是相對路徑
+    with Manifest(tmp_path / "manifest.sqlite") as m:
+        yield m
+
+
+def _files(u: Unit, n: int):
+    report = get_report(u.report)
+    out = report.out_dir(u)
+    out.mkdir(parents=True, exist_ok=True)
+    for i in range(1, n + 1):
+        (out / f"{u.market}_{u.year}_Q{u.period}_{i}.csv").write_text(f"{u}{i}", encoding="utf-8")
+
+
+def _sync(manifest: Manifest, u: Unit, n: int):
+    """模擬一次成功的下載：n 個檔案，record_dir 後標記已同步"""
+    _files(u, n)
+    report = get_report(u.report)
+    report_dir, pattern = report.out_dir(u), report.pattern(u)
+    assert manifest.record_dir(u.report, u.market, *report.manifest_key(u), report_dir, pattern) == n
+
+
+def test_partial_period_on_disk_is_not_adopted(manifest):
+    u = Unit("eps", "sii", 113, 1)
+    _files(u, 1)
+    assert plan(manifest, [u]) == [u]                 # 沒有同步過的區段可比對檔數
+    assert manifest.synced_periods("eps", "sii") == set()
+
+    _sync(manifest, Unit("eps", "sii", 112, 4), 3)
+    assert manifest.expected_files("eps", "sii") == 3
+    assert plan(manifest, [u]) == [u]                 # 只有 1 / 3 個檔案
+    assert (113, "Q1") not in manifest.synced_periods("eps", "sii")
+
+
+def test_complete_period_on_disk_is_adopted_once(manifest):
+    _sync(manifest, Unit("eps", "sii", 112, 4), 3)
+    u = Unit("eps", "sii", 113, 1)
+    _files(u, 3)
+    assert plan(manifest, [u]) == []
+    assert (113, "Q1") in manifest.synced_periods("eps", "sii")
+    assert plan(manifest, [u, Unit("eps", "otc", 113, 1)]) == [Unit("eps", "otc", 113, 1)]
+
+
+def test_units_failed_or_interrupted_in_journal_are_refetched(manifest, tmp_path):
+    _sync(manifest, Unit("eps", "sii", 112, 4), 3)
+    failed, running, done = (Unit("eps", "sii", 113, q) for q in (1, 2, 3))
+    for u in (failed, running, done):
+        _files(u, 3)
+    with Journal(tmp_path / "j.jsonl") as journal:
+        journal.start_run([list(u) for u in (failed, running, done)])
+        journal.mark(list(failed), FAILED, "timeout: slow")
+        journal.mark(list(running), RUNNING)
+        journal.mark(list(done), DONE)
+    assert plan(manifest, [failed, running, done], Journal(tmp_path / "j.jsonl")) == [failed, running]
+
+
+def test_monthly_single_file_is_complete(manifest):
+    u = Unit("monthly_income", "sii", 2024, 3)
+    report = get_report("monthly_income")
+    out = report.out_dir(u)
+    out.mkdir(parents=True)
+    (out / "t21sc03_113_3.csv").write_text("x", encoding="utf-8")
+    assert plan(manifest, [u, Unit("monthly_income", "sii", 2024, 4)]) == \
+        [Unit("monthly_income", "sii", 2024, 4)]
+    assert manifest.synced_periods("monthly_income", "sii") == {(2024, "03")}
+
+
+def test_pending_ingest_tracks_content_changes(manifest, tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text("v1", encoding="utf-8")
+    manifest.record_file("eps", "sii", 113, "Q1", 1, path)
+    (rec,) = manifest.pending_ingest()
+    assert (rec.report, rec.period, rec.idx, rec.sha256) == ("eps", "Q1", 1, sha256_file(path))
+
+    manifest.mark_ingested(rec)
+    assert manifest.pending_ingest() == []
+
+    path.write_text("v2", encoding="utf-8")           # 重新下載、內容變了
+    manifest.record_file("eps", "sii", 113, "Q1", 1, path)
+    assert [r.sha256 for r in manifest.pending_ingest("eps")] == [sha256_file(path)]
+    assert manifest.pending_ingest("cash_flow") == []
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import codecs
+
+import endpoints
+from form_replay import collect_payloads, replay_downloads
+from http_fetch import fetch_monthly_income_http, get_session
+from transcode import get_transcoder
+
+
+def test_quarterly_popup_replay_end_to_end(standin, tmp_path):
+    session = get_session()
+    url = f"{standin.url}/mops/result?page=t163sb19&TYPEK=sii&year=113&season=01"
+    html = session.get(url, timeout=10).text
+
+    payloads = collect_payloads(html, url)
+    assert [p.idx for p in payloads] == [1, 2]          # 重複的第 3 顆按鈕已去掉
+    assert all(p.action == f"{standin.url}/server-java/t105sb02" for p in payloads)
+
+    out = tmp_path / "EPS" / "113" / "Q1"
+    out.mkdir(parents=True)
+    got = replay_downloads(payloads, out, lambda p: f"sii_113_Q1_{p.idx}.csv", session, url)
+    assert all(got.values())
+    get_transcoder().wait_dir(out)
+    for path in got.values():
+        data = path.read_bytes()
+        assert data.startswith(codecs.BOM_UTF8)
+        assert "公司1101" in data.decode("utf-8-sig")
+
+
+def test_monthly_income_over_http(standin, tmp_path):
+    out = tmp_path / "database" / "2024"
+    path = fetch_monthly_income_http(endpoints.t21sc03_url(113, 3), out)
+    assert path.name == "t21sc03_113_3.csv"
+    get_transcoder().wait_path(path)
+    text = path.read_text(encoding="utf-8-sig")
+    assert text.startswith("出表日期,資料年月,公司代號")
+    assert text.count("\n") == 21
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derive import EPS_METRICS, write_partitions
+from panel import Panel, align, intern_axis, join, month_ordinal, period_label
+from parquet_store import CODE_COL
+
+
+def _quarterly(codes, periods, field="近四季EPS", start=0.0) -> pd.DataFrame:
+    """periods: [(民國年, 'Q1'), ...]；值依序遞增"""
+    rows = [(c, "sii", y, q) for c in codes for y, q in periods]
+    df = pd.DataFrame(rows, columns=[CODE_COL, "market", "year", "period"])
+    df[field] = start + np.arange(len(df), dtype="float64")
+    return df
+
+
+def test_intern_axis_shares_equal_axes():
+    a = intern_axis(["2330", "1101", "2330"])
+    assert a is intern_axis(np.array(["1101", "2330"]))
+    assert a.labels.tolist() == ["1101", "2330"]
+    assert a.positions(np.array(["2330", "9999"])).tolist() == [1, -1]
+    with pytest.raises(ValueError):
+        a.labels[0] = "x"
+
+
+def test_period_axis_uses_western_quarter_end_months():
+    df = pd.DataFrame({"year": [113, 2024], "period": ["Q1", "03"]})
+    assert month_ordinal(df.iloc[:1], monthly=False)[0] == 2024 * 12 + 2
+    assert month_ordinal(df.iloc[1:], monthly=True)[0] == 2024 * 12 + 2
+    assert period_label(2024 * 12 + 2) == "2024Q1"
+    assert period_label(2024 * 12 + 2, monthly=True) == "2024-03"
+
+
+def test_from_frame_keeps_last_duplicate():
+    df = _quarterly(["2330"], [(113, "Q1")])
+    df = pd.concat([df, df.assign(近四季EPS=9.0), df.assign(period="all")])
+    p = Panel.from_frame(df)
+    assert p.values.shape == (1, 1, 1)
+    assert p["近四季EPS"][0, 0] == 9
+
+
+def test_reindex_fills_missing_cells_and_reuses_same_axes():
+    p = Panel.from_frame(_quarterly(["1101", "2330"], [(113, "Q1"), (113, "Q2")]))
+    assert p.reindex(p.codes, p.periods) is p
+
+    codes = intern_axis(["2330", "9999"])
+    periods = intern_axis(np.array([2024 * 12 + 5, 2024 * 12 + 8]))   # Q2、Q3
+    r = p.reindex(codes, periods)
+    assert r.codes is codes and r.periods is periods
+    assert r["近四季EPS"][0, 0] == p["近四季EPS"][1, 1]               # 2330 Q2
+    assert r.mask.sum() == 1
+    assert p.values[0, 0, 0] == 0.0                                   # 原面板不受影響
+
+
+def test_join_aligns_and_prefixes_duplicate_fields():
+    eps = Panel.from_frame(_quarterly(["1101", "2330"], [(112, "Q4"), (113, "Q1")]))
+    op = Panel.from_frame(_quarterly(["2330", "2454"], [(113, "Q1"), (113, "Q2")], start=100))
+    op2 = Panel.from_frame(_quarterly(["2330"], [(113, "Q1")], field="營業利益率", start=7))
+
+    inner = join({"eps": eps, "op": op, "m": op2})
+    assert inner.fields == ("eps.近四季EPS", "op.近四季EPS", "營業利益率")
+    assert inner.codes.labels.tolist() == ["2330"]
+    assert [period_label(t) for t in inner.periods.labels] == ["2024Q1"]
+    assert inner.values[:, 0, 0].tolist() == [3.0, 100.0, 7.0]
+
+    outer = join({"eps": eps, "op": op}, how="outer")
+    assert outer.codes.labels.tolist() == ["1101", "2330", "2454"]
+    assert len(outer.periods) == 3
+    assert np.isnan(outer["op.近四季EPS"][0]).all()
+    with pytest.raises(ValueError):
+        align(eps, op, how="left")
+
+
+def test_to_quarters_sums_three_months():
+    rows = [("2330", "sii", 2024, f"{m:02d}", float(m)) for m in range(1, 7) if m != 5]
+    df = pd.DataFrame(rows, columns=[CODE_COL, "market", "year", "period", "當月營收"])
+    rev = Panel.from_frame(df, monthly=True)
+    q = rev.to_quarters()
+    assert [period_label(t) for t in q.periods.labels] == ["2024Q1", "2024Q2"]
+    assert q["當月營收"][0, 0] == 6
+    assert np.isnan(q["當月營收"][0, 1])
+    assert rev.to_quarters("last")["當月營收"][0].tolist() == [3.0, 6.0]
+
+
+def test_load_and_to_frame_round_trip(tmp_path):
+    df = _quarterly(["1101", "2330"], [(112, "Q4"), (113, "Q1")])
+    write_partitions(df, EPS_METRICS, tmp_path)
+    p = Panel.load(EPS_METRICS, ["近四季EPS"], root=tmp_path)
+    frame = p.to_frame()
+    assert frame[CODE_COL].astype(str).tolist() == ["1101", "1101", "2330", "2330"]
+    assert frame["period"].tolist() == ["2023Q4", "2024Q1"] * 2
+    assert frame["近四季EPS"].tolist() == df["近四季EPS"].tolist()
+    assert p.series("2330", "近四季EPS").to_dict() == {"2023Q4": 2.0, "2024Q1": 3.0}
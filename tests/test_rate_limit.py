@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import pytest
+
+from rate_limit import CLOSED, HALF_OPEN, OPEN, HostBreaker, TokenBucket
+
+
+def test_bucket_allows_burst_then_reports_wait(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.try_acquire()
+    clock.advance(0.5)
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() > 0
+    clock.advance(60)   # 閒置再久也只存到 burst 個
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() > 0
+
+
+def test_bucket_rejects_bad_parameters():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+
+
+###############################################################################
+# HostBreaker
+###############################################################################
+
+def _breaker(**kw) -> HostBreaker:
+    kw.setdefault("threshold", 2)
+    kw.setdefault("cooldown", 10.0)
+    return HostBreaker("mops.test", max_limit=4, **kw)
+
+
+def test_breaker_limits_concurrency(clock):
+    b = _breaker()
+    assert [b.try_acquire() for _ in range(4)] == [0.0] * 4
+    assert b.try_acquire() > 0
+    b.release(ok=True)
+    assert b.try_acquire() == 0.0
+
+
+def test_breaker_opens_after_threshold_and_halves_limit(clock, capsys):
+    b = _breaker()
+    for _ in range(2):
+        b.try_acquire()
+        b.release(ok=False, throttled=True)
+    assert b.state == OPEN and b.limit == 2
+    assert b.try_acquire() == pytest.approx(10.0)
+
+    clock.advance(10)
+    assert b.try_acquire() == 0.0          # half-open：只放一個探測
+    assert b.state == HALF_OPEN
+    assert b.try_acquire() > 0
+    b.release(ok=True)
+    assert b.state == CLOSED and b.limit == 2
+
+
+def test_breaker_failed_probe_doubles_cooldown(clock, capsys):
+    b = _breaker()
+    for _ in range(2):
+        b.try_acquire()
+        b.release(ok=False, throttled=True)
+    clock.advance(10)
+    b.try_acquire()
+    b.release(ok=False, throttled=True)
+    assert b.state == OPEN and b.limit == 1
+    assert b.try_acquire() == pytest.approx(20.0)
+
+
+def test_breaker_plain_failures_do_not_trip(clock):
+    b = _breaker()
+    for _ in range(5):
+        b.try_acquire()
+        b.release(ok=False)
+    assert b.state == CLOSED and b.limit == 4
+
+
+def test_breaker_grows_limit_back_after_successes(clock, capsys):
+    b = _breaker(grow_after=3)
+    for _ in range(2):
+        b.try_acquire()
+        b.release(ok=False, throttled=True)
+    clock.advance(10)
+    b.try_acquire()
+    b.release(ok=True)
+    for _ in range(3):
+        b.try_acquire()
+        b.release(ok=True)
+    assert b.limit == 3
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import socket
+
+import pytest
+import requests
+
+import retry
+from mops_standin import THROTTLE_HTML
+from retry import (Backoff, EmptyFile, FetchError, FetchTimeout, HttpStatus, MissingButton,
+                   NoData, Throttled, check_download, check_page, classify, retry_call)
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(f"{status}", response=resp)
+
+
+class NoSuchElementException(Exception):
+    """與 Selenium 同名即可：classify 只看類別名稱，不 import Selenium"""
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (_http_error(429), Throttled),
+    (_http_error(403), Throttled),
+    (_http_error(404), HttpStatus),
+    (requests.ReadTimeout("slow"), FetchTimeout),
+    (socket.timeout("slow"), FetchTimeout),
+    (requests.ConnectionError("reset"), Throttled),
+    (NoSuchElementException("button"), MissingButton),
+    (ValueError("other"), FetchError),
+])
+def test_classify(exc, kind):
+    assert type(classify(exc)) is kind
+
+
+def test_classify_keeps_fetch_errors_and_http_retryability():
+    err = NoData("x")
+    assert classify(err) is err
+    assert classify(_http_error(404)).retryable is False
+    assert classify(_http_error(502)).retryable is True
+
+
+def test_check_page_and_download():
+    with pytest.raises(Throttled):
+        check_page(THROTTLE_HTML)
+    with pytest.raises(Throttled):
+        check_page("<html>查詢過於頻繁</html>".encode("cp950"))
+    with pytest.raises(NoData):
+        check_page("<html>查無資料</html>")
+    check_page("<html><table>2330</table></html>")
+    with pytest.raises(EmptyFile):
+        check_download(b"", "a.csv")
+    with pytest.raises(Throttled):
+        check_download(THROTTLE_HTML.encode("utf-8"), "a.csv")
+    check_download("公司代號,公司名稱".encode("utf-8"), "a.csv")
+
+
+def test_retry_call_retries_then_gives_up(monkeypatch):
+    monkeypatch.setitem(retry.BACKOFF, "timeout", Backoff(base=0, cap=0, attempts=3))
+    attempts = []
+
+    def flaky(attempt):
+        attempts.append(attempt)
+        if attempt < 2:
+            raise requests.ReadTimeout("slow")
+        return "ok"
+
+    assert retry_call(flaky) == "ok"
+    assert attempts == [0, 1, 2]
+
+    def always(attempt):
+        raise requests.ReadTimeout("slow")
+
+    with pytest.raises(FetchTimeout):
+        retry_call(always)
+
+
+def test_retry_call_does_not_retry_no_data():
+    attempts = []
+
+    def empty(attempt):
+        attempts.append(attempt)
+        raise NoData("查無資料")
+
+    with pytest.raises(NoData):
+        retry_call(empty)
+    assert attempts == [0]
@@ -0,0 +1,81 @@
+import threading
+
+from scrape_profile import ResourceBlocker
+
+
+class RecordingConnection:
+    """只記錄指令的 CdpConnection 替身；fail 裡的 method 回 CDP 錯誤"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.listeners = []
+        self.fail = set(fail)
+        self.done = threading.Event()
+
+    def call(self, method, params=None, session_id=None, timeout=10):
+        self.calls.append((method, params, session_id))
+        if method in ("Runtime.runIfWaitingForDebugger", "Fetch.failRequest"):
+            self.done.set()
+        if method in self.fail:
+            raise RuntimeError(f"CDP {method} 失敗")
+        return {}
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def emit(self, method, params, session_id=None):
+        self.done.clear()
+        for fn in self.listeners:
+            fn(method, params, session_id)
+        assert self.done.wait(5)
+
+    def close(self):
+        pass
+
+
+def _attach(conn, session_id="S1", kind="page"):
+    conn.emit("Target.attachedToTarget", {
+        "sessionId": session_id, "waitingForDebugger": True,
+        "targetInfo": {"targetId": "T1", "type": kind},
+    })
+
+
+def test_new_popup_is_blocked_before_it_runs():
+    conn = RecordingConnection()
+    blocker = ResourceBlocker(conn, ["*.png"], ["Image", "Font"])
+    _attach(conn)
+    blocker.close()
+
+    assert conn.calls[0] == ("Target.setAutoAttach", {
+        "autoAttach": True, "waitForDebuggerOnStart": True, "flatten": True,
+    }, None)
+    assert [c for c in conn.calls if c[2] == "S1"] == [
+        ("Network.enable", {}, "S1"),
+        ("Network.setBlockedURLs", {"urls": ["*.png"]}, "S1"),
+        ("Fetch.enable", {"patterns": [{"resourceType": "Image"},
+                                       {"resourceType": "Font"}]}, "S1"),
+        ("Runtime.runIfWaitingForDebugger", {}, "S1"),
+    ]
+
+
+def test_paused_requests_are_failed():
+    conn = RecordingConnection()
+    blocker = ResourceBlocker(conn, [], ["Image"])
+    conn.emit("Fetch.requestPaused", {"requestId": "R9", "resourceType": "Image"}, "S1")
+    blocker.close()
+
+    assert conn.calls[-1] == ("Fetch.failRequest", {
+        "requestId": "R9", "errorReason": "BlockedByClient",
+    }, "S1")
+
+
+def test_target_is_released_even_if_blocking_fails():
+    conn = RecordingConnection(fail={"Fetch.enable"})
+    blocker = ResourceBlocker(conn, [], ["Image"])
+    _attach(conn)
+    _attach(conn, "W1", kind="service_worker")
+    blocker.close()
+
+    assert ("Runtime.runIfWaitingForDebugger", {}, "S1") in conn.calls
+    # 非分頁的 target 只放行，不套封鎖
+    assert [c[0] for c in conn.calls if c[2] == "W1"] == ["Runtime.runIfWaitingForDebugger"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+
+from reports import REPORTS, Unit, get_report
+from sync import parse_batch_spec
+
+
+def test_parse_batch_spec_all_reports_and_markets():
+    spec = parse_batch_spec("all reports, sii+otc, 102~113")
+    assert spec.reports == list(REPORTS)
+    assert spec.markets == ["sii", "otc"]
+    assert spec.ranges == ["102~113"]
+
+
+def test_parse_batch_spec_defaults_and_dedup():
+    spec = parse_batch_spec("eps+cash_flow+eps, 110-01 ~ 113-02")
+    assert spec.reports == ["eps", "cash_flow"]
+    assert spec.markets == ["sii"]
+    assert spec.ranges == ["110-01~113-02"]
+
+
+@pytest.mark.parametrize("text", ["eps, sii", "eps, nyse, 113", "eps, sii, 113~"])
+def test_parse_batch_spec_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        parse_batch_spec(text)
+
+
+def test_quarterly_expand_year_only_gives_four_quarters():
+    eps = get_report("eps")
+    assert eps.expand("112~113") == [(y, q) for y in (112, 113) for q in (1, 2, 3, 4)]
+    assert eps.expand("2024") == [(113, q) for q in (1, 2, 3, 4)]
+
+
+def test_quarterly_expand_season_range():
+    assert get_report("eps").expand("110-03~111-02") == [(110, 3), (110, 4), (111, 1), (111, 2)]
+
+
+def test_quarterly_expand_converts_western_months():
+    assert get_report("cash_flow").expand("2023-02~2023-07") == [(112, 1), (112, 2), (112, 3)]
+
+
+@pytest.mark.parametrize("spec", ["110-05", "110-00~110-02", "2023-13", "113~112"])
+def test_quarterly_expand_rejects_bad_periods(spec):
+    with pytest.raises(ValueError):
+        get_report("eps").expand(spec)
+
+
+def test_monthly_expand_skips_current_and_future_months():
+    months = get_report("monthly_income").expand("112-11~2099-01")
+    assert months[:3] == [(2023, 11), (2023, 12), (2024, 1)]
+    today = date.today()
+    assert months[-1] < (today.year, today.month)
+
+
+def test_units_cover_every_report_and_market_once():
+    units = parse_batch_spec("eps+monthly_income, sii+otc, 113-01, 113-01").units()
+    assert Unit("eps", "otc", 113, 1) in units
+    assert Unit("monthly_income", "sii", 2024, 1) in units
+    assert len(units) == len(set(units)) == 4
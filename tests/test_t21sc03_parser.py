@@ -0,0 +1,58 @@
+import io
+
+import pandas as pd
+
+import endpoints
+from mops_standin import t21sc03_csv, t21sc03_html
+from t21sc03_parser import COLUMNS, fetch_monthly_income_parsed, parse_t21sc03
+
+
+def test_matches_official_csv():
+    # 替身的 HTML 與另存 CSV 出自同一份資料：解析結果應與官方 CSV 一致
+    df = parse_t21sc03(t21sc03_html(113, 3, "sii", companies=30))
+    official = pd.read_csv(io.BytesIO(t21sc03_csv(113, 3, companies=30)),
+                           dtype={"公司代號": str}, encoding="cp950")
+
+    assert list(df.columns) == COLUMNS
+    assert len(df) == 30 and df["公司代號"].is_unique    # 表頭與合計列不算
+    merged = df.merge(official, on="公司代號", suffixes=("", "_csv"))
+    assert len(merged) == 30
+    for col in ("產業別", "公司名稱", "營業收入-當月營收", "營業收入-去年同月增減(%)",
+                "累計營業收入-去年累計營收"):
+        assert (merged[col] == merged[f"{col}_csv"]).all(), col
+    assert df["備註"].isna().all()
+
+
+def test_cells_are_normalized():
+    page = """<html><body><table>
+      <tr><th colspan=11>產業別：半導體業</th></tr>
+      <tr><td>2330</td><td> 台 積\t電 "甲" </td><td>1,234,567</td><td>-</td><td>--</td>
+          <td>1.50</td><td>-2.25</td><td>9,000</td><td>N/A</td><td>不適用</td><td>說明</td></tr>
+      <tr><td colspan=2>合計</td><td>1</td><td></td><td></td><td></td><td></td><td></td>
+          <td></td><td></td><td></td></tr>
+    </table></body></html>"""
+    df = parse_t21sc03(page)
+
+    assert len(df) == 1
+    row = df.iloc[0]
+    assert row["產業別"] == "半導體業"
+    assert row["公司代號"] == "2330"
+    assert row["公司名稱"] == '台 積 電 "甲"'
+    assert row["營業收入-當月營收"] == 1234567.0
+    assert row["營業收入-去年同月增減(%)"] == -2.25
+    assert pd.isna(row["營業收入-上月營收"]) and pd.isna(row["累計營業收入-前期比較增減(%)"])
+    assert row["備註"] == "說明"
+
+
+def test_empty_page_keeps_schema():
+    df = parse_t21sc03("<html><body><p>查無資料</p></body></html>")
+    assert df.empty and list(df.columns) == COLUMNS
+    assert df["營業收入-當月營收"].dtype == "float64"
+
+
+def test_fetch_writes_parsed_csv(standin, tmp_path):
+    path = fetch_monthly_income_parsed(endpoints.t21sc03_url(113, 3), tmp_path / "out")
+
+    assert path.name == "t21sc03_113_3.csv"
+    df = pd.read_csv(path, dtype={"公司代號": str}, encoding="utf-8-sig")
+    assert list(df.columns) == COLUMNS and len(df) == 20
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import codecs
+
+import transcode
+from transcode import Transcoder, sniff_encoding, transcode_to_utf8_bom
+
+TEXT = "公司代號,公司名稱,營業收入\r\n2330,台積電,\"1,000\"\r\n"
+
+
+def test_sniff_bom_utf8_and_big5(tmp_path):
+    bom = tmp_path / "bom.csv"
+    bom.write_bytes(codecs.BOM_UTF8 + TEXT.encode("utf-8"))
+    utf8 = tmp_path / "utf8.csv"
+    utf8.write_bytes(TEXT.encode("utf-8"))
+    big5 = tmp_path / "big5.csv"
+    big5.write_bytes(TEXT.encode("cp950"))
+    assert sniff_encoding(bom) == "utf-8-sig"
+    assert sniff_encoding(utf8) == "utf-8"
+    assert sniff_encoding(big5) == "cp950"
+
+
+def test_sniff_ignores_multibyte_cut_at_sample_end(tmp_path):
+    data = TEXT.encode("utf-8")
+    cut = data.index("台".encode("utf-8")) + 1   # 取樣剛好切在「台」的第一個位元組後
+    path = tmp_path / "cut.csv"
+    path.write_bytes(data)
+    assert sniff_encoding(path, sample=cut) == "utf-8"
+
+
+def test_transcode_big5_to_utf8_bom(tmp_path):
+    path = tmp_path / "big5.csv"
+    path.write_bytes(TEXT.encode("cp950"))
+    assert transcode_to_utf8_bom(path) is True
+    assert path.read_bytes() == codecs.BOM_UTF8 + TEXT.encode("utf-8")
+    assert transcode_to_utf8_bom(path) is False   # 已是 UTF-8 BOM 不再改寫
+    assert not (tmp_path / "big5.csv.part").exists()
+
+
+def test_utf8_head_with_big5_tail_falls_back_to_cp950(tmp_path, monkeypatch):
+    # 取樣只看到開頭的純 ASCII，判斷為 UTF-8；Big-5 在後面的區塊才出現
+    monkeypatch.setattr(transcode, "sniff_encoding", lambda path: "utf-8")
+    monkeypatch.setattr(transcode, "CHUNK_SIZE", 8)
+    head = b"code,name\r\n" * 4
+    path = tmp_path / "mixed.csv"
+    path.write_bytes(head + "2330,台積電\r\n".encode("cp950"))
+    assert transcode_to_utf8_bom(path) is True
+    assert path.read_bytes() == codecs.BOM_UTF8 + head + "2330,台積電\r\n".encode("utf-8")
+
+
+def test_transcoder_runs_then_after_converting(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_bytes(TEXT.encode("cp950"))
+    seen = []
+    with Transcoder(workers=1) as tc:
+        tc.submit(path, then=lambda p: seen.append(p.read_bytes()[:3]))
+        tc.wait_dir(tmp_path)
+    assert seen == [codecs.BOM_UTF8]
+    assert Transcoder().submit(tmp_path / "a.xls") is None
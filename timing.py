@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import time
+import bisect
+import pathlib
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+###############################################################################
+# 分階段計時：每個階段寫一行 JSON，執行結束時依報表彙總成直方圖
+###############################################################################
+
+RUNLOG_DIR = pathlib.Path(".runs")
+# 直方圖上界（秒）；最後一格收所有更慢的
+BUCKETS: List[float] = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+T = TypeVar("T")
+
+# 目前執行中的 (報表, 區段)；asyncio task 與 asyncio.to_thread 會自動帶過去
+_unit: contextvars.ContextVar[Tuple[Optional[str], Any]] = contextvars.ContextVar(
+    "timing_unit", default=(None, None))
+
+
+class StageRecorder:
+    """
+    收集 (報表, 階段) 的耗時樣本；有給 path 時同步寫 JSON lines。
+    沒有開啟 run log 時也會收集，只是不落地（成本只有一次 perf_counter 與 append）。
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path = pathlib.Path(path) if path else None
+        self._fh = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+        self._samples: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self._failed: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            key = (record.get("report") or "-", record["stage"])
+            self._samples[key].append(record["seconds"])
+            if not record.get("ok", True):
+                self._failed[key] += 1
+            if self._fh is not None:
+                self._fh.write(line + "\n")
+                self._fh.flush()
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{報表: {階段: {count, failed, total, mean, p50, p95, max, histogram}}}"""
+        with self._lock:
+            items = [(k, sorted(v), self._failed[k]) for k, v in self._samples.items()]
+        out: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        for (report, stage), samples, failed in sorted(items):
+            hist = [0] * (len(BUCKETS) + 1)
+            for s in samples:
+                hist[bisect.bisect_left(BUCKETS, s)] += 1
+            labels = [f"<={b}s" for b in BUCKETS] + [f">{BUCKETS[-1]}s"]
+            total = sum(samples)
+            out[report][stage] = {
+                "count": len(samples),
+                "failed": failed,
+                "total": round(total, 4),
+                "mean": round(total / len(samples), 4),
+                "p50": round(_quantile(samples, 0.50), 4),
+                "p95": round(_quantile(samples, 0.95), 4),
+                "max": round(samples[-1], 4),
+                "histogram": {l: n for l, n in zip(labels, hist) if n},
+            }
+        return dict(out)
+
+    def print_summary(self):
+        for report, stages in self.summary().items():
+            print(f"\n⏱ 各階段耗時（{report}）")
+            print(f"{'階段':<16}{'次數':>6}{'失敗':>6}{'總計s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+            for stage, s in stages.items():
+                print(f"{stage:<18}{s['count']:>6}{s['failed']:>6}{s['total']:>10.2f}"
+                      f"{s['p50']:>9.3f}{s['p95']:>9.3f}{s['max']:>9.3f}")
+        if self.path is not None:
+            print(f"（明細：{self.path}）")
+
+    def close(self):
+        """把彙總寫成最後一行 {"event": "summary"} 再關檔"""
+        with self._lock:
+            fh, self._fh = self._fh, None
+        if fh is not None:
+            fh.write(json.dumps({"event": "summary", "ts": time.time(),
+                                 "stages": self.summary()}, ensure_ascii=False) + "\n")
+            fh.close()
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+_recorder = StageRecorder()
+_recorder_lock = threading.Lock()
+
+
+def recorder() -> StageRecorder:
+    return _recorder
+
+
+@contextmanager
+def run_log(report: str, directory: pathlib.Path = RUNLOG_DIR) -> Iterator[StageRecorder]:
+    """
+    main() 用：開一個 .runs/<report>-<時間>.jsonl，結束時印出並寫入各階段彙總。
+    """
+    global _recorder
+    path = pathlib.Path(directory) / f"{report}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+    rec = StageRecorder(path)
+    with _recorder_lock:
+        previous, _recorder = _recorder, rec
+    try:
+        yield rec
+    finally:
+        with _recorder_lock:
+            _recorder = previous
+        rec.print_summary()
+        rec.close()
+
+
+@contextmanager
+def unit(report: str, item: Any) -> Iterator[None]:
+    """標記目前執行緒 / task 正在跑哪個 (報表, 區段)，內層的 stage() 會自動帶上"""
+    token = _unit.set((report, item))
+    try:
+        yield
+    finally:
+        _unit.reset(token)
+
+
+@contextmanager
+def stage(name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    量一個階段的耗時。yield 出來的 dict 可以補欄位（例如檔名），
+    區塊內丟例外時記為 ok=False 並附上例外類別，例外照常往外拋。
+    """
+    report, item = _unit.get()
+    extra: Dict[str, Any] = dict(fields)
+    t0 = time.perf_counter()
+    ok, error = True, None
+    try:
+        yield extra
+    except BaseException as e:
+        ok, error = False, type(e).__name__
+        raise
+    finally:
+        record = {"ts": time.time(), "report": report, "item": item, "stage": name,
+                  "seconds": round(time.perf_counter() - t0, 6), "ok": ok}
+        if error:
+            record["error"] = error
+        record.update(extra)
+        _recorder.emit(record)
+
+
+def bind(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    交給執行緒池前包一層，讓工作執行緒沿用呼叫端的 (報表, 區段)。
+    每次呼叫用一份新的 context 複本，多個執行緒同時執行也不衝突。
+    """
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import os
+import codecs
+import pathlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+from timing import bind, stage
+
+###############################################################################
+# 串流轉碼：下載完成後立刻把 Big-5 / UTF-8 轉成 UTF-8 BOM（README 的第 3 步）
+###############################################################################
+
+SNIFF_BYTES = 64 * 1024
+CHUNK_SIZE = 256 * 1024
+TEXT_SUFFIXES = {".csv"}
+
+
+def sniff_encoding(path: pathlib.Path, sample: int = SNIFF_BYTES) -> str:
+    """
+    只看開頭幾 KB：
+    * 已有 UTF-8 BOM → 'utf-8-sig'
+    * 可被 UTF-8 解開（結尾被截斷的多位元組不算錯）→ 'utf-8'
+    * 否則視為 Big-5（cp950 是 Big-5 的超集）
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(sample)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp950"
+
+
+def _rewrite(path: pathlib.Path, encoding: str, tmp: pathlib.Path):
+    decoder = codecs.getincrementaldecoder(encoding)(
+        errors="strict" if encoding == "utf-8" else "replace")
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        dst.write(codecs.BOM_UTF8)
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            dst.write(decoder.decode(chunk).encode("utf-8"))
+        dst.write(decoder.decode(b"", final=True).encode("utf-8"))
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+def transcode_to_utf8_bom(path: pathlib.Path) -> bool:
+    """
+    以固定大小的區塊轉碼，記憶體用量與檔案大小無關；寫到暫存檔後 os.replace。
+    已是 UTF-8 BOM 的檔案不動，回傳是否有改寫。
+    """
+    path = pathlib.Path(path)
+    encoding = sniff_encoding(path)
+    if encoding == "utf-8-sig":
+        return False
+    tmp = path.with_name(path.name + ".part")
+    try:
+        try:
+            _rewrite(path, encoding, tmp)
+        except UnicodeDecodeError:
+            # 開頭像 UTF-8、後面卻不是：整檔改用 Big-5 重來
+            _rewrite(path, "cp950", tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return True
+
+
+class Transcoder:
+    """
+    在執行緒池上轉碼，與下一個檔案的下載重疊進行。
+    wait_dir / wait_path 讓登記下載清單前可以先等該區段的檔案轉完。
+    """
+
+    def __init__(self, workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+        self._pending: Dict[pathlib.Path, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path: pathlib.Path,
+               then: Optional[Callable[[pathlib.Path], None]] = None) -> Optional[Future]:
+        """then 在轉碼完成後於同一個背景工作內執行（blob_store 用來收檔）"""
+        path = pathlib.Path(path)
+        if path.suffix.lower() not in TEXT_SUFFIXES:
+            return None
+        fut = self._pool.submit(bind(self._run), path, then)
+        with self._lock:
+            self._pending[path.resolve()] = fut
+        fut.add_done_callback(lambda f, p=path.resolve(): self._forget(p, f))
+        return fut
+
+    @staticmethod
+    def _run(path: pathlib.Path, then: Optional[Callable[[pathlib.Path], None]] = None) -> bool:
+        try:
+            with stage("transcode", file=path.name):
+                changed = transcode_to_utf8_bom(path)
+        except (OSError, LookupError) as e:
+            print(f"⚠ {path.name} 轉碼失敗: {e}")
+            return False
+        if then is not None:
+            try:
+                then(path)
+            except OSError as e:
+                print(f"⚠ {path.name} 轉碼後處理失敗: {e}")
+        return changed
+
+    def _forget(self, path: pathlib.Path, fut: Future):
+        with self._lock:
+            if self._pending.get(path) is fut:
+                del self._pending[path]
+
+    def wait_path(self, path: pathlib.Path):
+        with self._lock:
+            fut = self._pending.get(pathlib.Path(path).resolve())
+        if fut is not None:
+            fut.result()
+
+    def wait_dir(self, directory: pathlib.Path):
+        directory = pathlib.Path(directory).resolve()
+        with self._lock:
+            futures = [f for p, f in self._pending.items() if p.parent == directory]
+        wait(futures)
+
+    def close(self):
+        """等所有轉碼做完再關閉；若是預設實例，下次 get_transcoder() 會重建"""
+        global _default
+        self._pool.shutdown(wait=True)
+        with _default_lock:
+            if _default is self:
+                _default = None
+
+    def __enter__(self) -> "Transcoder":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default: Optional[Transcoder] = None
+_default_lock = threading.Lock()
+
+
+def get_transcoder() -> Transcoder:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Transcoder()
+        return _default
+
+
+def submit(path: pathlib.Path) -> Optional[Future]:
+    """下載完成的檔案交給預設 Transcoder；非 CSV 直接略過"""
+    return get_transcoder().submit(path)